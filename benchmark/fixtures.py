@@ -0,0 +1,252 @@
+"""
+Recorded HTTP fixtures for the offline benchmark and the local server that replays them.
+
+A fixture directory holds an index.json that maps a URL without its scheme (e.g.
+"www.wikidata.org/w/api.php?action=...") to a body file and its content type. Fixtures are either
+recorded from the live sites (record_fixtures) or synthesized from final_data.csv (synthesize_fixtures).
+"""
+import hashlib
+import html
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urldefrag, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import http_client
+import transform_public_enhancer
+from topic_store import import_topics_csv
+
+# Hosts whose absolute links are rewritten to the local server when a page is replayed
+REPLAYED_HOSTS = ['oer.gitlab.io', 'www.wikidata.org', 'en.wikipedia.org', 'lookup.dbpedia.org']
+# Answers of the APIs for terms that are not part of the fixtures
+EMPTY_API_RESPONSES = {
+    'www.wikidata.org': {'search': []},
+    'en.wikipedia.org': {'query': {'search': []}},
+    'lookup.dbpedia.org': {'docs': []},
+}
+
+
+def fixture_key(url: str) -> str:
+    """
+    Returns the key of a URL in a fixture directory: host, path, and query without scheme and fragment.
+    """
+    url = urldefrag(url)[0]
+    return unquote(url.split('://', 1)[-1])
+
+
+class FixtureWriter:
+    """
+    Writes responses into a fixture directory.
+    """
+
+    def __init__(self, fixture_dir: str):
+        self.fixture_dir = fixture_dir
+        self.index = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(fixture_dir, 'bodies'), exist_ok=True)
+
+    def add(self, url: str, body: bytes, content_type: str):
+        key = fixture_key(url)
+        filename = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        with open(os.path.join(self.fixture_dir, 'bodies', filename), 'wb') as f:
+            f.write(body)
+        with self._lock:
+            self.index[key] = {'file': filename, 'content_type': content_type}
+
+    def close(self):
+        with open(os.path.join(self.fixture_dir, 'index.json'), 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, indent=1)
+
+
+####################################################################################################
+# Recording
+####################################################################################################
+def record_fixtures(fixture_dir: str, run):
+    """
+    Records every response the shared HTTP client receives while run() is executed.
+
+    Args:
+    - fixture_dir (str): The directory to write the fixtures to.
+    - run (callable): Runs the pipeline steps that should be recorded, e.g. extract and enrichment.
+    """
+    writer = FixtureWriter(fixture_dir)
+    original_get = http_client.HttpClient.get
+
+    def recording_get(self, url, **kwargs):
+        # Conditional requests would only record a 304
+        kwargs.pop('headers', None)
+        response = original_get(self, url, **kwargs)
+        if response.ok:
+            writer.add(url, response.content, response.headers.get('Content-Type', 'application/octet-stream'))
+        return response
+
+    http_client.HttpClient.get = recording_get
+    try:
+        run()
+    finally:
+        http_client.HttpClient.get = original_get
+        writer.close()
+
+
+####################################################################################################
+# Synthesized fixtures
+####################################################################################################
+def synthesize_fixtures(csv_path: str, fixture_dir: str, scale: int = 1) -> int:
+    """
+    Builds slide decks and API responses from an exported topic CSV (e.g. final_data/final_data.csv).
+
+    Every deck of the CSV becomes an HTML page with one <section> per topic that contains its heading and
+    links. The Wikidata, Wikipedia, and DBpedia results of a topic are answered for its search term. With
+    scale > 1 the whole course is copied scale times under new deck names to simulate a larger catalogue.
+
+    Returns:
+    - int: The number of topics in the synthesized decks.
+    """
+    topics = import_topics_csv(csv_path)
+    decks = OrderedDict()
+    for topic in topics:
+        decks.setdefault(urldefrag(topic['url'])[0], []).append(topic)
+    base_url = os.path.commonprefix(list(decks.keys()))
+    base_url = base_url[:base_url.rfind('/') + 1]
+
+    writer = FixtureWriter(fixture_dir)
+    index_links = []
+    for copy in range(scale):
+        suffix = '' if copy == 0 else f'-r{copy}'
+        rename = lambda url: url.replace('.html', suffix + '.html') if url.startswith(base_url) else url
+        for deck_url, deck_topics in decks.items():
+            index_links.append(f'<a href="{html.escape(rename(deck_url)[len(base_url):])}">{html.escape(deck_topics[0]["title"])}</a>')
+            writer.add(rename(deck_url), render_deck(deck_topics, base_url, rename).encode('utf-8'), 'text/html; charset=utf-8')
+    writer.add(base_url, ('<html><body>' + '\n'.join(index_links) + '</body></html>').encode('utf-8'), 'text/html; charset=utf-8')
+
+    for term, results in synthesize_api_results(topics).items():
+        for source, result in results.items():
+            writer.add(api_url(source, term), json.dumps(result).encode('utf-8'), 'application/json')
+    writer.close()
+    return len(topics) * scale
+
+
+def render_deck(topics: list, base_url: str, rename) -> str:
+    sections = []
+    if not any(topic['tag'] == 'h1' for topic in topics):
+        # Decks without a numbered title slide are skipped by add_parent_ids, like on the live site
+        sections.append(f'<section id="slide-title"><h1>{html.escape(topics[0]["title"])}</h1></section>')
+    for topic in topics:
+        heading = f'<{topic["tag"]} id="{html.escape(topic["html_id"])}">{html.escape(topic["section"])}</{topic["tag"]}>'
+        links = []
+        for link_type in ['beyondlinks', 'forwardlinks', 'backwardlinks', 'basiclinks']:
+            for link in topic.get(link_type) or []:
+                links.append(f'<a class="{link_type[:-1]}" href="{html.escape(rename(link))}">link</a>')
+        for link in topic.get('lecturelinks') or []:
+            links.append(f'<a href="{html.escape(rename(link)[len(base_url):])}">lecture</a>')
+        sections.append(f'<section id="slide-{html.escape(topic["html_id"])}">{heading}<p>{" ".join(links)}</p></section>')
+    return '<!DOCTYPE html><html><head><meta charset="utf-8"></head><body><div class="reveal"><div class="slides">\n' + \
+        '\n'.join(sections) + '\n</div></div></body></html>'
+
+
+def synthesize_api_results(topics: list) -> dict:
+    """
+    Maps search terms to API responses. A topic with a single result answers its full search term; the
+    results of a topic with several results answer the fallback terms of its search term one after another.
+    """
+    responses = {}
+    for topic in topics:
+        clean_term = transform_public_enhancer.remove_special_chars_numbers(topic['section']).strip().replace(' ', '_')
+        fallback_terms = [t for t in clean_term.split('_') + transform_public_enhancer.get_ngrams(clean_term) if len(t) > 3]
+        for source, prefix in [('wikidata', 'wiki'), ('wikipedia', 'wikipedia'), ('dbpedia', 'dbpedia')]:
+            ids = topic.get(f'{prefix}_ids') or []
+            labels = topic.get(f'{prefix}_labels') or []
+            descriptions = topic.get(f'{prefix}_descriptions') or []
+            results = list(zip(ids, labels, descriptions))
+            terms = [clean_term] if len(results) == 1 else fallback_terms
+            for term, result in zip(terms, results):
+                responses.setdefault(term, {})[source] = api_response(source, *result)
+    return responses
+
+
+def api_url(source: str, clean_term: str) -> str:
+    # The same URLs transform_public_enhancer requests
+    if source == 'wikidata':
+        return f"https://www.wikidata.org/w/api.php?action=wbsearchentities&search={clean_term}&format=json&language=en&maxlag=5"
+    if source == 'wikipedia':
+        return f"https://en.wikipedia.org/w/api.php?action=query&format=json&list=search&srsearch={clean_term}&srlimit=3&maxlag=5"
+    return f"http://lookup.dbpedia.org/api/search?query={clean_term}&maxResults=1&format=json"
+
+
+def api_response(source: str, entity_id, label: str, description: str) -> dict:
+    if source == 'wikidata':
+        return {'search': [{'id': entity_id, 'label': label, 'description': description}]}
+    if source == 'wikipedia':
+        return {'query': {'search': [{'pageid': entity_id, 'title': label, 'snippet': description}]}}
+    return {'docs': [{'label': [label], 'comment': [description]}]}
+
+
+####################################################################################################
+# Local stand-in server
+####################################################################################################
+class FixtureServer:
+    """
+    Serves a fixture directory on localhost. A request for /<host>/<path>?<query> is answered with the
+    fixture of <host>/<path>?<query>. Links to the replayed hosts in HTML pages point back to the server.
+    """
+
+    def __init__(self, fixture_dir: str, port: int = 0):
+        with open(os.path.join(fixture_dir, 'index.json'), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body are written separately, with Nagle every keep-alive response waits for an ACK
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                key = unquote(self.path.lstrip('/'))
+                entry = index.get(key)
+                host = key.split('/', 1)[0]
+                if entry is not None:
+                    with open(os.path.join(fixture_dir, 'bodies', entry['file']), 'rb') as f:
+                        body = f.read()
+                    if entry['content_type'].startswith('text/html'):
+                        for replayed_host in REPLAYED_HOSTS:
+                            for scheme in ('https://', 'http://'):
+                                body = body.replace(f'{scheme}{replayed_host}/'.encode('utf-8'), f'{server.url}{replayed_host}/'.encode('utf-8'))
+                    self.reply(200, body, entry['content_type'])
+                elif host in EMPTY_API_RESPONSES:
+                    self.reply(200, json.dumps(EMPTY_API_RESPONSES[host]).encode('utf-8'), 'application/json')
+                else:
+                    self.reply(404, b'not recorded', 'text/plain')
+
+            def reply(self, status: int, body: bytes, content_type: str):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}/'
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def local_url(self, url: str) -> str:
+        """
+        Returns the URL of the server that replays the given live URL.
+        """
+        parsed = urlparse(url)
+        return self.url + parsed.netloc + parsed.path
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.httpd.shutdown()
+        self.httpd.server_close()
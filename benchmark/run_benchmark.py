@@ -0,0 +1,238 @@
+"""
+Offline benchmark of the pipeline stages.
+
+The slide decks and the Wikidata, Wikipedia, and DBpedia responses are replayed from a fixture directory
+by a local server, so the numbers do not depend on the network or the rate limits of the APIs.
+
+Usage:
+    python benchmark/run_benchmark.py                      # synthesize fixtures from final_data.csv and run
+    python benchmark/run_benchmark.py --scale 4 --repeat 3
+    python benchmark/run_benchmark.py --record benchmark/fixtures_live   # record the live sites once
+    python benchmark/run_benchmark.py --fixtures benchmark/fixtures_live --output result.json
+    python benchmark/run_benchmark.py --baseline result.json --tolerance 0.2
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, REPO_DIR)
+
+import extract_page_cache
+import extract_topic
+import http_client
+import transform_lookup_cache
+import transform_public_enhancer
+from extract_relation import add_links_to_topics, add_parent_ids
+from load_rdf import create_rdf_graph
+from rdflib import Graph
+from transform_filter import resolve_links_to_topics
+from transform_public_enhancer import add_public_data_to_topics
+
+from fixtures import FixtureServer, record_fixtures, synthesize_fixtures
+
+# Course the fixtures are recorded from and replayed for
+BENCHMARK_BASE_URL = 'https://oer.gitlab.io/OS/'
+BENCHMARK_LECTURE_IDENTIFIER = 'Operating-Systems'
+# Exported topics the synthesized fixtures are built from
+BENCHMARK_SOURCE_CSV = os.path.join(REPO_DIR, 'final_data', 'final_data.csv')
+BENCHMARK_SOURCES = ['wikipedia', 'dbpedia', 'wikidata']
+# Stages that are compared against a baseline, in the order they run
+STAGES = [
+    'get_topics_for_all_slides',
+    'add_parent_ids',
+    'add_links_to_topics',
+    'add_public_data_to_topics',
+    'resolve_links_to_topics',
+    'mark_meta_topics',
+    'create_rdf_graph',
+    'serialize_turtle',
+]
+
+
+class StageTimer:
+    """
+    Measures the wall time and the peak of the traced memory of each stage.
+    """
+
+    def __init__(self):
+        self.stages = {}
+
+    def run(self, name: str, func, *args, **kwargs):
+        tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.stages[name] = {'seconds': seconds, 'peak_memory_mb': peak / 1024 / 1024}
+
+
+def use_fresh_caches(cache_dir: str, server: FixtureServer):
+    """
+    Points the shared HTTP client, page cache, and lookup cache of the pipeline to the benchmark.
+    """
+    host = server.url.split('://', 1)[1].rstrip('/')
+    # The local server is not rate limited
+    http_client._http_client = http_client.HttpClient(rate_limits={host: (1e9, 1e9), host.split(':')[0]: (1e9, 1e9)})
+    extract_page_cache._page_cache = extract_page_cache.PageCache(os.path.join(cache_dir, 'pages'))
+    transform_lookup_cache._lookup_cache = transform_lookup_cache.LookupCache(os.path.join(cache_dir, 'lookups.sqlite'))
+
+
+def use_local_apis(server: FixtureServer):
+    """
+    Sends the Wikidata, Wikipedia, and DBpedia lookups to the local server.
+    """
+    transform_public_enhancer.WIKIDATA_API_URL = server.local_url(transform_public_enhancer.WIKIDATA_API_URL)
+    transform_public_enhancer.WIKIPEDIA_API_URL = server.local_url(transform_public_enhancer.WIKIPEDIA_API_URL)
+    transform_public_enhancer.DBPEDIA_LOOKUP_URL = server.local_url(transform_public_enhancer.DBPEDIA_LOOKUP_URL)
+
+
+def run_pipeline(base_url: str, lecture_identifier: str, sources: list, scrape_workers: int) -> dict:
+    """
+    Runs all stages once and returns the timings, throughput, and sizes.
+    """
+    timer = StageTimer()
+    slides = extract_topic.get_links_from_main_page('', base_url=base_url, lecture_identifier=lecture_identifier)
+    decks = timer.run('get_topics_for_all_slides', extract_topic.get_topics_for_all_slides, slides, max_workers=scrape_workers, base_url=base_url)
+    decks = timer.run('add_parent_ids', add_parent_ids, decks)
+    decks = timer.run('add_links_to_topics', add_links_to_topics, decks, base_url, lecture_identifier)
+    topics = [d for d in extract_topic.flatten_topics(decks).values() if d.get('id') is not None]
+    topics = timer.run('add_public_data_to_topics', add_public_data_to_topics, topics, sources)
+    topics = timer.run('resolve_links_to_topics', resolve_links_to_topics, topics)
+    topics = timer.run('mark_meta_topics', extract_topic.mark_meta_topics, topics)
+    graph = timer.run('create_rdf_graph', create_rdf_graph, topics, Graph())
+    turtle = timer.run('serialize_turtle', graph.serialize, format='turtle')
+
+    # Throughput in the unit of the stage: topics for the scrape and transform stages, triples for the graph
+    for name, stage in timer.stages.items():
+        count = len(graph) if name in ('create_rdf_graph', 'serialize_turtle') else len(topics)
+        unit = 'triples_per_s' if name in ('create_rdf_graph', 'serialize_turtle') else 'topics_per_s'
+        stage[unit] = count / stage['seconds'] if stage['seconds'] > 0 else float('inf')
+    return {
+        'decks': len(slides),
+        'topics': len(topics),
+        'triples': len(graph),
+        'turtle_bytes': len(turtle),
+        'http_requests': sum(host['requests'] for host in http_client.get_http_client().stats.values()),
+        'stages': timer.stages,
+    }
+
+
+def summarize(runs: list) -> dict:
+    """
+    Combines several runs: sizes of the last run and the median time and maximum peak memory of each stage.
+    """
+    result = {key: value for key, value in runs[-1].items() if key != 'stages'}
+    result['runs'] = len(runs)
+    result['stages'] = {}
+    for name in STAGES:
+        stages = sorted((run['stages'][name] for run in runs), key=lambda stage: stage['seconds'])
+        median = dict(stages[len(stages) // 2])
+        median['peak_memory_mb'] = max(stage['peak_memory_mb'] for stage in stages)
+        result['stages'][name] = median
+    result['total_seconds'] = sum(stage['seconds'] for stage in result['stages'].values())
+    return result
+
+
+def print_report(result: dict):
+    print(f"\n{result['decks']} decks, {result['topics']} topics, {result['triples']} triples, "
+          f"{result['http_requests']} HTTP requests in the last run, median of {result['runs']} runs")
+    print(f"{'stage':<28}{'seconds':>10}{'throughput':>22}{'peak MB':>10}")
+    for name, stage in result['stages'].items():
+        unit = 'triples/s' if 'triples_per_s' in stage else 'topics/s'
+        throughput = stage.get('triples_per_s', stage.get('topics_per_s'))
+        print(f"{name:<28}{stage['seconds']:>10.3f}{throughput:>12.0f} {unit:<9}{stage['peak_memory_mb']:>10.1f}")
+    print(f"{'total':<28}{result['total_seconds']:>10.3f}")
+
+
+def compare_to_baseline(result: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Returns the stages that are more than tolerance (e.g. 0.2 = 20 %) slower or use more memory than the baseline.
+    """
+    regressions = []
+    for name, stage in result['stages'].items():
+        base = baseline['stages'].get(name)
+        if base is None:
+            continue
+        for metric in ('seconds', 'peak_memory_mb'):
+            if base[metric] > 0 and stage[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{name}: {metric} {stage[metric]:.3f} > {base[metric]:.3f} (+{stage[metric] / base[metric] - 1:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmark of the pipeline stages.')
+    parser.add_argument('--fixtures', help='Fixture directory. Defaults to fixtures synthesized from final_data.csv.')
+    parser.add_argument('--scale', type=int, default=1, help='Number of copies of the course in synthesized fixtures.')
+    parser.add_argument('--record', metavar='DIR', help='Record the live decks and API responses into DIR and exit.')
+    parser.add_argument('--repeat', type=int, default=1, help='Number of runs, each with fresh caches.')
+    parser.add_argument('--warm', action='store_true', help='Keep the page and lookup caches between runs.')
+    parser.add_argument('--workers', type=int, default=1, help='Number of decks scraped at the same time.')
+    parser.add_argument('--output', help='Write the result as JSON to this file.')
+    parser.add_argument('--baseline', help='JSON result of an earlier run to compare against.')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown against the baseline. Defaults to 0.2.')
+    args = parser.parse_args()
+
+    if args.record:
+        def record():
+            slides = extract_topic.get_links_from_main_page('', base_url=BENCHMARK_BASE_URL, lecture_identifier=BENCHMARK_LECTURE_IDENTIFIER)
+            decks = extract_topic.get_topics_for_all_slides(slides, max_workers=args.workers, base_url=BENCHMARK_BASE_URL)
+            topics = [d for d in extract_topic.flatten_topics(add_parent_ids(decks)).values() if d.get('id') is not None]
+            add_public_data_to_topics(topics, BENCHMARK_SOURCES)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            # Empty caches, otherwise cached pages and lookups are not requested and not recorded
+            extract_page_cache._page_cache = extract_page_cache.PageCache(os.path.join(cache_dir, 'pages'))
+            transform_lookup_cache._lookup_cache = transform_lookup_cache.LookupCache(os.path.join(cache_dir, 'lookups.sqlite'))
+            record_fixtures(args.record, record)
+        print(f"Recorded fixtures to {args.record}")
+        return 0
+
+    fixture_dir = args.fixtures
+    if fixture_dir is None:
+        fixture_dir = os.path.join(REPO_DIR, '.cache', 'benchmark', f'fixtures-x{args.scale}')
+        if not os.path.exists(os.path.join(fixture_dir, 'index.json')):
+            count = synthesize_fixtures(BENCHMARK_SOURCE_CSV, fixture_dir, args.scale)
+            print(f"Synthesized fixtures with {count} topics in {fixture_dir}")
+
+    runs = []
+    cache_root = tempfile.mkdtemp(prefix='kg-benchmark-')
+    try:
+        with FixtureServer(fixture_dir) as server:
+            base_url = server.local_url(BENCHMARK_BASE_URL)
+            use_local_apis(server)
+            for i in range(args.repeat):
+                cache_dir = os.path.join(cache_root, 'warm' if args.warm else str(i))
+                use_fresh_caches(cache_dir, server)
+                runs.append(run_pipeline(base_url, BENCHMARK_LECTURE_IDENTIFIER, BENCHMARK_SOURCES, args.workers))
+                transform_lookup_cache.get_lookup_cache().close()
+    finally:
+        shutil.rmtree(cache_root, ignore_errors=True)
+
+    result = summarize(runs)
+    print_report(result)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare_to_baseline(result, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            return 1
+        print(f"No stage regressed by more than {args.tolerance:.0%}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
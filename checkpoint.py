@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from extract_page_cache import get_page_content
+from extract_relation import BASE_URL, LECTURE_IDENTIFIER, add_links_to_topics, add_parent_ids
+from extract_topic import get_topics_for_all_slides
+from transform_lookup_cache import LOOKUP_CACHE_TTL
+from transform_offline_index import OFFLINE_INDEX_PATH, index_generation
+from transform_public_enhancer import add_public_data_to_topics, search_strategy
+
+# SQLite file in which the results of the pipeline stages are stored
+CHECKPOINT_PATH = './.cache/checkpoints.sqlite'
+# Column prefix that each enrichment source writes to the topics
+SOURCE_PREFIXES = {'wikidata': 'wiki', 'wikipedia': 'wikipedia', 'dbpedia': 'dbpedia'}
+
+
+def content_hash(*parts) -> str:
+    """
+    Returns a stable hash of the given bytes, strings, or JSON serializable values.
+    """
+    h = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = json.dumps(part, sort_keys=True, default=str).encode('utf-8')
+        h.update(hashlib.sha256(part).digest())
+    return h.hexdigest()
+
+
+class CheckpointStore:
+    """
+    Stores one record per stage and key (a deck URL, a section) together with the hash of the input
+    that produced it. A record is only returned if the hash of the current input is still the same,
+    so a rerun only recomputes the decks and topics whose content changed.
+    """
+
+    def __init__(self, path: str = CHECKPOINT_PATH):
+        self.path = path
+        self.stats = {'hits': 0, 'misses': 0}
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS checkpoints ('
+            'stage TEXT NOT NULL, key TEXT NOT NULL, hash TEXT NOT NULL, payload TEXT NOT NULL, '
+            'updated_at REAL NOT NULL, PRIMARY KEY (stage, key))')
+        self._connection.commit()
+
+    def get(self, stage: str, key: str, hash: str, max_age: float = None):
+        """
+        Returns the stored payload of the stage for the key or None if it is missing, was computed from other input,
+        or was stored more than max_age seconds ago.
+        """
+        min_updated_at = time.time() - max_age if max_age is not None else 0
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT payload FROM checkpoints WHERE stage = ? AND key = ? AND hash = ? AND updated_at >= ?',
+                (stage, key, hash, min_updated_at)).fetchone()
+            self.stats['hits' if row is not None else 'misses'] += 1
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, stage: str, key: str, hash: str, payload):
+        with self._lock:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO checkpoints (stage, key, hash, payload, updated_at) VALUES (?, ?, ?, ?, ?)',
+                (stage, key, hash, json.dumps(payload), time.time()))
+            self._connection.commit()
+
+    def prune(self, stage: str, keep_keys: list):
+        """
+        Removes the records of the stage whose key is not in keep_keys, e.g. decks that are not linked anymore.
+        """
+        keep_keys = set(keep_keys)
+        with self._lock:
+            keys = [row[0] for row in self._connection.execute('SELECT key FROM checkpoints WHERE stage = ?', (stage,))]
+            self._connection.executemany(
+                'DELETE FROM checkpoints WHERE stage = ? AND key = ?', [(stage, key) for key in keys if key not in keep_keys])
+            self._connection.commit()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+def extract_decks_with_checkpoints(a_tags: list, store: CheckpointStore, base_url: str = BASE_URL, max_workers: int = 1,
+                                   lecture_identifier: str = LECTURE_IDENTIFIER) -> list:
+    """
+    Scrapes the topics, parent ids, and links of all slide decks, reusing the stored result of every deck
+    whose HTML did not change since the last run.
+
+    Args:
+    - a_tags (list): The links to the slide decks as returned by get_links_from_main_page.
+    - store (CheckpointStore): The checkpoint store.
+    - base_url (str, optional): The base URL of the decks. Defaults to BASE_URL.
+    - max_workers (int, optional): Number of decks requested at the same time. Defaults to 1.
+    - lecture_identifier (str, optional): The prefix of links to other decks of the lecture. Defaults to LECTURE_IDENTIFIER.
+
+    Returns:
+    - list: The decks with their topics, like add_links_to_topics(add_parent_ids(get_topics_for_all_slides(a_tags))).
+    """
+    urls = [base_url + a.get('href') for a in a_tags]
+    # Unchanged decks are served by the page cache, so hashing them costs a 304 at most
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        hashes = list(executor.map(lambda url: content_hash(get_page_content(url)), urls))
+
+    decks = [store.get('deck', url, h) for url, h in zip(urls, hashes)]
+    changed = [i for i, deck in enumerate(decks) if deck is None]
+    print(f"{len(changed)} of {len(decks)} slide decks changed since the last run")
+    if len(changed) > 0:
+        scraped = get_topics_for_all_slides([a_tags[i] for i in changed], max_workers=max_workers, base_url=base_url)
+        scraped = add_links_to_topics(add_parent_ids(scraped), base_url, lecture_identifier)
+        for i, deck in zip(changed, scraped):
+            decks[i] = deck
+            store.put('deck', urls[i], hashes[i], deck)
+    store.prune('deck', urls)
+    return decks
+
+
+def enrich_topics_with_checkpoints(topics: list, sources: list, store: CheckpointStore, max_workers: int = 1,
+                                   backend: str = 'api', index_path: str = None) -> list:
+    """
+    Adds the data from the public knowledge bases to the topics, reusing the stored result of every
+    section whose text did not change since the last run. Like the lookup cache, results of the APIs
+    expire after LOOKUP_CACHE_TTL, results of the offline index when the index is built again.
+
+    Args:
+    - topics (list): The flattened topics.
+    - sources (list): The knowledge bases to query ("wikidata", "wikipedia", "dbpedia").
+    - store (CheckpointStore): The checkpoint store.
+    - max_workers (int, optional): Number of lookups that run at the same time. Defaults to 1.
+    - backend (str, optional): "api" or "offline", see add_public_data_to_topics. Defaults to "api".
+    - index_path (str, optional): The offline index, see add_public_data_to_topics.
+
+    Returns:
+    - list: The enriched topics.
+    """
+    # A result is only reused if the section was looked up with the same strategy
+    strategy = search_strategy()
+    if backend == 'api':
+        max_age = LOOKUP_CACHE_TTL
+    else:
+        max_age = None
+        strategy['index'] = index_generation(index_path or OFFLINE_INDEX_PATH)
+    for source in sources:
+        prefix = SOURCE_PREFIXES[source]
+        # Results of the offline index are stored apart, so switching the backend does not reuse the other one
+        stage = 'enrich:' + source if backend == 'api' else f'enrich:{backend}:{source}'
+        columns = [f"{prefix}_ids", f"{prefix}_labels", f"{prefix}_descriptions"]
+        missing = []
+        for topic in topics:
+            if topic.get('section') is None:
+                continue
+            key = content_hash(topic.get('section'))
+            payload = store.get(stage, key, content_hash(topic.get('section'), strategy), max_age)
+            if payload is None:
+                missing.append(topic)
+            else:
+                for column, value in zip(columns, payload):
+                    topic[column] = value
+        print(f"{len(missing)} of {len(topics)} topics need {source} data")
+        if len(missing) > 0:
+            failed = []
+            add_public_data_to_topics(missing, [source], max_workers, backend, failed, index_path)
+            # The results of failed lookups are not stored, the next run asks for them again
+            failed = {id(topic) for topic in failed}
+            for topic in missing:
+                if id(topic) in failed:
+                    continue
+                store.put(stage, content_hash(topic.get('section')), content_hash(topic.get('section'), strategy),
+                          [topic.get(column) for column in columns])
+    return topics
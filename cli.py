@@ -0,0 +1,525 @@
+"""
+Command-line entry point of the pipeline.
+
+Every step reads its topics from a file and writes them to a new one, so the steps can be run and
+repeated separately, e.g. from cron:
+
+    python cli.py extract --output enhanced_topics.topics
+    python cli.py enrich --input enhanced_topics.topics --output enriched_topics.topics
+    python cli.py build-index --wikidata latest-all.json.bz2 --wikipedia enwiki-cirrussearch-content.json.gz
+    python cli.py enrich --backend offline --input enhanced_topics.topics --output enriched_topics.topics
+    python cli.py stream --output topics.ttl
+    python cli.py resolve --input enriched_topics.topics --output final_data_export.topics
+    python cli.py export-ttl --input final_data_export.topics --output topics.ttl
+    python cli.py export-ttl --input final_data_export.topics --output topics.nt --workers 8
+    python cli.py load-neo4j --input final_data_export.topics
+    python cli.py health --max-age 86400
+    python cli.py load-store --input final_data_export.topics
+    python cli.py query --topic 01.2 --broader
+    python cli.py serve --port 7878
+    python cli.py build-graph --input final_data_export.topics
+    python cli.py traverse --topic 01.2 --hops 2
+    python cli.py evaluate evaluated/eval_enhanced_topics_2.xlsx final_data/final_data.csv
+
+Options can also be given in a JSON file with --config (e.g. {"base_url": "...", "workers": 8}); options on
+the command line take precedence. Heavy dependencies are only imported by the subcommands that need them,
+so cheap subcommands such as health start quickly.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+DEFAULT_BASE_URL = 'https://oer.gitlab.io/OS/'
+DEFAULT_LECTURE_IDENTIFIER = 'Operating-Systems'
+DEFAULT_SOURCES = 'wikipedia,dbpedia,wikidata'
+DEFAULT_METRICS_REPORT = 'run_metrics.json'
+
+
+####################################################################################################
+# Helper functions
+####################################################################################################
+def write_topics(topics: list, path: str):
+    """
+    Writes the topics as CSV if the path ends with .csv, otherwise as topic store.
+    """
+    from topic_store import export_topics_csv, save_topics
+    if path.endswith('.csv'):
+        export_topics_csv(topics, path)
+    else:
+        save_topics(topics, path)
+    print(f"Saved {len(topics)} topics to {path}")
+
+
+def run_with_metrics(args, func) -> int:
+    """
+    Runs a subcommand and writes its metrics report, also if it fails.
+    """
+    from run_metrics import RunMetrics
+    metrics = RunMetrics()
+    try:
+        func(args, metrics)
+    except BaseException:
+        metrics.finish(success=False)
+        raise
+    else:
+        metrics.finish(success=True)
+    finally:
+        if args.metrics_report:
+            metrics.write_json(args.metrics_report)
+        if args.metrics_textfile:
+            metrics.write_prometheus(args.metrics_textfile)
+    return 0
+
+
+####################################################################################################
+# Subcommands
+####################################################################################################
+def extract(args, metrics):
+    from extract_relation import add_links_to_topics, add_parent_ids
+    from extract_topic import flatten_topics, get_links_from_main_page, get_topics_for_all_slides
+
+    with metrics.stage('extract') as stage:
+        if args.courses:
+            # Every course is extracted in its own process, the links are resolved across all courses
+            from pipeline import run_courses
+            with open(args.courses, 'r', encoding='utf-8') as f:
+                courses = json.load(f)
+            topics = run_courses(courses, sources=[], scrape_workers=args.workers)
+        else:
+            slides = get_links_from_main_page('', base_url=args.base_url, lecture_identifier=args.lecture_identifier)
+            if args.checkpoints:
+                from checkpoint import CheckpointStore, extract_decks_with_checkpoints
+                store = CheckpointStore()
+                metrics.watch_cache('checkpoints', store.stats)
+                decks = extract_decks_with_checkpoints(slides, store, base_url=args.base_url, max_workers=args.workers,
+                                                       lecture_identifier=args.lecture_identifier)
+            else:
+                decks = get_topics_for_all_slides(slides, max_workers=args.workers, base_url=args.base_url)
+                decks = add_links_to_topics(add_parent_ids(decks), args.base_url, args.lecture_identifier)
+            topics = [d for d in flatten_topics(decks).values() if d.get('id') is not None]
+        stage['topics_out'] = len(topics)
+    write_topics(topics, args.output)
+
+
+def enrich(args, metrics):
+    from topic_store import read_topics
+
+    topics = read_topics(args.input)
+    sources = [source.strip() for source in args.sources.split(',') if source.strip()]
+    with metrics.stage('enrich', topics_in=len(topics)) as stage:
+        if args.checkpoints:
+            from checkpoint import CheckpointStore, enrich_topics_with_checkpoints
+            store = CheckpointStore()
+            metrics.watch_cache('checkpoints', store.stats)
+            topics = enrich_topics_with_checkpoints(topics, sources, store, args.workers, args.backend, args.index)
+        else:
+            from transform_public_enhancer import add_public_data_to_topics
+            topics = add_public_data_to_topics(topics, sources, args.workers, args.backend, index_path=args.index)
+        stage['topics_out'] = len(topics)
+    write_topics(topics, args.output)
+
+
+def build_index(args, metrics):
+    from transform_offline_index import build_index as build
+
+    dumps = {source: getattr(args, source) for source in ('wikidata', 'wikipedia') if getattr(args, source)}
+    if not dumps:
+        raise SystemExit('build-index needs --wikidata and/or --wikipedia')
+    with metrics.stage('build_index') as stage:
+        counts = build(args.output, dumps)
+        stage['topics_out'] = sum(counts.values())
+    for source, count in counts.items():
+        print(f"Indexed {count} {source} entities in {args.output}")
+
+
+def stream(args, metrics):
+    from pipeline import run_streaming
+
+    sources = [source.strip() for source in args.sources.split(',') if source.strip()]
+    store = None
+    if args.checkpoints:
+        from checkpoint import CheckpointStore
+        store = CheckpointStore()
+        metrics.watch_cache('checkpoints', store.stats)
+    with metrics.stage('stream') as stage:
+        stats = run_streaming(args.base_url, args.lecture_identifier, args.output, sources, args.workers, args.backend, store,
+                              args.index)
+        stage['topics_out'] = stats['topics']
+        stage['triples'] = stats['triples']
+        stage['largest_deck'] = stats['largest_deck']
+
+
+def resolve(args, metrics):
+    from extract_topic import mark_meta_topics
+    from topic_store import read_topics
+    from transform_filter import resolve_links_to_topics
+
+    topics = read_topics(args.input)
+    with metrics.stage('resolve', topics_in=len(topics)) as stage:
+        topics = resolve_links_to_topics(topics)
+        stage['topics_out'] = len(topics)
+    with metrics.stage('mark_meta', topics_in=len(topics)) as stage:
+        rules = None
+        if args.meta_rules:
+            from transform_rules import RuleSet
+            rules = RuleSet.from_file(args.meta_rules)
+        topics = mark_meta_topics(topics, rules)
+        stage['topics_out'] = len(topics)
+    write_topics(topics, args.output)
+
+
+def export_ttl(args, metrics):
+    from topic_store import read_topics
+
+    topics = read_topics(args.input)
+    with metrics.stage('export_turtle', topics_in=len(topics)) as stage:
+        if args.output.endswith('.nt'):
+            # Sorted N-Triples, built in parallel by --workers processes
+            from load_rdf import write_sorted_ntriples
+            stage['triples'] = write_sorted_ntriples(topics, args.output, args.workers)
+        elif args.patch:
+            from load_delta import write_turtle_with_patch
+            delta = write_turtle_with_patch(topics, args.output, stream=args.stream)
+            stage['triples'] = delta['triples']
+            stage['triples_added'], stage['triples_removed'] = delta['added'], delta['removed']
+        elif args.stream:
+            from load_rdf import write_turtle
+            stage['triples'] = write_turtle(topics, args.output)
+        else:
+            from rdflib import Graph
+            from load_rdf import create_rdf_graph, safe_string_as_txt
+            g = create_rdf_graph(topics, Graph())
+            safe_string_as_txt(g.serialize(format='turtle'), args.output)
+            stage['triples'] = len(g)
+    print(f"Wrote {stage['triples']} triples to {args.output}")
+    if stage.get('triples_added') is not None:
+        print(f"Wrote {stage['triples_added']} added and {stage['triples_removed']} removed triples to {args.output}.patch")
+
+
+def load_neo4j(args, metrics):
+    from load_neo4j import create_neo4j_driver, sync_topics_to_neo4j
+    from topic_store import read_topics
+
+    topics = read_topics(args.input)
+    with metrics.stage('load_neo4j', topics_in=len(topics)) as stage:
+        driver = create_neo4j_driver(args.neo4j_uri, args.neo4j_user, args.neo4j_password)
+        try:
+            delta = sync_topics_to_neo4j(topics, driver, args.snapshot, database=args.database,
+                                         batch_size=args.batch_size, full=args.full)
+            stage['triples'] = delta['triples']
+            stage['triples_added'], stage['triples_removed'] = delta['added'], delta['removed']
+        finally:
+            driver.close()
+    print(f"Loaded {stage['triples']} triples into Neo4j")
+
+
+def health(args) -> int:
+    """
+    Checks that the last run finished successfully and is not older than --max-age seconds.
+    """
+    problems = []
+    try:
+        with open(args.report, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+    except (OSError, ValueError) as e:
+        problems.append(f"cannot read run report {args.report}: {e}")
+    else:
+        age = time.time() - report.get('finished_at', 0)
+        if report.get('success') is not True:
+            failed_stage = next(reversed(report.get('stages', {})), None)
+            problems.append(f"last run failed (last stage: {failed_stage})")
+        if args.max_age is not None and age > args.max_age:
+            problems.append(f"last run finished {age:.0f}s ago, more than {args.max_age:.0f}s")
+    if args.neo4j:
+        from neo4j import GraphDatabase
+        try:
+            with GraphDatabase.driver(args.neo4j_uri, auth=(args.neo4j_user, args.neo4j_password)) as driver:
+                driver.verify_connectivity()
+        except Exception as e:
+            problems.append(f"cannot connect to Neo4j at {args.neo4j_uri}: {e}")
+
+    for problem in problems:
+        print(f"UNHEALTHY: {problem}")
+    if not problems:
+        print('OK')
+    return 1 if problems else 0
+
+
+def load_store(args, metrics):
+    from load_store import TripleStore
+
+    store = TripleStore(args.store)
+    if args.input.endswith(('.ttl', '.nt')):
+        with metrics.stage('load_store') as stage:
+            store.load_file(args.input)
+    else:
+        from topic_store import read_topics
+        topics = read_topics(args.input)
+        with metrics.stage('load_store', topics_in=len(topics)) as stage:
+            stage['triples'] = store.load_topics(topics, args.workers)
+    print(f"Loaded {args.input} into {args.store}")
+
+
+def query(args) -> int:
+    """
+    Runs a SPARQL query or a canned query against the triple store and prints the result as JSON.
+    """
+    from load_store import TripleStore
+
+    store = TripleStore(args.store, read_only=True)
+    if args.sparql:
+        result = store.query(args.sparql)
+    elif args.topic is None:
+        raise SystemExit('query needs --sparql or --topic')
+    elif args.broader:
+        result = store.broader_chain(args.topic)
+    elif args.narrower:
+        result = store.narrower_topics(args.topic)
+    elif args.related:
+        result = store.related_entities(args.topic)
+    else:
+        result = store.topic(args.topic)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    return 0
+
+
+def serve(args) -> int:
+    """
+    Serves the triple store as SPARQL endpoint until interrupted.
+    """
+    from load_store import TripleStore, create_server
+
+    server = create_server(TripleStore(args.store, read_only=True, cache_size=args.cache_size), args.host, args.port)
+    print(f"Serving {args.store} on http://{args.host}:{server.server_address[1]}/sparql")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def build_graph(args, metrics):
+    from topic_graph import TopicGraph
+    from topic_store import read_topics
+
+    topics = read_topics(args.input)
+    with metrics.stage('build_graph', topics_in=len(topics)) as stage:
+        graph = TopicGraph.from_topics(topics)
+        graph.save(args.output)
+        stage['topics_out'] = len(graph.ids)
+    print(f"Saved {len(graph.ids)} topics and {len(graph.indices)} edges to {args.output}")
+
+
+def traverse(args) -> int:
+    """
+    Answers a traversal from the memory-mapped topic graph and prints the result as JSON.
+    """
+    from topic_graph import EDGE_TYPES, TopicGraph
+
+    edge_types = [edge_type.strip() for edge_type in args.edge_types.split(',')] if args.edge_types else None
+    unknown = [edge_type for edge_type in edge_types or [] if edge_type not in EDGE_TYPES]
+    if unknown:
+        raise SystemExit(f"Unknown edge types {', '.join(unknown)}, use {', '.join(EDGE_TYPES)}")
+    graph = TopicGraph.load(args.graph)
+    try:
+        if args.prerequisite:
+            result = graph.prerequisite_path(args.topic, args.prerequisite)
+        elif args.path_to:
+            result = graph.shortest_path(args.topic, args.path_to, edge_types)
+        elif args.subtree:
+            result = graph.subtree(args.topic)
+        else:
+            result = graph.k_hop(args.topic, args.hops, edge_types)
+    except KeyError as e:
+        raise SystemExit(f"Unknown topic {e.args[0]} in {args.graph}")
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+def evaluate(args) -> int:
+    """
+    Prints the coverage, precision, and classification accuracy of annotated sheets or exported topics.
+    """
+    from load_evaluate import evaluate as evaluate_sheet, evaluation_to_dict, load_sheet, print_evaluation
+
+    report = {}
+    for path in args.sheets:
+        results = evaluate_sheet(load_sheet(path, use_cache=args.cache))
+        print_evaluation(path, results)
+        report[path] = evaluation_to_dict(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+####################################################################################################
+# Argument parsing
+####################################################################################################
+def load_config(argv: list) -> dict:
+    """
+    Returns the options of the --config file, with "-" in the keys replaced by "_".
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--config')
+    args, _ = parser.parse_known_args(argv)
+    if args.config is None:
+        return {}
+    with open(args.config, 'r', encoding='utf-8') as f:
+        return {key.replace('-', '_'): value for key, value in json.load(f).items()}
+
+
+def add_neo4j_arguments(parser):
+    # The credentials are read from the environment (or .env) by default, so they do not end up in the process list
+    parser.add_argument('--neo4j-uri', default=os.getenv('NEO4J_URI'), help='Defaults to $NEO4J_URI.')
+    parser.add_argument('--neo4j-user', default=os.getenv('NEO4J_USER'), help='Defaults to $NEO4J_USER.')
+    parser.add_argument('--neo4j-password', default=os.getenv('NEO4J_PASSWORD'), help='Defaults to $NEO4J_PASSWORD.')
+
+
+def create_parser(config: dict = None) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='cli.py', description='Generate a knowledge graph from web-based educational resources.')
+    parser.add_argument('--config', help='JSON file with default values for the options.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_command(name: str, help_text: str, func, reads: bool = True, writes: str = None):
+        subparser = subparsers.add_parser(name, help=help_text)
+        subparser.set_defaults(func=func)
+        if reads:
+            subparser.add_argument('--input', default='enhanced_topics.topics', help='Topic store or CSV to read.')
+        if writes is not None:
+            subparser.add_argument('--output', default=writes, help=f'File to write. Defaults to {writes}.')
+        subparser.add_argument('--metrics-report', default=DEFAULT_METRICS_REPORT, help='JSON run report, empty to disable.')
+        subparser.add_argument('--metrics-textfile', default=os.getenv('METRICS_TEXTFILE', ''), help='Prometheus textfile.')
+        return subparser
+
+    subparser = add_command('extract', 'Scrape the topics and links of the slide decks.', extract, reads=False, writes='enhanced_topics.topics')
+    subparser.add_argument('--base-url', default=DEFAULT_BASE_URL)
+    subparser.add_argument('--lecture-identifier', default=DEFAULT_LECTURE_IDENTIFIER)
+    subparser.add_argument('--courses', help='JSON file with a list of courses, each processed in its own process.')
+    subparser.add_argument('--workers', type=int, default=8, help='Number of decks scraped at the same time.')
+    subparser.add_argument('--no-checkpoints', dest='checkpoints', action='store_false', help='Scrape all decks again.')
+
+    subparser = add_command('enrich', 'Look up the topics in Wikipedia, Wikidata, and DBpedia.', enrich, writes='enriched_topics.topics')
+    subparser.add_argument('--sources', default=DEFAULT_SOURCES, help=f'Comma separated. Defaults to {DEFAULT_SOURCES}.')
+    subparser.add_argument('--workers', type=int, default=4, help='Number of lookups that run at the same time.')
+    subparser.add_argument('--no-checkpoints', dest='checkpoints', action='store_false', help='Query all sections again.')
+    subparser.add_argument('--backend', choices=['api', 'offline'], default='api', help='Query the public APIs or a local index.')
+    subparser.add_argument('--index', default='./.cache/entities.sqlite', help='Offline index built with build-index.')
+
+    subparser = add_command('build-index', 'Build the offline index from Wikidata and Wikipedia dumps.', build_index,
+                            reads=False, writes='./.cache/entities.sqlite')
+    subparser.add_argument('--wikidata', help='Wikidata JSON dump (.json, .json.bz2, or .json.gz).')
+    subparser.add_argument('--wikipedia', help='Wikipedia CirrusSearch content dump (.json, .json.bz2, or .json.gz).')
+
+    subparser = add_command('stream', 'Scrape, enrich, and export the decks one at a time, with memory bounded by the largest deck.',
+                            stream, reads=False, writes='topics.ttl')
+    subparser.add_argument('--base-url', default=DEFAULT_BASE_URL)
+    subparser.add_argument('--lecture-identifier', default=DEFAULT_LECTURE_IDENTIFIER)
+    subparser.add_argument('--sources', default=DEFAULT_SOURCES, help=f'Comma separated. Defaults to {DEFAULT_SOURCES}.')
+    subparser.add_argument('--workers', type=int, default=4, help='Number of lookups that run at the same time.')
+    subparser.add_argument('--no-checkpoints', dest='checkpoints', action='store_false', help='Query all sections again.')
+    subparser.add_argument('--backend', choices=['api', 'offline'], default='api', help='Query the public APIs or a local index.')
+    subparser.add_argument('--index', default='./.cache/entities.sqlite', help='Offline index built with build-index.')
+
+    subparser = add_command('resolve', 'Resolve the links to topic ids and classify the topics.', resolve, writes='final_data_export.topics')
+    subparser.add_argument('--meta-rules', help='JSON file with the classification rules. Defaults to config/meta_rules.json.')
+
+    subparser = add_command('export-ttl', 'Write the knowledge graph as Turtle.', export_ttl, writes='topics.ttl')
+    subparser.add_argument('--no-stream', dest='stream', action='store_false', help='Serialize an in-memory graph instead.')
+    subparser.add_argument('--no-patch', dest='patch', action='store_false', help='Do not write the changes as <output>.patch.')
+    subparser.add_argument('--workers', type=int, help='Processes that build the triples of an .nt output. Defaults to the number of CPUs.')
+
+    subparser = add_command('load-neo4j', 'Load the knowledge graph into Neo4j.', load_neo4j)
+    add_neo4j_arguments(subparser)
+    subparser.add_argument('--database', default='neo4j')
+    subparser.add_argument('--batch-size', type=int, default=1000, help='Topics and rows per statement.')
+    subparser.add_argument('--snapshot', default='neo4j.snapshot.nt.gz', help='Triples of the last load, only the changes are sent.')
+    subparser.add_argument('--full', action='store_true', help='Load all triples, e.g. after the database was reset.')
+
+    subparser = subparsers.add_parser('health', help='Check the last run, for monitoring.')
+    subparser.set_defaults(func=None)
+    subparser.add_argument('--report', default=DEFAULT_METRICS_REPORT, help='JSON run report of the last run.')
+    subparser.add_argument('--max-age', type=float, help='Maximum age of the last run in seconds.')
+    subparser.add_argument('--neo4j', action='store_true', help='Also check the connection to Neo4j.')
+    add_neo4j_arguments(subparser)
+
+    subparser = add_command('load-store', 'Load the knowledge graph into the on-disk triple store.', load_store)
+    subparser.add_argument('--store', default='./.cache/kg_store', help='Directory of the triple store.')
+    subparser.add_argument('--workers', type=int, help='Processes that build the triples. Defaults to the number of CPUs.')
+    subparser.set_defaults(input='final_data_export.topics')
+
+    subparser = subparsers.add_parser('query', help='Query the triple store.')
+    subparser.set_defaults(func=None)
+    subparser.add_argument('--store', default='./.cache/kg_store', help='Directory of the triple store.')
+    subparser.add_argument('--sparql', help='SPARQL SELECT or ASK query, the skos, schema, and lecture prefixes are declared.')
+    subparser.add_argument('--topic', help='Id of a topic, e.g. 01.2.')
+    group = subparser.add_mutually_exclusive_group()
+    group.add_argument('--broader', action='store_true', help='The topics above the topic.')
+    group.add_argument('--narrower', action='store_true', help='The topics below the topic.')
+    group.add_argument('--related', action='store_true', help='The entities of the topic.')
+
+    subparser = subparsers.add_parser('serve', help='Serve the triple store as SPARQL endpoint.')
+    subparser.set_defaults(func=None)
+    subparser.add_argument('--store', default='./.cache/kg_store', help='Directory of the triple store.')
+    subparser.add_argument('--host', default='127.0.0.1')
+    subparser.add_argument('--port', type=int, default=7878)
+    subparser.add_argument('--cache-size', type=int, default=1024, help='Number of query results kept in memory.')
+
+    subparser = add_command('build-graph', 'Compile the topic relations into memory-mappable CSR arrays.', build_graph,
+                            writes='./.cache/topic_graph')
+    subparser.set_defaults(input='final_data_export.topics')
+
+    subparser = subparsers.add_parser('traverse', help='Traverse the topic graph built by build-graph.')
+    subparser.set_defaults(func=None)
+    subparser.add_argument('--graph', default='./.cache/topic_graph', help='Directory written by build-graph.')
+    subparser.add_argument('--topic', required=True, help='Id of the start topic, e.g. 01.2.')
+    subparser.add_argument('--edge-types', help='Comma separated, of parent, child, forward, backward, lecture. Defaults to all.')
+    group = subparser.add_mutually_exclusive_group()
+    group.add_argument('--hops', type=int, default=1, help='Topics at most this many edges away. Defaults to 1.')
+    group.add_argument('--path-to', help='Shortest path to this topic.')
+    group.add_argument('--prerequisite', help='Shortest chain of backward links to this topic.')
+    group.add_argument('--subtree', action='store_true', help='All topics below the topic.')
+
+    subparser = subparsers.add_parser('evaluate', help='Evaluate annotated sheets or exported topics.')
+    subparser.set_defaults(func=None)
+    subparser.add_argument('sheets', nargs='+', help='CSV files, Excel sheets, or topic stores.')
+    subparser.add_argument('--json', help='Also write the metrics to this JSON file.')
+    subparser.add_argument('--no-cache', dest='cache', action='store_false', help='Parse the sheets again.')
+
+    # Values of the config file replace the defaults, options on the command line still take precedence
+    for subparser in subparsers.choices.values():
+        subparser.set_defaults(**(config or {}))
+    return parser
+
+
+def main(argv: list = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    args = create_parser(load_config(argv)).parse_args(argv)
+
+    if (args.command == 'load-neo4j' or getattr(args, 'neo4j', False)) and args.neo4j_uri is None:
+        # Only these commands need the credentials from the .env file
+        from dotenv import load_dotenv
+        load_dotenv()
+        for name in ('uri', 'user', 'password'):
+            if getattr(args, f'neo4j_{name}') is None:
+                setattr(args, f'neo4j_{name}', os.getenv(f'NEO4J_{name.upper()}'))
+
+    if args.command == 'health':
+        return health(args)
+    if args.command == 'evaluate':
+        return evaluate(args)
+    if args.command == 'traverse':
+        return traverse(args)
+    if args.command == 'query':
+        return query(args)
+    if args.command == 'serve':
+        return serve(args)
+    return run_with_metrics(args, args.func)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
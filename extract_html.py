@@ -0,0 +1,53 @@
+from lxml import html as lxml_html
+
+# Heading tags that define the topics of a slide deck, in the order get_h_from_page returns them
+HEADING_TAGS = ('h1', 'h2', 'h3', 'h4')
+
+
+def get_link_record(a) -> dict:
+    """
+    Returns the href, text, class, and id of an <a> element in the same shape as get_a_from_html.
+    """
+    classes = a.get('class')
+    return {'href': a.get('href'), 'text': a.text_content(), 'class': classes.split() if classes is not None else None, 'html_id': a.get('id')}
+
+
+def extract_deck(url: str, content: bytes) -> tuple:
+    """
+    Extracts the headings of a slide deck and the links of their slide sections in one pass over the page.
+
+    The headings have the shape of get_h_from_page (all <h1> first, then <h2>, <h3>, and <h4>, each in
+    document order), which add_parent_ids relies on. The links of a heading are the <a> tags inside the
+    first <section id="slide-<html_id>">, in the shape add_links_to_page expects.
+
+    Args:
+    - url (str): The URL of the slide deck.
+    - content (bytes): The HTML of the slide deck.
+
+    Returns:
+    - tuple: (headings, sections). sections maps the html_id of a heading to the list of its links.
+    """
+    root = lxml_html.fromstring(content)
+    headings = {tag: [] for tag in HEADING_TAGS}
+    slide_sections = {}
+    for element in root.iter(*HEADING_TAGS, 'section'):
+        if element.tag == 'section':
+            section_id = element.get('id')
+            if section_id is not None and section_id not in slide_sections:
+                slide_sections[section_id] = element
+        else:
+            headings[element.tag].append({
+                "text": element.text_content(),
+                "html_id": element.get("id") if element.get("id") is not None else "",
+                "tag": element.tag,
+                "url": url
+            })
+    headings = [heading for tag in HEADING_TAGS for heading in headings[tag]]
+
+    # Only collect the links of sections that belong to a heading
+    sections = {}
+    for heading in headings:
+        section = slide_sections.get('slide-' + heading['html_id'])
+        if section is not None and heading['html_id'] not in sections:
+            sections[heading['html_id']] = [get_link_record(a) for a in section.iter('a')]
+    return headings, sections
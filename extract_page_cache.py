@@ -0,0 +1,175 @@
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import urldefrag
+
+from http_client import http_get
+
+# Directory in which the downloaded pages are stored
+PAGE_CACHE_DIR = './.cache/pages'
+# Upper bound for the size of all cached pages, the least recently used pages are evicted first
+PAGE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# Number of seconds a cached page is served without asking the server again
+PAGE_CACHE_MAX_AGE = 10 * 60
+# Number of cache hits after which the access times are saved, so the LRU order survives the run
+PAGE_CACHE_FLUSH_HITS = 50
+
+
+class PageCache:
+    """
+    On-disk store for HTML pages that is keyed by URL and shared by the extract modules.
+
+    Pages that were validated less than max_age seconds ago are served from disk without any request.
+    Older pages are revalidated with a conditional request (ETag / Last-Modified), so an unchanged page
+    only costs a 304 response. If the stored pages exceed max_bytes, the least recently used ones are removed.
+    """
+
+    def __init__(self, cache_dir: str = PAGE_CACHE_DIR, max_bytes: int = PAGE_CACHE_MAX_BYTES, max_age: float = PAGE_CACHE_MAX_AGE):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.stats = {'hits': 0, 'not_modified': 0, 'misses': 0}
+        self._unsaved_hits = 0
+        self._lock = threading.Lock()
+        self._index_path = os.path.join(cache_dir, 'index.json')
+        os.makedirs(cache_dir, exist_ok=True)
+        self._index = self._read_index()
+
+    def get(self, url: str) -> bytes:
+        """
+        Returns the content of the page behind the url, downloading it only if it is missing or has changed.
+
+        Args:
+        - url (str): The URL of the page. The fragment is ignored because the server never sees it.
+
+        Returns:
+        - bytes: The raw content of the page.
+        """
+        url = urldefrag(url)[0]
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        with self._lock:
+            entry = self._index.get(key)
+            content = self._read_body(key) if entry is not None else None
+            if content is not None and time.time() - entry['validated_at'] < self.max_age:
+                entry['accessed_at'] = time.time()
+                self.stats['hits'] += 1
+                self._unsaved_hits += 1
+                if self._unsaved_hits >= PAGE_CACHE_FLUSH_HITS:
+                    self._write_index()
+                return content
+
+        headers = {}
+        if content is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        response = http_get(url, headers=headers)
+
+        with self._lock:
+            if response.status_code == 304 and content is not None:
+                entry['validated_at'] = entry['accessed_at'] = time.time()
+                self.stats['not_modified'] += 1
+                self._write_index()
+                return content
+            self.stats['misses'] += 1
+            # Only successful responses are worth keeping
+            if not response.ok:
+                return response.content
+            self._write_body(key, response.content)
+            self._index[key] = {
+                'url': url,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'size': len(response.content),
+                'validated_at': time.time(),
+                'accessed_at': time.time(),
+            }
+            self._evict()
+            self._write_index()
+        return response.content
+
+    def flush(self):
+        """
+        Saves the access times of the pages that were served from the cache since the index was last written.
+        """
+        with self._lock:
+            if self._unsaved_hits > 0:
+                self._write_index()
+
+    def _evict(self):
+        # Remove the least recently used pages until the cache fits into max_bytes again
+        total = sum(entry['size'] for entry in self._index.values())
+        for key, entry in sorted(self._index.items(), key=lambda item: item[1]['accessed_at']):
+            if total <= self.max_bytes:
+                break
+            total -= entry['size']
+            del self._index[key]
+            try:
+                os.remove(self._body_path(key))
+            except OSError:
+                pass
+
+    def _body_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + '.html')
+
+    def _read_body(self, key: str):
+        try:
+            with open(self._body_path(key), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_body(self, key: str, content: bytes):
+        # Write to a temporary file first so that a crash never leaves a half written page behind
+        tmp_path = self._body_path(key) + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, self._body_path(key))
+
+    def _read_index(self) -> dict:
+        try:
+            with open(self._index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_index(self):
+        tmp_path = self._index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self._index_path)
+        self._unsaved_hits = 0
+
+
+_page_cache = None
+_page_cache_lock = threading.Lock()
+
+
+def get_page_cache() -> PageCache:
+    """
+    Returns the page cache that is shared by extract_topic and extract_relation.
+    """
+    global _page_cache
+    with _page_cache_lock:
+        if _page_cache is None:
+            _page_cache = PageCache()
+            # The last hits of a run are saved when the interpreter exits
+            atexit.register(_page_cache.flush)
+        return _page_cache
+
+
+def get_page_content(url: str) -> bytes:
+    """
+    Returns the content of the page behind the url from the shared page cache.
+
+    Args:
+    - url (str): The URL of the page.
+
+    Returns:
+    - bytes: The raw content of the page.
+    """
+    return get_page_cache().get(url)
@@ -1,9 +1,12 @@
-import requests
 from bs4 import BeautifulSoup
 from urllib.parse import urlparse, urlunparse
 from tqdm import tqdm
 
+from extract_html import extract_deck
+from extract_page_cache import get_page_content
+
 BASE_URL = 'https://oer.gitlab.io/OS/'
+LECTURE_IDENTIFIER = 'Operating-Systems'
 
 
 ##########################
@@ -11,8 +14,8 @@ BASE_URL = 'https://oer.gitlab.io/OS/'
 ###########################
 
 def get_html_from_url(url: str) -> str:
-    response = requests.get(url)
-    return BeautifulSoup(response.content, 'html.parser')
+    # The page was usually downloaded already while scraping the topics, so this is served by the page cache
+    return BeautifulSoup(get_page_content(url), 'html.parser')
 
 def get_a_from_html(html: str) -> list:
     """
@@ -40,17 +43,20 @@ def filter_links(links: list, classFilter: str, pageLink: str) -> list:
             filteredLinks.append(href)
     return filteredLinks
 
-def get_lecture_links(links: list, pageLink: str) -> list:
+def get_lecture_links(links: list, pageLink: str, base_url: str = BASE_URL, lecture_identifier: str = LECTURE_IDENTIFIER, linked_urls: tuple = ()) -> list:
     filteredLinks = []
-    # Check if class is None and if href starts with 'Operating-Systems'
+    # Check if class is None and if href starts with the lecture identifier (e.g. 'Operating-Systems')
     for link in links:
-        if link.get('class') is None and link.get('href') is not None and link.get('href').startswith('Operating-Systems'):
+        if link.get('class') is None and link.get('href') is not None and link.get('href').startswith(lecture_identifier):
             # if href is relative, make it absolute by removing existing anchor and replacing it with the href
-            href = BASE_URL + link.get('href')
+            href = base_url + link.get('href')
             filteredLinks.append(href)
+        # Absolute links to the decks of other courses of a multi-course run (linked_urls are their base url + identifier)
+        elif link.get('class') is None and link.get('href') is not None and link.get('href').startswith(tuple(linked_urls)):
+            filteredLinks.append(link.get('href'))
     return filteredLinks
   
-def add_links_to_page(page: dict, html: str) -> dict:
+def add_links_to_page(page: dict, html: str, base_url: str = BASE_URL, lecture_identifier: str = LECTURE_IDENTIFIER, linked_urls: tuple = ()) -> dict:
     """
     Adds the given list of <a> tags to the given page dictionary.
 
@@ -61,21 +67,56 @@ def add_links_to_page(page: dict, html: str) -> dict:
     Returns:
     - dict: The page dictionary with the <a> tags added.
     """
-    links = get_a_from_html(html)
+    return add_link_records_to_page(page, get_a_from_html(html), base_url, lecture_identifier, linked_urls)
+
+def add_link_records_to_page(page: dict, links: list, base_url: str = BASE_URL, lecture_identifier: str = LECTURE_IDENTIFIER, linked_urls: tuple = ()) -> dict:
+    """
+    Sorts the given links into the link types of the page (beyondlinks, forwardlinks, backwardlinks, basiclinks, and lecturelinks).
+
+    Args:
+    - page (dict): The page dictionary to add the links to.
+    - links (list): The links as dictionaries with href, text, class, and html_id.
+    - base_url (str, optional): The base URL that relative lecture links are resolved against. Defaults to BASE_URL.
+    - lecture_identifier (str, optional): The prefix of links to other decks of the lecture. Defaults to LECTURE_IDENTIFIER.
+    - linked_urls (tuple, optional): Prefixes of absolute links to decks of other courses. Defaults to none.
+
+    Returns:
+    - dict: The page dictionary with the links added.
+    """
     page['beyondlinks'] = filter_links(links, 'beyondlink', page.get('url'))
     page['forwardlinks'] = filter_links(links, 'forwardlink', page.get('url'))
     page['backwardlinks'] = filter_links(links, 'backwardlink', page.get('url'))
     page['basiclinks'] = filter_links(links, 'basiclink', page.get('url'))
-    page['lecturelinks'] = get_lecture_links(links, page.get('url'))
+    page['lecturelinks'] = get_lecture_links(links, page.get('url'), base_url, lecture_identifier, linked_urls)
     return page
 
-def add_links_to_topics(slides: list) -> list:
+def add_links_to_deck(deck: dict, base_url: str = BASE_URL, lecture_identifier: str = LECTURE_IDENTIFIER, linked_urls: tuple = ()) -> dict:
+    """
+    Adds the links of their sections to the topics of a single slide deck, see add_link_records_to_page.
+
+    Args:
+    - deck (dict): The deck with its title, topics, and the links of their sections.
+    - base_url (str, optional): The base URL that relative lecture links are resolved against. Defaults to BASE_URL.
+    - lecture_identifier (str, optional): The prefix of links to other decks of the lecture. Defaults to LECTURE_IDENTIFIER.
+    - linked_urls (tuple, optional): Prefixes of absolute links to decks of other courses. Defaults to none.
+
+    Returns:
+    - dict: The deck, the links of the sections are removed once they were added to the topics.
+    """
+    # The links were extracted together with the topics, only older decks have to be parsed again
+    sections = deck.pop('sections', None)
+    if sections is None:
+        url = deck.get('topics')[0].get('url')
+        _, sections = extract_deck(url, get_page_content(url))
+    for topic in tqdm(deck.get('topics'), desc=deck.get('title'), leave=False, colour='green'):
+        links = sections.get(topic.get('html_id'))
+        if links is not None:
+            topic = add_link_records_to_page(topic, links, base_url, lecture_identifier, linked_urls)
+    return deck
+
+def add_links_to_topics(slides: list, base_url: str = BASE_URL, lecture_identifier: str = LECTURE_IDENTIFIER, linked_urls: tuple = ()) -> list:
     for deck in tqdm(slides, desc='Identify relations in slide decks'):
-        html = get_html_from_url(deck.get('topics')[0].get('url'))
-        for topic in tqdm(deck.get('topics'), desc=deck.get('title'), leave=False, colour='green'):
-            section = html.find('section', {'id': 'slide-' + topic.get('html_id')})
-            if section is not None:
-                topic = add_links_to_page(topic, section)
+        add_links_to_deck(deck, base_url, lecture_identifier, linked_urls)
     return slides
 
 def add_parent_ids(slides: list) -> list:
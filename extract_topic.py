@@ -1,10 +1,12 @@
-import requests
+from concurrent.futures import ThreadPoolExecutor
 from bs4 import BeautifulSoup
 from tqdm import tqdm
 
-
-# Impoort constants from main.py
-from main import LECTURE_IDENTIFIER, BASE_URL
+from extract_html import extract_deck
+from extract_page_cache import get_page_content
+from extract_relation import BASE_URL, LECTURE_IDENTIFIER
+from topic_record import Topic
+from transform_rules import RuleSet, get_meta_rules
 
 ##########################
 # Base level functions
@@ -22,8 +24,7 @@ def get_a_from_page(url: str) -> list:
     - list: A list of dictionaries containing href and text attributes of each <a> tag.
     """
     a_tags = []
-    response = requests.get(url)
-    soup = BeautifulSoup(response.content, "html.parser")
+    soup = BeautifulSoup(get_page_content(url), "html.parser")
     a_tags += soup.find_all("a")
     # Extract the href attribute and text from the a tags
     a_tags = [{"href": a.get("href"), "text": a.text, "class": a.get(
@@ -32,8 +33,7 @@ def get_a_from_page(url: str) -> list:
 
 
 def get_anchor_links_from_page(url: str) -> list:
-    response = requests.get(url)
-    soup = BeautifulSoup(response.content, "html.parser")
+    soup = BeautifulSoup(get_page_content(url), "html.parser")
     anchor_links = []
     for a in soup.find_all("a", href=True):
         if a["href"].startswith("#"):
@@ -53,44 +53,33 @@ def get_h_from_page(url: list) -> list:
     Returns:
     - list: A list of dictionaries containing id, text, tag, and url attributes of each <h> tag.
     """
-    h_tags = []
-    response = requests.get(url)
-    soup = BeautifulSoup(response.content, "html.parser")
-    h_tags += soup.find_all("h1")
-    h_tags += soup.find_all("h2")
-    h_tags += soup.find_all("h3")
-    h_tags += soup.find_all("h4")
-    # Extract the id attribute and text from the h tags
-    # If the id attribute is not present, set it to an empty string
-    clean_h_tags = [{
-        "text": h.text,
-        "html_id": h.get("id") if h.get("id") is not None else "",
-        "tag": h.name,
-        "url": url
-    } for h in h_tags]
-    return clean_h_tags
+    # Headings are extracted in a single pass, see extract_deck
+    h_tags, _ = extract_deck(url, get_page_content(url))
+    return h_tags
 
 
 ##########################
 # Page level functions
 ##########################
 
-def get_links_from_main_page(path: str, base_url=BASE_URL) -> list:
+def get_links_from_main_page(path: str, base_url=BASE_URL, lecture_identifier=None) -> list:
     """
     Retrieves all <a> tags from the given URL and filters them to keep only those whose href contains "Operating-Systems" and ends with ".html". Returns a list of the filtered <a> tags.
 
     Args:
     - path (str): The path to retrieve <a> tags from.
     - base_url (str): The base URL to use for the request. Defaults to BASE_URL constant.
+    - lecture_identifier (str): The string the href has to contain. Defaults to LECTURE_IDENTIFIER constant.
 
     Returns:
     - list: A list of dictionaries containing href and text attributes of each <a> tag that meets the filtering criteria.
     """
     main_page_a = get_a_from_page(base_url + path)
+    lecture_identifier = LECTURE_IDENTIFIER if lecture_identifier is None else lecture_identifier
 
     # Filter the links to keep only those whose href contains "Operating-Systems" and ends with ".html"
     html_links = [link for link in main_page_a
-                  if LECTURE_IDENTIFIER in link.get("href")
+                  if lecture_identifier in link.get("href")
                   and link.get("href").endswith(".html")
                   ]
 
@@ -112,25 +101,56 @@ def get_topics_of_slide(path: str, base_url=BASE_URL) -> list:
     return main_topics
 
 
+def get_deck_of_slide(path: str, base_url=BASE_URL) -> tuple:
+    """
+    Given a URL path and a base URL, returns the main topics of the slide and the links of their sections.
+
+    Args:
+        path (str): The URL path.
+        base_url (str, optional): The base URL. Defaults to BASE_URL.
+
+    Returns:
+        tuple: The list of main topics and a dictionary mapping their html_id to the links of their section.
+    """
+    url = base_url + path
+    return extract_deck(url, get_page_content(url))
+
+
 ##########################
 # Iteration functions for all slides
 ##########################
 
-def get_topics_for_all_slides(a_tags: list) -> list:
+def get_topics_for_all_slides(a_tags: list, max_workers: int = 1, base_url=BASE_URL) -> list:
     """
     Given a list of "a" tags, returns a list of dictionaries, where each dictionary
-    contains the title of a slide and its topics.
+    contains the title of a slide, its topics, and the links of their sections
+    (used by add_links_to_topics, so the deck is not parsed again).
+
+    With max_workers > 1 the slide decks are scraped concurrently by a thread pool
+    that shares the keep-alive connections of the HTTP client. The result keeps the order of the "a" tags.
 
     Args:
         a_tags (list): The list of "a" tags.
+        max_workers (int, optional): Number of decks scraped at the same time. Defaults to 1 (sequential).
+        base_url (str, optional): The base URL of the decks. Defaults to BASE_URL.
 
     Returns:
         list: The list of dictionaries.
     """
-    topics = []
-    for a in tqdm(a_tags, desc="Scraping topics"):
-        topics.append({"title": a.get("text"),
-                      "topics": get_topics_of_slide(a.get("href"))})
+    if max_workers is None or max_workers <= 1:
+        topics = []
+        for a in tqdm(a_tags, desc="Scraping topics"):
+            deck_topics, sections = get_deck_of_slide(a.get("href"), base_url)
+            topics.append({"title": a.get("text"),
+                          "topics": deck_topics,
+                          "sections": sections})
+        return topics
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # executor.map yields the results in the order of the input, not in the order of completion
+        decks = executor.map(lambda a: get_deck_of_slide(a.get("href"), base_url), a_tags)
+        topics = [{"title": a.get("text"), "topics": deck_topics, "sections": sections}
+                  for a, (deck_topics, sections) in zip(a_tags, tqdm(decks, total=len(a_tags), desc="Scraping topics"))]
     return topics
 
 
@@ -140,7 +160,10 @@ def flatten_topics(topics: list) -> list:
         for section in topic.get("topics"):
             # Check if section starts with a number or is h1 topic
             if section.get("text")[0].isdigit() or section.get("tag") == "h1":
-                clean_topic = {
+                # The first topic with an id wins, like in the TopicIndex and the streaming export of the pipeline
+                if section.get("id") in flattened_topics:
+                    continue
+                clean_topic = Topic({
                     "id": section.get("id"),
                     "title": topic.get("title"),
                     "section": section.get("text"),
@@ -153,19 +176,30 @@ def flatten_topics(topics: list) -> list:
                     "backwardlinks": section.get("backwardlinks"),
                     "basiclinks": section.get("basiclinks"),
                     "lecturelinks": section.get("lecturelinks"),
-                }
+                })
                 flattened_topics[section.get("id")] = clean_topic
     return flattened_topics
 
 
-def mark_meta_topics(topics: list) -> list:
-    # Meta topics are: Introdiction, Conclusion, Summary, References, and Further Reading
-    meta_topics = ["Introduction", "Conclusion", "Previously", "Summary", "References", "Further Reading", "Learning Objectives", "Quiz", "Question", "Recall"]
+def mark_meta_topics(topics: list, rules: RuleSet = None) -> list:
+    """
+    Classifies the topics into structural topics (e.g. Introduction, Summary, Quiz) and content topics.
 
-    for topic in topics:
-        if any(meta_topic.lower() in topic["section"].lower() for meta_topic in meta_topics):
-            topic["meta_type"] = "structure"
-        else:
-            topic["meta_type"] = "topic"
+    Sets meta_type to the label of the rule that fired ("structure") or to the default of the rules ("topic"),
+    and meta_rule to the name of the rule that fired (None for content topics).
+
+    Args:
+        topics (list): The topics.
+        rules (RuleSet, optional): The classification rules. Defaults to the rules in config/meta_rules.json.
+
+    Returns:
+        list: The classified topics.
+    """
+    rules = get_meta_rules() if rules is None else rules
+    # All sections are classified in one pass over the column
+    classes = rules.classify_all([topic["section"] for topic in topics])
+    for topic, (meta_type, meta_rule) in zip(topics, classes):
+        topic["meta_type"] = meta_type
+        topic["meta_rule"] = meta_rule
 
     return topics
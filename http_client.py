@@ -0,0 +1,210 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Identify the pipeline to the APIs, Wikimedia blocks generic user agents
+USER_AGENT = 'kg-generation-for-educational-resources/1.0 (https://github.com/tillhoffmann1411/kg-generation-for-educational-resources)'
+# (connect, read) timeout of a single request in seconds
+HTTP_TIMEOUT = (5, 30)
+# Number of times a failed or throttled request is repeated
+HTTP_MAX_RETRIES = 5
+# Base and upper bound of the exponential backoff in seconds
+HTTP_BACKOFF = 1.0
+HTTP_MAX_BACKOFF = 60.0
+# Number of connections kept alive per host
+HTTP_POOL_SIZE = 16
+# Token bucket per host as (requests per second, burst)
+HTTP_RATE_LIMITS = {
+    'www.wikidata.org': (10, 10),
+    'en.wikipedia.org': (10, 10),
+    'lookup.dbpedia.org': (5, 5),
+}
+HTTP_DEFAULT_RATE_LIMIT = (20, 20)
+# Status codes that are worth another try
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket that limits the request rate against one host.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Blocks until a token is available and takes it.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """
+        Stops handing out tokens for the given number of seconds, e.g. after the host sent a Retry-After.
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0
+
+
+class HttpClient:
+    """
+    HTTP client that is shared by all extract and transform modules.
+
+    Every host gets its own session with a pool of keep-alive connections and its own token bucket.
+    Requests that time out, fail with a connection error, or are throttled (429/503 or a MediaWiki maxlag
+    error) are repeated with exponential backoff, honouring the Retry-After header of the host. When the
+    retries are used up, the error is raised instead of returning the error response.
+    The number of requests, retries, throttles, and downloaded bytes is counted per host in stats.
+    """
+
+    def __init__(self, rate_limits: dict = None, timeout=HTTP_TIMEOUT, max_retries: int = HTTP_MAX_RETRIES,
+                 pool_size: int = HTTP_POOL_SIZE, default_rate_limit: tuple = HTTP_DEFAULT_RATE_LIMIT):
+        self.rate_limits = HTTP_RATE_LIMITS if rate_limits is None else rate_limits
+        self.default_rate_limit = default_rate_limit
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.pool_size = pool_size
+        self.stats = {}
+        self._sessions = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """
+        Sends a GET request with rate limiting and retries. Takes the same keyword arguments as requests.get.
+
+        Args:
+        - url (str): The URL to request.
+
+        Returns:
+        - requests.Response: The response. Raises the last exception if no response could be received and
+          requests.HTTPError if the host still throttled or failed after the last retry.
+        """
+        host = urlparse(url).netloc
+        session, bucket, stats = self._get_host(host)
+        kwargs.setdefault('timeout', self.timeout)
+        attempt = 0
+        while True:
+            bucket.acquire()
+            self._count(stats, 'requests')
+            try:
+                response = session.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self._count(stats, 'errors')
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+            else:
+                self._count(stats, 'bytes', len(response.content))
+                throttled = response.status_code == 429 or response.headers.get('MediaWiki-API-Error') == 'maxlag'
+                if response.status_code not in RETRY_STATUS_CODES and not throttled:
+                    return response
+                if attempt >= self.max_retries:
+                    # The body of a throttled or failed response is an error message, not the requested data
+                    reason = 'maxlag' if response.headers.get('MediaWiki-API-Error') == 'maxlag' else response.status_code
+                    raise requests.HTTPError(f"{host} answered {reason} after {attempt + 1} attempts: {url}", response=response)
+                delay = self._retry_after(response)
+                if delay is None:
+                    delay = self._backoff(attempt)
+                if throttled or response.status_code == 503:
+                    # Slow down every thread that talks to this host, not only the current one
+                    self._count(stats, 'throttles')
+                    bucket.pause(delay)
+            self._count(stats, 'retries')
+            attempt += 1
+            time.sleep(delay)
+
+    def _get_host(self, host: str) -> tuple:
+        with self._lock:
+            if host not in self._sessions:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers['User-Agent'] = USER_AGENT
+                rate, capacity = self.rate_limits.get(host, self.default_rate_limit)
+                self._sessions[host] = session
+                self._buckets[host] = TokenBucket(rate, capacity)
+                self.stats[host] = {'requests': 0, 'retries': 0, 'throttles': 0, 'errors': 0, 'bytes': 0}
+            return self._sessions[host], self._buckets[host], self.stats[host]
+
+    def _count(self, stats: dict, key: str, value: int = 1):
+        with self._lock:
+            stats[key] += value
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        # Exponential backoff with jitter so that the threads do not retry in lockstep
+        return min(HTTP_MAX_BACKOFF, HTTP_BACKOFF * 2 ** attempt) * (0.5 + random.random() / 2)
+
+    @staticmethod
+    def _retry_after(response: requests.Response):
+        value = response.headers.get('Retry-After')
+        if value is None:
+            return None
+        try:
+            return min(HTTP_MAX_BACKOFF, max(0.0, float(value)))
+        except ValueError:
+            pass
+        try:
+            return min(HTTP_MAX_BACKOFF, max(0.0, parsedate_to_datetime(value).timestamp() - time.time()))
+        except (TypeError, ValueError):
+            return None
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+            self._buckets.clear()
+
+
+def share_rate_limit(rate_limit: tuple, shares: int) -> tuple:
+    """
+    Returns the (requests per second, burst) of one of several processes that talk to the same host,
+    so that all processes together stay within the rate limit.
+    """
+    rate, capacity = rate_limit
+    return rate / shares, max(1.0, capacity / shares)
+
+
+_http_client = None
+_http_client_lock = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    """
+    Returns the HTTP client that is shared by all modules.
+    """
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = HttpClient()
+        return _http_client
+
+
+def http_get(url: str, **kwargs) -> requests.Response:
+    """
+    Sends a GET request through the shared HTTP client. Takes the same keyword arguments as requests.get.
+    """
+    return get_http_client().get(url, **kwargs)
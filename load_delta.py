@@ -0,0 +1,153 @@
+import gzip
+import hashlib
+import os
+
+from rdflib import Graph
+
+from load_rdf import create_rdf_graph, nt_line, safe_string_as_txt, topic_triples, write_turtle
+
+# Suffix of the snapshot that records the triples of the last export or load, e.g. topics.ttl.snapshot.nt.gz
+SNAPSHOT_SUFFIX = '.snapshot.nt.gz'
+# Suffix of the RDF Patch with the changes since the last export, e.g. topics.ttl.patch
+PATCH_SUFFIX = '.patch'
+
+
+####################################################################################################
+# Snapshots
+####################################################################################################
+def topic_lines(topics) -> dict:
+    """
+    Returns the triples of all topics, mapped from their N-Triples line to the triple.
+    """
+    lines = {}
+    for topic in topics:
+        for triple in topic_triples(topic):
+            lines[nt_line(triple)] = triple
+    return lines
+
+
+def snapshot_id(lines) -> str:
+    """
+    Returns the hash of a triple set. It does not depend on the order of the triples.
+    """
+    h = hashlib.sha1()
+    for line in sorted(lines):
+        h.update(line.encode('utf-8'))
+        h.update(b'\n')
+    return h.hexdigest()
+
+
+def read_snapshot(path: str) -> tuple:
+    """
+    Reads a snapshot written by write_snapshot.
+
+    Returns:
+    - tuple: (id, set of N-Triples lines), or (None, None) if there is no snapshot yet.
+    """
+    if not os.path.exists(path):
+        return None, None
+    lines = set()
+    snapshot = None
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if line.startswith('# snapshot '):
+                snapshot = line[len('# snapshot '):]
+            elif line:
+                lines.add(line)
+    return snapshot, lines
+
+
+def write_snapshot(path: str, lines) -> str:
+    """
+    Writes a triple set as sorted, gzipped N-Triples with its hash in the first line. The snapshot is
+    written to a temporary file first, so an interrupted run keeps the previous snapshot.
+
+    Returns:
+    - str: The id of the snapshot.
+    """
+    lines = sorted(lines)
+    snapshot = snapshot_id(lines)
+    tmp_path = path + '.tmp'
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        f.write(f'# snapshot {snapshot}\n')
+        for line in lines:
+            f.write(line + '\n')
+    os.replace(tmp_path, path)
+    return snapshot
+
+
+def diff_lines(lines, previous) -> tuple:
+    """
+    Returns the sorted lists of added and removed N-Triples lines.
+    """
+    lines = set(lines)
+    return sorted(lines - previous), sorted(previous - lines)
+
+
+def parse_lines(lines: list) -> list:
+    """
+    Parses N-Triples lines back into rdflib triples, e.g. the removed lines of a snapshot.
+    """
+    if not lines:
+        return []
+    g = Graph()
+    g.parse(data='\n'.join(lines) + '\n', format='nt')
+    return list(g)
+
+
+####################################################################################################
+# RDF Patch
+####################################################################################################
+def write_patch(filename: str, added: list, removed: list, previous_id: str, snapshot: str):
+    """
+    Writes the changes between two snapshots as RDF Patch (https://afs.github.io/rdf-patch/).
+
+    The header names the snapshot the patch applies to (prev) and the snapshot it results in (id), so a
+    consumer can check that it applies the patches in order.
+    """
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write(f'H id <urn:sha1:{snapshot}> .\n')
+        f.write(f'H prev <urn:sha1:{previous_id}> .\n')
+        f.write('TX .\n')
+        for line in removed:
+            f.write(f'D {line}\n')
+        for line in added:
+            f.write(f'A {line}\n')
+        f.write('TC .\n')
+
+
+def write_turtle_with_patch(topics: list, filename: str, stream: bool = True) -> dict:
+    """
+    Writes the topics as Turtle like write_turtle and the changes since the last export as RDF Patch next to it.
+
+    The first export only records the snapshot. If nothing changed, the patch of the last change is kept.
+
+    Args:
+    - topics (list): The topics.
+    - filename (str): The Turtle file, e.g. topics.ttl. The patch is written to filename + PATCH_SUFFIX.
+    - stream (bool, optional): Stream the triples into the file (write_turtle) instead of serializing an
+      in-memory graph. Both record the same snapshot. Defaults to True.
+
+    Returns:
+    - dict: The number of "triples", and of "added" and "removed" triples (None on the first export).
+    """
+    if stream:
+        # The lines of the snapshot are collected while the triples are written, so they are only built once
+        lines = set()
+        count = write_turtle(topics, filename, lines)
+    else:
+        g = create_rdf_graph(topics, Graph())
+        safe_string_as_txt(g.serialize(format='turtle'), filename)
+        lines = {nt_line(triple) for triple in g}
+        count = len(g)
+    snapshot_path = filename + SNAPSHOT_SUFFIX
+    previous_id, previous = read_snapshot(snapshot_path)
+    if previous is None:
+        write_snapshot(snapshot_path, lines)
+        return {'triples': count, 'added': None, 'removed': None}
+    added, removed = diff_lines(lines, previous)
+    if added or removed:
+        snapshot = write_snapshot(snapshot_path, lines)
+        write_patch(filename + PATCH_SUFFIX, added, removed, previous_id, snapshot)
+    return {'triples': count, 'added': len(added), 'removed': len(removed)}
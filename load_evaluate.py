@@ -1,136 +1,222 @@
 import ast
+import hashlib
+import os
+import pickle
+
+import numpy as np
 import pandas as pd
 
-def count_entries_with_links(df, column):
-    # Assuming NaN or empty lists are considered as "no links"
-    # If the column contains list-like structures as strings, you might need to convert them to lists first
-    return df[df[column].str.len() > 0].shape[0]
-
-def count_total_links(df, column):
-    # If the column contains list-like structures as strings, you might need to convert them to lists first
-    # Assuming each link corresponds to an element in the list
-    return df[column].str.len().sum()
-
-
-# Calculate percentage of correctly found wiki topics in the list
-def get_perc_of_found_wikidata(df):
-    total_count = len(df)
-    m_count = len(df[df['Match'] == 'm'])
-    m_percent = (m_count / total_count) * 100
-    # Print results
-    print(f"Nr of correct found wikidata topics - count: {m_count}")
-    print(f"Nr of correct found wikidata topics - percentage: {m_percent:.2f}%")
-    return m_percent
-
-def get_perc_of_found_dbpedia(df):
-    total_count = len(df)    
-    m_count_d = len(df[df['wiki_dbpedia'] == 'd'])
-    m_count_b = len(df[df['wiki_dbpedia'] == 'b'])
-    m_count = m_count_d + m_count_b
-    m_percent = (m_count / total_count) * 100
-    # Print results
-    print(f"Nr of correct found dbpedia topics - count: {m_count}")
-    print(f"Nr of correct found dbpedia topics - percentage: {m_percent:.2f}%")
-    return m_percent
-
-def get_perc_of_found_wikipedia(df):
-    total_count = len(df)
-    m_count_w = len(df[df['wiki_dbpedia'] == 'w'])
-    m_count_b = len(df[df['wiki_dbpedia'] == 'b'])
-    m_count = m_count_w + m_count_b
-    m_percent = (m_count / total_count) * 100
-    # Print results
-    print(f"Nr of correct found wikipedia topics - count: {m_count}")
-    print(f"Nr of correct found wikipedia topics - percentage: {m_percent:.2f}%")
-    return m_percent
-
-# Calculate percentage of lecture topics where a corresponding wiki topic exists
-def get_possible_wiki(df):
-    total_count = len(df)
-    m_count = len(df[df['wiki_exists'] == 'y'])
-    m_percent = (m_count / total_count) * 100
-    # Print results
-    print(f"Nr of possible wiki topics - count: {m_count}")
-    print(f"Nr of possible wiki topics - percentage: {m_percent:.2f}%")
-    return df[df['wiki_exists'] == 'y']
-
-# Get the number of entries which have at least one wikipedia ID
-def get_wikipedia_entries(df):
-    return df[df['wikipedia_ids'].str.len() > 0].shape[0]
-
-# Get the number of entries which have at least one dbpedia ID
-def get_dbpedia_entries(df):
-    return df[df['dbpedia_ids'].str.len() > 0].shape[0]
-
-# Get the number of entries which have at least one wikidata ID
-def get_wikidata_entries(df):
-    return df[df['wiki_ids'].str.len() > 0].shape[0]
-
-
-
-
-df = pd.read_csv('topics_v2.csv')
-link_types = ['beyondlinks', 'forwardlinks', 'backwardlinks', 'basiclinks', 'lecturelinks']
-for i, row in df.iterrows():
-    for column in link_types:
-        if row.get(column) is not '' and not pd.isna(row.get(column)):
-            row[column] = ast.literal_eval(row.get(column))
-        else:
-            row[column] = []
-# Fill NaN values in parent_id with empty string
-df['parent_id'] = df['parent_id'].fillna('')
-parent_id_count = df[df['parent_id'] != ""].shape[0]
-print(f'Number of entries with at least one parent id: {parent_id_count}')
-for link_type in link_types:
-    num_entries = count_entries_with_links(df, link_type)
-    print(f'Number of entries with at least one {link_type}: {num_entries}')
-    
-    total_links = count_total_links(df, link_type)
-    print(f'Total number of {link_type}: {total_links}')
-
-
-# Wikidata Part
-df = pd.read_excel('./evaluated/eval_enhanced_topics.xlsx')
-link_types = ['wiki_ids']
-df['wiki_ids'] = df['wiki_ids'].fillna('[]')
-for i, row in df.iterrows():
-    for column in link_types:
-        if row.get(column) is not '[]':
-            row[column] = ast.literal_eval(row.get(column))
-        else:
-            row[column] = []
-print(f"Total count for all topics: {len(df)}")
-print('# Wikidata Part')
-print(f"Total count for all wikidata topics: {count_total_links(df, 'wiki_ids')}")
-print(f"Total count for all wikidata topics: {get_wikidata_entries(df)}")
-get_perc_of_found_wikidata(df)
-df_wiki_exist = get_possible_wiki(df)
-print(f"Now check percentage of topics where a wikidata topic exists - Nr of lecture topics: {len(df_wiki_exist)}")
-get_perc_of_found_wikidata(df_wiki_exist)
-
-# DBPediea Part
-df_2 = pd.read_excel('./evaluated/eval_enhanced_topics_2.xlsx')
-link_types = ['dbpedia_ids', 'wikipedia_ids']
-df_2['dbpedia_ids'] = df_2['dbpedia_ids'].fillna('[]')
-df_2['wikipedia_ids'] = df_2['wikipedia_ids'].fillna('[]')
-for i, row in df_2.iterrows():
-    for column in link_types:
-        if row.get(column) is not '[]':
-            row[column] = ast.literal_eval(row.get(column))
-        else:
-            row[column] = []
-print('# DBPedia Part')
-print(f"Total count for all dbpedia topics: {count_total_links(df_2, 'dbpedia_ids')}")
-print(f"Total count for all dbpedia topics: {get_dbpedia_entries(df_2)}")
-get_perc_of_found_dbpedia(df_2)
-df_wiki_exist_2 = get_possible_wiki(df_2)
-print(f"Now check percentage of topics where a wiki topic exists - Nr of lecture topics: {len(df_wiki_exist_2)}")
-get_perc_of_found_dbpedia(df_wiki_exist_2)
-
-# wikipedia Part
-print('# Wikipedia Part')
-print(f"Total count for all wikipedia topics: {count_total_links(df_2, 'wikipedia_ids')}")
-print(f"Total count for all wikipedia topics: {get_wikipedia_entries(df_2)}")
-get_perc_of_found_wikipedia(df_2)
-print(f"Now check percentage of topics where a wiki topic exists - Nr of lecture topics: {len(df_wiki_exist_2)}")
-get_perc_of_found_wikipedia(df_wiki_exist_2)
\ No newline at end of file
+# Parsed sheets are cached here, keyed by the path, size, and modification time of the sheet
+EVALUATE_CACHE_DIR = './.cache/evaluate'
+# Bump when the parsing changes, so old cache entries are not used anymore
+EVALUATE_CACHE_VERSION = 1
+# Columns that hold lists, written as Python literals (e.g. "['Q918004']") in the CSV and Excel exports
+LIST_COLUMNS = ['beyondlinks', 'forwardlinks', 'backwardlinks', 'basiclinks', 'lecturelinks',
+                'wiki_ids', 'wiki_labels', 'wiki_descriptions',
+                'wikipedia_ids', 'wikipedia_labels', 'wikipedia_descriptions',
+                'dbpedia_ids', 'dbpedia_labels', 'dbpedia_descriptions',
+                'forwardIds', 'backwardIds', 'lectureIds']
+# Columns whose coverage is evaluated
+LINK_TYPES = ['beyondlinks', 'forwardlinks', 'backwardlinks', 'basiclinks', 'lecturelinks']
+# Prefixes of the knowledge bases and the annotations that mark a correct result:
+# "Match" is "m" for a correct Wikidata topic, "wiki_dbpedia" names the correct ones of Wikipedia (w), DBpedia (d), or both (b)
+SOURCES = {
+    'wiki': ('Match', ['m']),
+    'wikipedia': ('wiki_dbpedia', ['w', 'b']),
+    'dbpedia': ('wiki_dbpedia', ['d', 'b']),
+}
+
+
+####################################################################################################
+# Reading and parsing
+####################################################################################################
+def parse_list_column(series: pd.Series) -> pd.Series:
+    """
+    Parses a column of list literals. Every distinct value is parsed once, which matters because most
+    cells repeat (e.g. "[]"). Missing values and empty strings become empty lists, lists are kept.
+    """
+    try:
+        codes, uniques = pd.factorize(series)
+    except TypeError:
+        # The column already holds lists, e.g. of a topic store
+        return series.map(lambda value: list(value) if isinstance(value, (list, tuple)) else [])
+    parsed = []
+    for value in uniques:
+        if isinstance(value, str):
+            value = ast.literal_eval(value) if value.strip() not in ('', 'None') else []
+        parsed.append(list(value) if isinstance(value, (list, tuple)) else [])
+    # Code -1 marks missing values, they get the empty list at the end
+    parsed.append([])
+    lookup = np.empty(len(parsed), dtype=object)
+    lookup[:] = parsed
+    return pd.Series(lookup[codes], index=series.index, name=series.name)
+
+
+def read_table(path: str) -> pd.DataFrame:
+    """
+    Reads a CSV file (separated by "," or ";"), an Excel sheet, or a topic store into a DataFrame.
+    """
+    if path.endswith(('.xlsx', '.xls')):
+        try:
+            df = pd.read_excel(path)
+        except ImportError as e:
+            engine = 'xlrd' if path.endswith('.xls') else 'openpyxl'
+            raise ImportError(f"Reading {path} needs {engine}, install it with `pip install {engine}`") from e
+        if sum(str(column).startswith('Unnamed') for column in df.columns) > len(df.columns) / 2:
+            # The sheet starts with a title row, the column names are in the next row
+            df = pd.read_excel(path, header=1)
+        return df
+    if path.endswith('.csv'):
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            header = f.readline()
+        return pd.read_csv(path, sep=';' if header.count(';') > header.count(',') else ',', encoding='utf-8-sig')
+    from topic_store import read_topics
+    from topic_record import topics_to_dicts
+    return pd.DataFrame(topics_to_dicts(read_topics(path)))
+
+
+def cache_path(path: str) -> str:
+    stat = os.stat(path)
+    key = f'{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}|{EVALUATE_CACHE_VERSION}'
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(EVALUATE_CACHE_DIR, f'{name}-{hashlib.sha1(key.encode()).hexdigest()[:16]}.pkl')
+
+
+def load_sheet(path: str, use_cache: bool = True) -> pd.DataFrame:
+    """
+    Reads a sheet and parses its list columns. The parsed sheet is cached as pickle, so evaluating the
+    same sheet again skips reading Excel and parsing the literals. A changed sheet gets a new cache entry.
+
+    Args:
+    - path (str): The CSV file, Excel sheet, or topic store.
+    - use_cache (bool, optional): Read and write the cache. Defaults to True.
+
+    Returns:
+    - pd.DataFrame: The sheet, list columns hold lists.
+    """
+    cached = cache_path(path) if use_cache else None
+    if cached is not None and os.path.exists(cached):
+        with open(cached, 'rb') as f:
+            return pickle.load(f)
+    df = read_table(path)
+    for column in LIST_COLUMNS:
+        if column in df.columns:
+            df[column] = parse_list_column(df[column])
+    if cached is not None:
+        os.makedirs(EVALUATE_CACHE_DIR, exist_ok=True)
+        tmp_path = cached + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cached)
+    return df
+
+
+####################################################################################################
+# Metrics
+####################################################################################################
+def list_lengths(df: pd.DataFrame, column: str) -> np.ndarray:
+    """
+    Returns the number of items in every cell of a parsed list column.
+    """
+    return np.fromiter((len(value) for value in df[column]), dtype=np.int64, count=len(df))
+
+
+def count_entries_with_links(df: pd.DataFrame, column: str) -> int:
+    return int((list_lengths(df, column) > 0).sum())
+
+
+def count_total_links(df: pd.DataFrame, column: str) -> int:
+    return int(list_lengths(df, column).sum())
+
+
+def coverage(df: pd.DataFrame, columns: list) -> pd.DataFrame:
+    """
+    Returns, for each list column, the number of topics with at least one item, the percentage of such
+    topics, and the total number of items.
+    """
+    rows = []
+    for column in columns:
+        if column not in df.columns:
+            continue
+        lengths = list_lengths(df, column)
+        entries = int((lengths > 0).sum())
+        rows.append({'column': column, 'entries': entries,
+                     'entries_percent': 100 * entries / len(df) if len(df) else 0.0, 'total': int(lengths.sum())})
+    return pd.DataFrame(rows, columns=['column', 'entries', 'entries_percent', 'total'])
+
+
+def precision(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns, for each knowledge base with annotations in the sheet, the number of correctly found topics
+    and their percentage of all topics, of the topics where an article exists ("wiki_exists" is "y"), and
+    of the topics that got a result (the precision).
+    """
+    exists = (df['wiki_exists'] == 'y').to_numpy() if 'wiki_exists' in df.columns else None
+    rows = []
+    for prefix, (column, correct_values) in SOURCES.items():
+        if column not in df.columns:
+            continue
+        correct = df[column].isin(correct_values).to_numpy()
+        row = {'source': prefix, 'topics': len(df), 'correct': int(correct.sum()),
+               'correct_percent': 100 * correct.sum() / len(df) if len(df) else 0.0}
+        if exists is not None:
+            row['exists'] = int(exists.sum())
+            row['correct_percent_where_exists'] = 100 * (correct & exists).sum() / exists.sum() if exists.any() else 0.0
+        # The sheets hold the ids or only the labels of the results
+        found_column = next((c for c in (f'{prefix}_ids', f'{prefix}_labels') if c in df.columns), None)
+        if found_column is not None:
+            found = list_lengths(df, found_column) > 0
+            row['found'] = int(found.sum())
+            row['precision_percent'] = 100 * (correct & found).sum() / found.sum() if found.any() else 0.0
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def classification_accuracy(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns the share of correctly classified topics per meta_type of a sheet with an "evaluation" column (1 or 0).
+    """
+    evaluation = pd.to_numeric(df['evaluation'], errors='coerce')
+    grouped = evaluation.groupby(df['meta_type'])
+    return pd.DataFrame({'topics': grouped.count(), 'correct': grouped.sum().astype(int),
+                         'accuracy_percent': 100 * grouped.mean()}).reset_index()
+
+
+def evaluate(df: pd.DataFrame) -> dict:
+    """
+    Computes all metrics that the columns of the sheet allow.
+
+    Returns:
+    - dict: DataFrames with the "coverage" of the links and results, the "precision" of the knowledge
+      bases, and the "classification" accuracy. Metrics without the columns they need are left out.
+    """
+    results = {'topics': len(df)}
+    # The results of a knowledge base are counted by their ids, or by their labels if the sheet has no ids
+    columns = LINK_TYPES + [f'{prefix}_ids' if f'{prefix}_ids' in df.columns else f'{prefix}_labels' for prefix in SOURCES]
+    table = coverage(df, columns)
+    if len(table) > 0:
+        results['coverage'] = table
+    table = precision(df)
+    if len(table) > 0:
+        results['precision'] = table
+    if 'evaluation' in df.columns and 'meta_type' in df.columns:
+        results['classification'] = classification_accuracy(df)
+    if 'parent_id' in df.columns:
+        results['parent_ids'] = int((df['parent_id'].fillna('').astype(str) != '').sum())
+    return results
+
+
+def print_evaluation(name: str, results: dict):
+    print(f"# {name}: {results['topics']} topics")
+    if 'parent_ids' in results:
+        print(f"Number of entries with a parent id: {results['parent_ids']}")
+    for key in ('coverage', 'precision', 'classification'):
+        if key in results:
+            print(results[key].to_string(index=False, float_format=lambda x: f'{x:.2f}'))
+
+
+def evaluation_to_dict(results: dict) -> dict:
+    """
+    Converts the result of evaluate to plain lists and numbers, e.g. for json.
+    """
+    return {key: value.to_dict('records') if isinstance(value, pd.DataFrame) else value for key, value in results.items()}
@@ -0,0 +1,249 @@
+import re
+
+from neo4j import GraphDatabase
+from rdflib import Literal, RDF
+from tqdm import tqdm
+
+from load_delta import diff_lines, parse_lines, read_snapshot, topic_lines, write_snapshot
+from load_rdf import topic_triples
+
+# Number of rows that are sent to Neo4j in one UNWIND statement
+NEO4J_BATCH_SIZE = 1000
+# Number of connections the driver keeps open
+NEO4J_POOL_SIZE = 10
+# Literal predicates that may occur several times per subject, they become list properties
+LIST_PROPERTIES = {'narrower', 'related'}
+
+
+####################################################################################################
+# Mapping from triples to nodes and relationships
+####################################################################################################
+def local_name(uri) -> str:
+    """
+    Returns the part of an URI after the last "/" or "#", e.g. "prefLabel" for skos:prefLabel.
+    """
+    return re.split(r'[/#]', str(uri))[-1]
+
+
+def relationship_type(predicate) -> str:
+    """
+    Returns the relationship type of a predicate, e.g. "RELATED_MATCH" for skos:relatedMatch.
+    """
+    return re.sub(r'(?<!^)(?=[A-Z])', '_', local_name(predicate)).upper()
+
+
+def triples_to_rows(triples) -> tuple:
+    """
+    Maps triples to the rows of the UNWIND statements.
+
+    Every subject becomes a :Resource node identified by its uri. rdf:type adds a label (e.g. :Concept),
+    literal objects become properties named after the predicate, and URI objects become relationships
+    typed after the predicate (e.g. skos:broader becomes :BROADER).
+
+    Returns:
+    - tuple: (nodes, relationships). nodes maps a label to rows {uri, props}, relationships maps a type to rows {s, o}.
+    """
+    resources = {}
+    relationships = {}
+    for s, p, o in triples:
+        resource = resources.setdefault(str(s), {'label': None, 'props': {}})
+        if p == RDF.type:
+            resource['label'] = local_name(o)
+        elif isinstance(o, Literal):
+            name = local_name(p)
+            if name in LIST_PROPERTIES:
+                resource['props'].setdefault(name, []).append(o.toPython())
+            else:
+                resource['props'][name] = o.toPython()
+        else:
+            relationships.setdefault(relationship_type(p), []).append({'s': str(s), 'o': str(o)})
+    nodes = {}
+    for uri, resource in resources.items():
+        nodes.setdefault(resource['label'], []).append({'uri': uri, 'props': resource['props']})
+    return nodes, relationships
+
+
+####################################################################################################
+# Bulk loader
+####################################################################################################
+def create_neo4j_driver(uri: str, user: str, password: str, max_pool_size: int = NEO4J_POOL_SIZE):
+    """
+    Creates a Neo4j driver with a pool of reusable connections.
+    """
+    return GraphDatabase.driver(uri, auth=(user, password), max_connection_pool_size=max_pool_size)
+
+
+def create_constraints(driver, database: str = 'neo4j'):
+    """
+    Creates the uniqueness constraint on Resource.uri, which also creates the index every MERGE uses.
+    """
+    with driver.session(database=database) as session:
+        session.run('CREATE CONSTRAINT resource_uri IF NOT EXISTS FOR (r:Resource) REQUIRE r.uri IS UNIQUE').consume()
+
+
+def merge_nodes(tx, label: str, rows: list):
+    # Labels cannot be parameters, but they only come from the fixed vocabulary of load_rdf
+    set_label = f'SET r:`{label}` ' if label is not None else ''
+    tx.run('UNWIND $rows AS row MERGE (r:Resource {uri: row.uri}) ' + set_label + 'SET r += row.props', rows=rows).consume()
+
+
+def merge_relationships(tx, rel_type: str, rows: list):
+    tx.run('UNWIND $rows AS row '
+           'MERGE (s:Resource {uri: row.s}) '
+           'MERGE (o:Resource {uri: row.o}) '
+           f'MERGE (s)-[:`{rel_type}`]->(o)', rows=rows).consume()
+
+
+def write_rows(session, nodes: dict, relationships: dict, batch_size: int):
+    # Nodes first, so that the relationships find the properties and labels already in place
+    for label, rows in nodes.items():
+        for i in range(0, len(rows), batch_size):
+            session.execute_write(merge_nodes, label, rows[i:i + batch_size])
+    for rel_type, rows in relationships.items():
+        for i in range(0, len(rows), batch_size):
+            session.execute_write(merge_relationships, rel_type, rows[i:i + batch_size])
+
+
+def load_topics_in_neo4j(topics: list, driver, database: str = 'neo4j', batch_size: int = NEO4J_BATCH_SIZE) -> int:
+    """
+    Loads the topics into Neo4j with batched UNWIND ... MERGE statements.
+
+    The topics are mapped with the same vocabulary as create_rdf_graph and sent in batches of
+    batch_size topics, so the number of round trips does not grow with the number of triples.
+
+    Args:
+    - topics (list): The enhanced topics with resolved links.
+    - driver (neo4j.Driver): The driver, e.g. from create_neo4j_driver.
+    - database (str, optional): The database to load into. Defaults to 'neo4j'.
+    - batch_size (int, optional): Number of topics and rows per statement. Defaults to NEO4J_BATCH_SIZE.
+
+    Returns:
+    - int: The number of loaded triples.
+    """
+    create_constraints(driver, database)
+    count = 0
+    with driver.session(database=database) as session:
+        for i in tqdm(range(0, len(topics), batch_size), desc='Loading topics into Neo4j'):
+            triples = [triple for topic in topics[i:i + batch_size] for triple in topic_triples(topic)]
+            nodes, relationships = triples_to_rows(triples)
+            write_rows(session, nodes, relationships, batch_size)
+            count += len(triples)
+    return count
+
+
+####################################################################################################
+# Delta sync
+####################################################################################################
+def delete_relationships(tx, rel_type: str, rows: list):
+    tx.run('UNWIND $rows AS row '
+           f'MATCH (:Resource {{uri: row.s}})-[r:`{rel_type}`]->(:Resource {{uri: row.o}}) '
+           'DELETE r', rows=rows).consume()
+
+
+def remove_labels(tx, label: str, rows: list):
+    tx.run(f'UNWIND $rows AS row MATCH (r:Resource {{uri: row.uri}}) REMOVE r:`{label}`', rows=rows).consume()
+
+
+def replace_nodes(tx, label: str, rows: list):
+    # Unlike merge_nodes, properties whose triples were removed are dropped as well
+    set_label = f'SET r:`{label}` ' if label is not None else ''
+    tx.run('UNWIND $rows AS row MERGE (r:Resource {uri: row.uri}) ' + set_label +
+           'SET r = row.props, r.uri = row.uri', rows=rows).consume()
+
+
+def delete_nodes(tx, rows: list):
+    tx.run('UNWIND $rows AS row MATCH (r:Resource {uri: row.uri}) DETACH DELETE r', rows=rows).consume()
+
+
+def apply_delta_in_neo4j(session, added: list, removed: list, current: list, batch_size: int = NEO4J_BATCH_SIZE):
+    """
+    Changes the graph that was loaded from the previous triples into the graph of the current triples,
+    using the same mapping as triples_to_rows.
+
+    Relationships are deleted and merged one by one. Every node with an added or removed property or type
+    is written again from its current triples, because a property can come from several triples (e.g.
+    the list properties). Nodes that no triple mentions anymore are deleted.
+
+    Args:
+    - session (neo4j.Session): The session to write with.
+    - added (list): The triples that are new.
+    - removed (list): The triples that are gone.
+    - current (list): All current triples.
+    - batch_size (int, optional): Number of rows per statement. Defaults to NEO4J_BATCH_SIZE.
+    """
+    def run_batches(func, *args):
+        rows = args[-1]
+        for i in range(0, len(rows), batch_size):
+            session.execute_write(func, *args[:-1], rows[i:i + batch_size])
+
+    changed = {str(s) for s, p, o in added + removed if p == RDF.type or isinstance(o, Literal)}
+    used = set()
+    for s, p, o in current:
+        used.add(str(s))
+        if not isinstance(o, Literal):
+            used.add(str(o))
+
+    _, removed_relationships = triples_to_rows([t for t in removed if t[1] != RDF.type and not isinstance(t[2], Literal)])
+    for rel_type, rows in removed_relationships.items():
+        run_batches(delete_relationships, rel_type, rows)
+    old_labels = {}
+    for s, p, o in removed:
+        if p == RDF.type and str(s) in used:
+            old_labels.setdefault(local_name(o), []).append({'uri': str(s)})
+    for label, rows in old_labels.items():
+        run_batches(remove_labels, label, rows)
+
+    nodes, _ = triples_to_rows([t for t in current if str(t[0]) in changed and (t[1] == RDF.type or isinstance(t[2], Literal))])
+    # Nodes that are only left as object of a relationship keep no properties, like after a full load
+    written = {row['uri'] for rows in nodes.values() for row in rows}
+    nodes.setdefault(None, []).extend({'uri': uri, 'props': {}} for uri in (changed & used) - written)
+    for label, rows in nodes.items():
+        run_batches(replace_nodes, label, rows)
+    _, added_relationships = triples_to_rows([t for t in added if t[1] != RDF.type and not isinstance(t[2], Literal)])
+    for rel_type, rows in added_relationships.items():
+        run_batches(merge_relationships, rel_type, rows)
+
+    gone = set()
+    for s, p, o in removed:
+        gone.add(str(s))
+        if p != RDF.type and not isinstance(o, Literal):
+            gone.add(str(o))
+    run_batches(delete_nodes, [{'uri': uri} for uri in sorted(gone - used)])
+
+
+def sync_topics_to_neo4j(topics: list, driver, snapshot_path: str, database: str = 'neo4j',
+                         batch_size: int = NEO4J_BATCH_SIZE, full: bool = False) -> dict:
+    """
+    Loads the topics into Neo4j, sending only the triples that changed since the last sync.
+
+    The triples of the last sync are kept in a snapshot (see load_delta). Without a snapshot all topics are
+    loaded with load_topics_in_neo4j. The snapshot is only updated after the database was written, so a
+    failed sync is repeated with the same delta.
+
+    Args:
+    - topics (list): The enhanced topics with resolved links.
+    - driver (neo4j.Driver): The driver, e.g. from create_neo4j_driver.
+    - snapshot_path (str): The snapshot of the last sync.
+    - database (str, optional): The database to load into. Defaults to 'neo4j'.
+    - batch_size (int, optional): Number of topics and rows per statement. Defaults to NEO4J_BATCH_SIZE.
+    - full (bool, optional): Load all topics even if there is a snapshot, e.g. after the database was reset. Defaults to False.
+
+    Returns:
+    - dict: The number of current "triples", and of "added" and "removed" triples (None after a full load).
+    """
+    lines = topic_lines(topics)
+    _, previous = read_snapshot(snapshot_path) if not full else (None, None)
+    if previous is None:
+        load_topics_in_neo4j(topics, driver, database, batch_size)
+        write_snapshot(snapshot_path, lines)
+        return {'triples': len(lines), 'added': None, 'removed': None}
+
+    added, removed = diff_lines(lines, previous)
+    print(f"Syncing {len(added)} added and {len(removed)} removed triples to Neo4j")
+    if added or removed:
+        create_constraints(driver, database)
+        with driver.session(database=database) as session:
+            apply_delta_in_neo4j(session, [lines[line] for line in added], parse_lines(removed),
+                                 list(lines.values()), batch_size)
+        write_snapshot(snapshot_path, lines)
+    return {'triples': len(lines), 'added': len(added), 'removed': len(removed)}
@@ -1,4 +1,7 @@
 import csv
+import heapq
+import os
+from concurrent.futures import ProcessPoolExecutor
 from rdflib import Graph, Literal, Namespace, RDF, URIRef
 from rdflib.namespace import SKOS, OWL, SDO
 
@@ -11,78 +14,275 @@ DBPEDIA = Namespace('https://dbpedia.org/page/')
 
 def create_rdf_graph(topics, g = Graph()):
     for row in topics:
-        # Remove the first numbers before the first space
-        label = row['section'].split(' ', 1)[1]
-      
-        # Create subject URI
+        for triple in topic_triples(row):
+            g.add(triple)
+
+    return g
+
+
+def topic_triples(row):
+    """
+    Yields the triples of a single topic, including its relations to external articles and other topics.
+    """
+    # Remove the first numbers before the first space
+    label = row['section'].split(' ', 1)[1]
+  
+    # Create subject URI
+    subject = URIRef(LECTURE[row['id']])
+
+    # Create SKOS concept
+    if row['meta_type'] == "structure":
+        yield (subject, RDF.type, SDO.CreativeWork)
+        yield (subject, SDO.name, Literal(label))
+        yield (subject, SDO.url, Literal(row['url']))
+    else:
+        yield (subject, RDF.type, SKOS.Concept)
+        yield (subject, SKOS.prefLabel, Literal(label))
+        yield (subject, OWL.sameAs, Literal(row['url']))
+
+    # Add relation to parent
+    if row.get('parent_id') != '':
+        yield (subject, SKOS.broader, LECTURE[row['parent_id']])
+
+    # Add beyond links to external resources
+    for beyondLink in row['beyondlinks']:
+        yield (subject, SKOS.narrower, Literal(beyondLink))
+    # Add beyond links to external resources
+    for basicLink in row['basiclinks']:
+        yield (subject, SKOS.related, Literal(basicLink))
+
+    # Add wikidata links
+    # check if row has wikidata ids
+    if row.get('wiki_ids') is not None:
+        for index, wiki_id in enumerate(row['wiki_ids']):
+            if wiki_id != '':
+                match = URIRef(WIKIDATA[wiki_id])
+                yield (subject, SKOS.relatedMatch, match)
+                yield (match, RDF.type, SDO.Article)
+                yield (match, SDO.name, Literal(row['wiki_labels'][index]))
+
+    # Add wikipedia links
+    # check if row has wikidata ids
+    if row.get('wikipedia_ids') is not None:
+        for index, wikipedia_id in enumerate(row['wikipedia_ids']):
+            if wikipedia_id != '' and wikipedia_id is not None:
+                match = URIRef(WIKIPEDIA[str(wikipedia_id)])
+                yield (subject, SKOS.relatedMatch, match)
+                yield (match, RDF.type, SDO.Article)
+                yield (match, SDO.name, Literal(row['wikipedia_labels'][index]))
+
+    # Add dbpedia links
+    # check if row has wikidata ids
+    if row.get('dbpedia_ids') is not None:
+        for index, dbpedia_name in enumerate(row['dbpedia_ids']):
+            if dbpedia_name != '':
+                match = URIRef(DBPEDIA[dbpedia_name.replace(' ', '_')])
+                yield (subject, SKOS.relatedMatch, match)
+                yield (match, RDF.type, SDO.Article)
+                yield (match, SDO.name, Literal(row['dbpedia_labels'][index]))
+
+    yield from topic_link_triples(row)
+
+
+def topic_link_triples(row):
+    """
+    Yields the triples that relate a topic to the topics it links to (forwardIds, backwardIds, and lectureIds).
+    """
+    subject = URIRef(LECTURE[row['id']])
+
+    # Add forward and backward links
+    for forwardId in row.get('forwardIds'):
+        if forwardId != '':
+            match = URIRef(LECTURE[forwardId])
+            yield (subject, SKOS.narrower, match)
+    for backwardId in row.get('backwardIds'):
+        if backwardId != '':
+            match = URIRef(LECTURE[backwardId])
+            yield (subject, SKOS.related, match)
+    for lectureId in row.get('lectureIds'):
+        if lectureId != '':
+            match = URIRef(LECTURE[lectureId])
+            yield (subject, SKOS.related, match)
+
+
+####################################################################################################
+# Streaming export
+####################################################################################################
+# Prefixes used for the predicates and classes in the streamed Turtle files
+TURTLE_PREFIXES = {'rdf': RDF, 'skos': SKOS, 'owl': OWL, 'schema': SDO}
+
+
+def nt_term(term) -> str:
+    """
+    Returns the N-Triples representation of an URI or literal. It is valid Turtle as well.
+    """
+    if isinstance(term, Literal):
+        value = str(term).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r')
+        if term.language:
+            return f'"{value}"@{term.language}'
+        if term.datatype:
+            return f'"{value}"^^<{term.datatype}>'
+        return f'"{value}"'
+    return f'<{term}>'
+
+
+def turtle_name(term) -> str:
+    """
+    Returns the prefixed name of a predicate or class if one of TURTLE_PREFIXES matches, else its N-Triples form.
+    """
+    if term == RDF.type:
+        return 'a'
+    for prefix, namespace in TURTLE_PREFIXES.items():
+        if term.startswith(str(namespace)):
+            local_name = term[len(str(namespace)):]
+            if local_name.isalnum():
+                return f'{prefix}:{local_name}'
+    return nt_term(term)
+
+
+def unique_topic_triples(topics, seen_articles: set):
+    """
+    Yields the triples of every topic. Triples about external articles are shared by many topics, so
+    they are only yielded once; seen_articles remembers them, which keeps memory bounded by the number of articles.
+    """
+    for row in topics:
         subject = URIRef(LECTURE[row['id']])
+        triples = {}
+        for triple in topic_triples(row):
+            if triple[0] != subject:
+                if triple in seen_articles:
+                    continue
+                seen_articles.add(triple)
+            # A dict drops duplicates like a graph would, but keeps the order of the triples
+            triples[triple] = None
+        yield list(triples)
 
-        # Create SKOS concept
-        if row['meta_type'] is "structure":
-            g.add((subject, RDF.type, SDO.CreativeWork))
-            g.add((subject, SDO.name, Literal(label)))
-            g.add((subject, SDO.url, Literal(row['url'])))
-        else:
-            g.add((subject, RDF.type, SKOS.Concept))
-            g.add((subject, SKOS.prefLabel, Literal(label)))
-            g.add((subject, OWL.sameAs, Literal(row['url'])))
-
-        # Add relation to parent
-        if row.get('parent_id') is not '':
-            g.add((subject, SKOS.broader, LECTURE[row['parent_id']]))
-
-        # Add beyond links to external resources
-        for beyondLink in row['beyondlinks']:
-            g.add((subject, SKOS.narrower, Literal(beyondLink)))
-        # Add beyond links to external resources
-        for basicLink in row['basiclinks']:
-            g.add((subject, SKOS.related, Literal(basicLink)))
-
-        # Add wikidata links
-        # check if row has wikidata ids
-        if row.get('wiki_ids') is not None:
-            for index, wiki_id in enumerate(row['wiki_ids']):
-                if wiki_id is not '':
-                    match = URIRef(WIKIDATA[wiki_id])
-                    g.add((subject, SKOS.relatedMatch, match))
-                    g.add((match, RDF.type, SDO.Article))
-                    g.add((match, SDO.name, Literal(row['wiki_labels'][index])))
-
-        # Add wikipedia links
-        # check if row has wikidata ids
-        if row.get('wikipedia_ids') is not None:
-            for index, wikipedia_id in enumerate(row['wikipedia_ids']):
-                if wikipedia_id is not '' and wikipedia_id is not None:
-                    match = URIRef(WIKIPEDIA[str(wikipedia_id)])
-                    g.add((subject, SKOS.relatedMatch, match))
-                    g.add((match, RDF.type, SDO.Article))
-                    g.add((match, SDO.name, Literal(row['wikipedia_labels'][index])))
-
-        # Add dbpedia links
-        # check if row has wikidata ids
-        if row.get('dbpedia_ids') is not None:
-            for index, dbpedia_name in enumerate(row['dbpedia_ids']):
-                if dbpedia_name is not '':
-                    match = URIRef(DBPEDIA[dbpedia_name.replace(' ', '_')])
-                    g.add((subject, SKOS.relatedMatch, match))
-                    g.add((match, RDF.type, SDO.Article))
-                    g.add((match, SDO.name, Literal(row['dbpedia_labels'][index])))
-
-        # Add forward and backward links
-        for forwardId in row.get('forwardIds'):
-            if forwardId is not '':
-                match = URIRef(LECTURE[forwardId])
-                g.add((subject, SKOS.narrower, match))
-        for backwardId in row.get('backwardIds'):
-            if backwardId is not '':
-                match = URIRef(LECTURE[backwardId])
-                g.add((subject, SKOS.related, match))
-        for lectureId in row.get('lectureIds'):
-            if lectureId is not '':
-                match = URIRef(LECTURE[lectureId])
-                g.add((subject, SKOS.related, match))
 
-    return g
+def nt_line(triple) -> str:
+    """
+    Returns a triple as N-Triples line without the line break.
+    """
+    s, p, o = triple
+    return f'{nt_term(s)} {nt_term(p)} {nt_term(o)} .'
+
+
+def write_ntriples(topics, filename: str) -> int:
+    """
+    Writes the triples of the topics to an N-Triples file without building a graph in memory.
+
+    Args:
+    - topics (iterable): The topics, e.g. a generator that yields one topic after another.
+    - filename (str): The file to write to.
+
+    Returns:
+    - int: The number of written triples.
+    """
+    count = 0
+    with open(filename, 'w', encoding='utf-8') as f:
+        for triples in unique_topic_triples(topics, set()):
+            for triple in triples:
+                f.write(nt_line(triple) + '\n')
+            count += len(triples)
+    return count
+
+
+def write_turtle(topics, filename: str, lines: set = None) -> int:
+    """
+    Writes the triples of the topics to a Turtle file, one block per subject, without building a graph in memory.
+
+    Args:
+    - topics (iterable): The topics, e.g. a generator that yields one topic after another.
+    - filename (str): The file to write to.
+    - lines (set, optional): If given, the N-Triples line of every written triple is added to it, e.g. for a snapshot.
+
+    Returns:
+    - int: The number of written triples.
+    """
+    count = 0
+    with open(filename, 'w', encoding='utf-8') as f:
+        for prefix, namespace in TURTLE_PREFIXES.items():
+            f.write(f'@prefix {prefix}: <{namespace}> .\n')
+        for triples in unique_topic_triples(topics, set()):
+            f.write(turtle_blocks(triples))
+            if lines is not None:
+                lines.update(nt_line(triple) for triple in triples)
+            count += len(triples)
+    return count
+
+
+def turtle_blocks(triples: list) -> str:
+    """
+    Returns the triples as Turtle, grouped by subject and predicate in the order of the triples, one block per subject.
+    A subject may have several blocks in a file, e.g. when its triples are appended later.
+    """
+    subjects = {}
+    for s, p, o in triples:
+        subjects.setdefault(s, {}).setdefault(p, []).append(o)
+    blocks = []
+    for subject, predicates in subjects.items():
+        lines = [f'{turtle_name(p)} {", ".join(turtle_name(o) if p == RDF.type else nt_term(o) for o in objects)}'
+                 for p, objects in predicates.items()]
+        blocks.append(f'\n{nt_term(subject)} ' + ' ;\n    '.join(lines) + ' .\n')
+    return ''.join(blocks)
+
+
+####################################################################################################
+# Parallel export
+####################################################################################################
+def sorted_ntriples_chunk(topics: list) -> list:
+    """
+    Returns the sorted and deduplicated N-Triples lines of a chunk of topics. This is the unit of work of
+    write_sorted_ntriples, it runs in a worker process.
+    """
+    return sorted({nt_line(triple) for topic in topics for triple in topic_triples(topic)})
+
+
+def merge_sorted_lines(chunks):
+    """
+    Merges sorted lists of lines into one sorted stream without duplicates. Triples about external
+    articles are in the chunks of all topics that refer to the article, they are yielded once.
+    """
+    previous = None
+    for line in heapq.merge(*chunks):
+        if line != previous:
+            yield line
+            previous = line
+
+
+def write_sorted_ntriples(topics: list, filename: str, max_workers: int = None, chunks_per_worker: int = 4) -> int:
+    """
+    Writes the triples of the topics to a sorted N-Triples file, building the lines in several processes.
+
+    The topics are split into contiguous chunks, every worker turns a chunk into sorted, deduplicated
+    lines, and the chunks are merged. The output is sorted, so it is the same for every number of workers
+    and every order of the topics, which also makes it easy to diff.
+
+    Args:
+    - topics (list): The topics.
+    - filename (str): The file to write to.
+    - max_workers (int, optional): Number of worker processes. Defaults to the number of CPUs. With 1 the
+      chunks are built in this process.
+    - chunks_per_worker (int, optional): Number of chunks per worker, more chunks balance the load better. Defaults to 4.
+
+    Returns:
+    - int: The number of written triples.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    n_chunks = max(1, min(len(topics), max_workers * chunks_per_worker))
+    size = -(-len(topics) // n_chunks) if topics else 1
+    chunks = [topics[i:i + size] for i in range(0, len(topics), size)]
+    if max_workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            sorted_chunks = list(executor.map(sorted_ntriples_chunk, chunks))
+    else:
+        sorted_chunks = [sorted_ntriples_chunk(chunk) for chunk in chunks]
+
+    count = 0
+    with open(filename, 'w', encoding='utf-8') as f:
+        for line in merge_sorted_lines(sorted_chunks):
+            f.write(line + '\n')
+            count += 1
+    return count
 
 
 def safe_dict_as_csv(d: dict, filename: str):
@@ -0,0 +1,302 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+try:
+    import pyoxigraph
+except ImportError:  # Only needed to build and query the store
+    pyoxigraph = None
+
+from rdflib.namespace import SDO, SKOS
+
+from load_rdf import LECTURE, write_sorted_ntriples
+
+# Directory of the on-disk triple store
+TRIPLE_STORE_PATH = './.cache/kg_store'
+# Number of query results kept in memory
+QUERY_CACHE_SIZE = 1024
+# File in the store directory that is replaced after every load, so read-only stores notice a new graph
+LOAD_MARKER = 'last_load'
+# Prefixes every query can use without declaring them
+QUERY_PREFIXES = {'skos': str(SKOS), 'schema': str(SDO), 'lecture': str(LECTURE),
+                  'rdf': 'http://www.w3.org/1999/02/22-rdf-syntax-ns#', 'owl': 'http://www.w3.org/2002/07/owl#'}
+
+
+####################################################################################################
+# Query cache
+####################################################################################################
+class QueryCache:
+    """
+    Least recently used cache of query results. It is shared by the threads of the server.
+    """
+
+    def __init__(self, max_size: int = QUERY_CACHE_SIZE):
+        self.max_size = max_size
+        self.stats = {'hits': 0, 'misses': 0}
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            result = self._results.get(key)
+            if result is None:
+                self.stats['misses'] += 1
+                return None
+            self._results.move_to_end(key)
+            self.stats['hits'] += 1
+            return result
+
+    def put(self, key, result):
+        with self._lock:
+            self._results[key] = result
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_size:
+                self._results.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+
+####################################################################################################
+# Triple store
+####################################################################################################
+def term_to_json(term) -> dict:
+    """
+    Returns a pyoxigraph term in the SPARQL JSON results format, e.g. {"type": "uri", "value": "..."}.
+    """
+    if isinstance(term, pyoxigraph.NamedNode):
+        return {'type': 'uri', 'value': term.value}
+    if isinstance(term, pyoxigraph.BlankNode):
+        return {'type': 'bnode', 'value': term.value}
+    result = {'type': 'literal', 'value': term.value}
+    if term.language:
+        result['xml:lang'] = term.language
+    elif term.datatype is not None and term.datatype.value != 'http://www.w3.org/2001/XMLSchema#string':
+        result['datatype'] = term.datatype.value
+    return result
+
+
+class TripleStore:
+    """
+    Knowledge graph in a persistent, indexed Oxigraph store.
+
+    The graph is loaded once (load_topics or load_file) and then queried from disk with SPARQL, so queries
+    do not parse the Turtle file again and their latency depends on the indexes, not on the size of the
+    graph. Query results are kept in an LRU cache that is cleared whenever the store is loaded again.
+    A read-only store (e.g. the one of the server) sees a snapshot of the graph, it is opened again
+    with an empty cache when the next query finds that the store was loaded in the meantime.
+    """
+
+    def __init__(self, path: str = TRIPLE_STORE_PATH, read_only: bool = False, cache_size: int = QUERY_CACHE_SIZE):
+        if pyoxigraph is None:
+            raise ImportError("The triple store needs pyoxigraph, install it with `pip install pyoxigraph`")
+        self.path = path
+        self.read_only = read_only
+        self.cache = QueryCache(cache_size)
+        self._lock = threading.Lock()
+        self._generation = self.load_generation()
+        if read_only:
+            self._store = pyoxigraph.Store.read_only(path)
+        else:
+            os.makedirs(path, exist_ok=True)
+            self._store = pyoxigraph.Store(path)
+
+    def load_generation(self):
+        """
+        Returns the inode and modification time of the LOAD_MARKER of the last load, or None if it was never loaded.
+        """
+        try:
+            stat = os.stat(os.path.join(self.path, LOAD_MARKER))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def snapshot(self) -> tuple:
+        """
+        Returns the generation and the store to query. A read-only store is opened again if it was loaded since.
+        """
+        if self.read_only:
+            generation = self.load_generation()
+            if generation != self._generation:
+                with self._lock:
+                    if generation != self._generation:
+                        self._store = pyoxigraph.Store.read_only(self.path)
+                        self._generation = generation
+                        self.cache.clear()
+        return self._generation, self._store
+
+    def load_file(self, filename: str):
+        """
+        Replaces the graph with the triples of a Turtle or N-Triples file.
+        """
+        self._store.clear()
+        self._store.bulk_load(path=filename)
+        self._store.optimize()
+        self.cache.clear()
+        # Replaced, not changed, so the marker gets a new inode even if the clock did not move on
+        marker = os.path.join(self.path, LOAD_MARKER)
+        with open(marker + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(repr(time.time()))
+        os.replace(marker + '.tmp', marker)
+        self._generation = self.load_generation()
+
+    def load_topics(self, topics: list, max_workers: int = None) -> int:
+        """
+        Replaces the graph with the triples of the topics, see create_rdf_graph.
+
+        Returns:
+        - int: The number of loaded triples.
+        """
+        fd, filename = tempfile.mkstemp(suffix='.nt')
+        os.close(fd)
+        try:
+            # The N-Triples are written in parallel and loaded without building a graph in memory
+            count = write_sorted_ntriples(topics, filename, max_workers)
+            self.load_file(filename)
+        finally:
+            os.remove(filename)
+        return count
+
+    def query(self, sparql: str) -> dict:
+        """
+        Runs a SPARQL SELECT or ASK query. The prefixes of QUERY_PREFIXES can be used without declaring them.
+
+        Returns:
+        - dict: The result in the SPARQL JSON results format: {"head": {"vars": [...]}, "results": {"bindings": [...]}}
+          for SELECT, {"head": {}, "boolean": ...} for ASK. Results are shared with the cache and must not be changed.
+        """
+        # The generation is part of the key, so a result of the previous graph is never returned for the new one
+        generation, store = self.snapshot()
+        result = self.cache.get((generation, sparql))
+        if result is not None:
+            return result
+        solutions = store.query(sparql, prefixes=QUERY_PREFIXES)
+        if isinstance(solutions, pyoxigraph.QueryBoolean):
+            result = {'head': {}, 'boolean': bool(solutions)}
+        elif isinstance(solutions, pyoxigraph.QuerySolutions):
+            variables = [variable.value for variable in solutions.variables]
+            bindings = []
+            for solution in solutions:
+                bindings.append({name: term_to_json(solution[name]) for name in variables if solution[name] is not None})
+            result = {'head': {'vars': variables}, 'results': {'bindings': bindings}}
+        else:
+            raise ValueError("Only SELECT and ASK queries are supported")
+        self.cache.put((generation, sparql), result)
+        return result
+
+    def select(self, sparql: str) -> list:
+        """
+        Runs a SELECT query and returns the rows as dictionaries of plain values.
+        """
+        return [{name: binding['value'] for name, binding in row.items()}
+                for row in self.query(sparql)['results']['bindings']]
+
+    ##########################################################################################
+    # Canned queries
+    ##########################################################################################
+    def topic(self, topic_id: str) -> dict:
+        """
+        Returns the properties of a topic, e.g. {"type": [...], "prefLabel": [...], "broader": [...]}, or None.
+        """
+        rows = self.select(f'SELECT ?p ?o WHERE {{ {topic_iri(topic_id)} ?p ?o }}')
+        if not rows:
+            return None
+        properties = {}
+        for row in rows:
+            name = row['p'].rsplit('#', 1)[-1].rsplit('/', 1)[-1]
+            properties.setdefault(name, []).append(row['o'])
+        return properties
+
+    def broader_chain(self, topic_id: str) -> list:
+        """
+        Returns the topics above a topic, from its parent up to the deck, by following skos:broader.
+        """
+        chain = []
+        current = topic_iri(topic_id)
+        seen = {current}
+        while True:
+            rows = self.select(f'SELECT ?b WHERE {{ {current} skos:broader ?b }}')
+            if not rows:
+                return chain
+            parent = f"<{rows[0]['b']}>"
+            if parent in seen:
+                return chain
+            seen.add(parent)
+            chain.append(rows[0]['b'])
+            current = parent
+
+    def narrower_topics(self, topic_id: str) -> list:
+        """
+        Returns the topics whose skos:broader is the topic, with their labels.
+        """
+        return self.select(f'SELECT ?topic ?label WHERE {{ ?topic skos:broader {topic_iri(topic_id)} . '
+                           'OPTIONAL { ?topic skos:prefLabel|schema:name ?label } } ORDER BY ?topic')
+
+    def related_entities(self, topic_id: str) -> list:
+        """
+        Returns the Wikidata, Wikipedia, and DBpedia entities of a topic (skos:relatedMatch) with their names.
+        """
+        return self.select(f'SELECT ?entity ?name WHERE {{ {topic_iri(topic_id)} skos:relatedMatch ?entity . '
+                           'OPTIONAL { ?entity schema:name ?name } } ORDER BY ?entity')
+
+
+def topic_iri(topic_id: str) -> str:
+    """
+    Returns the IRI of a topic for a query, e.g. <https://oer.uni-muenster.de/OS/01.2>. Raises ValueError
+    for ids that are not valid in an IRI, so an id cannot change the query.
+    """
+    return str(pyoxigraph.NamedNode(str(LECTURE[topic_id])))
+
+
+####################################################################################################
+# SPARQL endpoint
+####################################################################################################
+def create_server(store: TripleStore, host: str = '127.0.0.1', port: int = 7878) -> ThreadingHTTPServer:
+    """
+    Creates an HTTP server for the store.
+
+    - GET /sparql?query=... answers a SELECT or ASK query in the SPARQL JSON results format.
+    - GET /topic/<id>, /topic/<id>/broader, /topic/<id>/narrower, and /topic/<id>/related answer the canned queries.
+    """
+    canned = {'': store.topic, 'broader': store.broader_chain, 'narrower': store.narrower_topics,
+              'related': store.related_entities}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            try:
+                if url.path == '/sparql':
+                    sparql = parse_qs(url.query).get('query', [''])[0]
+                    self.reply(200, store.query(sparql), 'application/sparql-results+json')
+                elif url.path.startswith('/topic/'):
+                    topic_id, _, name = unquote(url.path[len('/topic/'):]).partition('/')
+                    if name not in canned:
+                        self.reply(404, {'error': f'unknown query {name}'})
+                        return
+                    self.reply(200, canned[name](topic_id))
+                else:
+                    self.reply(404, {'error': 'use /sparql?query=... or /topic/<id>'})
+            except (ValueError, SyntaxError) as e:
+                self.reply(400, {'error': str(e)})
+
+        def reply(self, status: int, body, content_type: str = 'application/json'):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
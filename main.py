@@ -1,27 +1,43 @@
-import csv
-import ast
-import pandas as pd
 from dotenv import load_dotenv
 import os
 
 # Import functions to extract educational resources topics
-from extract_topic import *
+from extract_topic import get_links_from_main_page, get_topics_for_all_slides, flatten_topics, mark_meta_topics
 # Import functions to extract relations between educational resources
-from extract_relation import *
+from extract_relation import add_parent_ids, add_links_to_topics
 
 # Import functions to load articels from wikipedia, wikidata, and dbpedia
-from transform_public_enhancer import *
+from transform_public_enhancer import add_public_data_to_topics
 # Import functions from the transform level to filter topics and relations
-from transform_filter import *
+from transform_filter import resolve_links_to_topics
 
 # Import functions to create and export rdf and kg
-from load_rdf import *
+from rdflib import Graph
+from load_rdf import create_rdf_graph, write_turtle, write_sorted_ntriples, safe_string_as_txt
+from load_delta import write_turtle_with_patch, SNAPSHOT_SUFFIX
+
+# Import functions to bulk load the topics into neo4j
+from load_neo4j import create_neo4j_driver, load_topics_in_neo4j, sync_topics_to_neo4j
+
+# Import functions to save and load topics
+from topic_store import read_topics, save_topics, export_topics_csv
+from topic_record import topic_columns
+
+# Import the checkpoint store for incremental re-runs
+from checkpoint import CheckpointStore, extract_decks_with_checkpoints, enrich_topics_with_checkpoints
+
+# Import the multi-course runner
+from pipeline import run_courses, run_streaming
+
+# Import the run metrics
+from run_metrics import RunMetrics
 
 # Load .env file
 load_dotenv()
 
 
 # This is used to load already processed data (can be found in the repository in the /data folder)
+# Either a CSV file or a topic store directory written by save_topics
 ENHANCED_TOPIC_SRC = './final_data/final_data.csv'
 
 
@@ -29,19 +45,50 @@ ENHANCED_TOPIC_SRC = './final_data/final_data.csv'
 BASE_URL = 'https://oer.gitlab.io/OS/'
 ## This is the lecture identifier that we will use to filter links
 LECTURE_IDENTIFIER = 'Operating-Systems'
-## Safe intermediate steps as csv
-SECURITY_SAVES = False
+## Courses of a multi-course run, each course is processed as a shard in its own process (None = only BASE_URL)
+## e.g. [{'base_url': BASE_URL, 'lecture_identifier': LECTURE_IDENTIFIER, 'namespace': 'os'}, ...]
+COURSES = None
+## Number of processes for a multi-course run (None = number of CPUs)
+COURSE_WORKERS = None
+## Number of slide decks that are scraped at the same time (1 = sequential)
+SCRAPE_WORKERS = 8
+## Reuse the results of unchanged slide decks and sections from the last run
+CHECKPOINTS = True
+## Process the slide decks one at a time from scraping to the .ttl file, so memory is bounded by the largest deck
+## (writes only topics.ttl: no topic store, no Neo4j load, ENHANCED_TOPIC_SRC and COURSES are not used)
+STREAMING = False
 ## Save the final data as an CSV before generating the knowledge graph
 SAFE_AS_CSV = False
+## Save the final data as a topic store before generating the knowledge graph
+SAFE_AS_TOPIC_STORE = True
 ## If the data should be persisted in a Neo4j database (True/Flase)
 LOAD_IN_DB = True
 ## If the data should be persisted in a .ttl file (True/Flase)
 LOAD_AS_TURTLE = True
+## Stream the triples into the .ttl file instead of serializing an in-memory graph
+STREAM_TURTLE = True
+## If the data should be persisted in a sorted .nt file, built by several processes (True/Flase)
+LOAD_AS_NTRIPLES = False
+## Number of processes that build the triples of the .nt file, None for one per CPU
+GRAPH_WORKERS = None
+## Only send the triples that changed since the last run to Neo4j and write them as patch next to the .ttl file
+DELTA_SYNC = True
+## Triples of the last Neo4j sync, delete it to load all triples again
+NEO4J_SNAPSHOT = 'neo4j' + SNAPSHOT_SUFFIX
 
 # Neo4j Config
 NEO4J_URI = os.getenv('NEO4J_URI')
 NEO4J_USER = os.getenv('NEO4J_USER')
 NEO4J_PASSWORD = os.getenv('NEO4J_PASSWORD')
+## Number of topics and rows that are written to Neo4j per statement
+NEO4J_BATCH_SIZE = 1000
+
+# Metrics Config
+## JSON report with the wall time, topics, HTTP requests, cache hits, triples, and peak RSS of every stage
+METRICS_REPORT = 'run_metrics.json'
+## Prometheus textfile with the same metrics, e.g. for the textfile collector of the node exporter (empty = off)
+METRICS_TEXTFILE = os.getenv('METRICS_TEXTFILE', 'run_metrics.prom')
+## cProfile and tracemalloc are enabled per stage with METRICS_PROFILE and METRICS_TRACEMALLOC, see run_metrics.py
 
 
 
@@ -54,76 +101,121 @@ NEO4J_PASSWORD = os.getenv('NEO4J_PASSWORD')
 
 
 def main():
+    metrics = RunMetrics()
+    try:
+        run_pipeline(metrics)
+    except BaseException:
+        metrics.finish(success=False)
+        raise
+    else:
+        metrics.finish(success=True)
+    finally:
+        # Write the reports of failed runs as well, they show the stage that failed
+        metrics.write_json(METRICS_REPORT)
+        if METRICS_TEXTFILE:
+            metrics.write_prometheus(METRICS_TEXTFILE)
+
+
+def run_pipeline(metrics: RunMetrics):
     enhanced_topics = []
+    checkpoints = CheckpointStore() if CHECKPOINTS else None
+    if checkpoints is not None:
+        metrics.watch_cache('checkpoints', checkpoints.stats)
+    if STREAMING:
+        #############################################
+        # Extract, transform, and load deck by deck
+        #############################################
+        with metrics.stage('stream') as stage:
+            streamed = run_streaming(BASE_URL, LECTURE_IDENTIFIER, 'topics.ttl', ['wikipedia', 'dbpedia', 'wikidata'],
+                                     checkpoints=checkpoints)
+            stage['topics_out'] = streamed['topics']
+            stage['triples'] = streamed['triples']
+            stage['largest_deck'] = streamed['largest_deck']
+        return
     ##########################################################################################
     # Extract
     ##########################################################################################
-    if ENHANCED_TOPIC_SRC is None or ENHANCED_TOPIC_SRC == '':
+    if COURSES:
         #############################################
-        # Extract Topics from the slides
+        # Extract and enrich the topics of all courses in parallel
         #############################################
-        # Define the URL to retrieve
-        slides = get_links_from_main_page('')
-        # Get the topics for all slides
-        slide_topics = get_topics_for_all_slides(slides)
-
+        with metrics.stage('courses') as stage:
+            enhanced_topics = run_courses(COURSES, max_workers=COURSE_WORKERS, scrape_workers=SCRAPE_WORKERS)
+            stage['topics_out'] = len(enhanced_topics)
+    elif ENHANCED_TOPIC_SRC is None or ENHANCED_TOPIC_SRC == '':
         #############################################
-        # Add relations between topics
+        # Extract Topics from the slides
         #############################################
-        # Add the parent ids to the topics
-        topics_with_parent = add_parent_ids(slide_topics)
-        # Add links to the topics
-        related_topics = add_links_to_topics(topics_with_parent)
-        # Flatten the topics
-        enhanced_topics = flatten_topics(related_topics)
-        # Filter out topics with None id
-        enhanced_topics = [d for d in enhanced_topics.values() if d.get('id') is not None]
-        # Save the topics as CSV
-        safe_dict_as_csv(enhanced_topics, 'enhanced_topics.csv')
+        with metrics.stage('extract') as stage:
+            # Define the URL to retrieve
+            slides = get_links_from_main_page('', base_url=BASE_URL, lecture_identifier=LECTURE_IDENTIFIER)
+            if CHECKPOINTS:
+                # Only scrape the slide decks that changed since the last run
+                related_topics = extract_decks_with_checkpoints(slides, checkpoints, base_url=BASE_URL, max_workers=SCRAPE_WORKERS, lecture_identifier=LECTURE_IDENTIFIER)
+            else:
+                # Get the topics for all slides
+                slide_topics = get_topics_for_all_slides(slides, max_workers=SCRAPE_WORKERS, base_url=BASE_URL)
+
+                #############################################
+                # Add relations between topics
+                #############################################
+                # Add the parent ids to the topics
+                topics_with_parent = add_parent_ids(slide_topics)
+                # Add links to the topics
+                related_topics = add_links_to_topics(topics_with_parent, BASE_URL, LECTURE_IDENTIFIER)
+            # Flatten the topics
+            enhanced_topics = flatten_topics(related_topics)
+            # Filter out topics with None id
+            enhanced_topics = [d for d in enhanced_topics.values() if d.get('id') is not None]
+            # Save the topics so that the transform steps can be rerun without scraping
+            save_topics(enhanced_topics, 'enhanced_topics.topics')
+            stage['topics_out'] = len(enhanced_topics)
     else:
         print('Loading enhanced topics from file')
-        columns_with_list = ['beyondlinks', 'forwardlinks', 'backwardlinks', 'lecturelinks',
-                             'basiclinks', 'wiki_ids', 'wiki_labels', 'wiki_descriptions',
-                             'dbpedia_ids', 'dbpedia_labels', 'dbpedia_descriptions', 'wikipedia_ids', 'wikipedia_labels', 'wikipedia_descriptions']
-        with open(ENHANCED_TOPIC_SRC, 'r', encoding='utf-8-sig') as csvfile:
-            reader = csv.DictReader(csvfile, delimiter=';')
-            for row in reader:
-                for column in columns_with_list:
-                    if row.get(column) is not '' and not pd.isna(row.get(column)):
-                        row[column] = ast.literal_eval(row.get(column))
-                enhanced_topics.append(row)
+        with metrics.stage('read') as stage:
+            enhanced_topics = read_topics(ENHANCED_TOPIC_SRC)
+            stage['topics_out'] = len(enhanced_topics)
 
                 
     ##########################################################################################
     # Transform
     ##########################################################################################
-    topic_df = pd.DataFrame.from_dict(enhanced_topics)
+    columns = topic_columns(enhanced_topics)
 
     # Get articles from Wikipedia, Wikidata, and DBpedia
-    if 'wiki_ids' not in topic_df.columns or 'wikipedia_ids' not in topic_df.columns or 'dbpedia_ids' not in topic_df.columns:
+    if 'wiki_ids' not in columns or 'wikipedia_ids' not in columns or 'dbpedia_ids' not in columns:
         print('# Add data from Wikipedia, Wikidata, and DBpedia...')
-        enhanced_topics = add_public_data_to_topics(enhanced_topics, ['wikipedia', 'dbpedia', 'wikidata'])
-        if SECURITY_SAVES:
-            safe_list_as_csv(enhanced_topics, 'article_data_export.csv')
+        with metrics.stage('enrich', topics_in=len(enhanced_topics)) as stage:
+            if CHECKPOINTS:
+                # Only query the sections whose text changed since the last run
+                enhanced_topics = enrich_topics_with_checkpoints(enhanced_topics, ['wikipedia', 'dbpedia', 'wikidata'], checkpoints)
+            else:
+                enhanced_topics = add_public_data_to_topics(enhanced_topics, ['wikipedia', 'dbpedia', 'wikidata'])
+            stage['topics_out'] = len(enhanced_topics)
     
     # Resolve the links to topic IDs
-    if 'backwardIds' not in topic_df.columns or 'forwardIds' not in topic_df.columns or 'lectureIds' not in topic_df.columns:
+    if 'backwardIds' not in columns or 'forwardIds' not in columns or 'lectureIds' not in columns:
         print('# Resolve relations from backwardlinks, forwardlinks, and lecturelinks...')
-        enhanced_topics = resolve_links_to_topics(enhanced_topics)
-        if SECURITY_SAVES:
-            safe_list_as_csv(enhanced_topics, 'resolved_data_export.csv')
+        with metrics.stage('resolve', topics_in=len(enhanced_topics)) as stage:
+            enhanced_topics = resolve_links_to_topics(enhanced_topics)
+            stage['topics_out'] = len(enhanced_topics)
     
     # Classify the topics to structure and content topics
-    if 'meta_type' not in topic_df.columns:
+    if 'meta_type' not in columns:
         print('# Classify topics extracted from lecture into structural and content topics...')
-        enhanced_topics = mark_meta_topics(enhanced_topics)
-        if SECURITY_SAVES:
-            safe_list_as_csv(enhanced_topics, 'classified_data_export.csv')
+        with metrics.stage('mark_meta', topics_in=len(enhanced_topics)) as stage:
+            enhanced_topics = mark_meta_topics(enhanced_topics)
+            stage['topics_out'] = len(enhanced_topics)
     
     # Safe the resulting data  
-    if SAFE_AS_CSV:
-        print('# Safe final data as csv...')
-        safe_list_as_csv(enhanced_topics, 'final_data_export.csv')
+    with metrics.stage('save', topics_in=len(enhanced_topics)) as stage:
+        if SAFE_AS_CSV:
+            print('# Safe final data as csv...')
+            export_topics_csv(enhanced_topics, 'final_data_export.csv')
+        if SAFE_AS_TOPIC_STORE:
+            print('# Safe final data as topic store...')
+            save_topics(enhanced_topics, 'final_data_export.topics')
+        stage['topics_out'] = len(enhanced_topics)
 
 
 
@@ -132,19 +224,40 @@ def main():
     # Load
     ##########################################################################################
     if LOAD_IN_DB:
-        # Initialize the graph
-        neo4j_config = {'uri': NEO4J_URI, 'database': 'neo4j', 'auth': {'user': NEO4J_USER, 'pwd': NEO4J_PASSWORD}}
-        g = Graph(store='neo4j-cypher')
-        g.open(neo4j_config)
-        g.store.startBatchedWrite()
-        g = create_rdf_graph(enhanced_topics, g)
-        g.store.endBatchedWrite()
+        with metrics.stage('load_neo4j', topics_in=len(enhanced_topics)) as stage:
+            # Load the topics with batched UNWIND statements
+            driver = create_neo4j_driver(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD)
+            try:
+                if DELTA_SYNC:
+                    delta = sync_topics_to_neo4j(enhanced_topics, driver, NEO4J_SNAPSHOT, batch_size=NEO4J_BATCH_SIZE)
+                    stage['triples'] = delta['triples']
+                    stage['triples_added'], stage['triples_removed'] = delta['added'], delta['removed']
+                else:
+                    stage['triples'] = load_topics_in_neo4j(enhanced_topics, driver, batch_size=NEO4J_BATCH_SIZE)
+            finally:
+                driver.close()
     
     if LOAD_AS_TURTLE:
-        # Print the graph in Turtle format
-        g = Graph()
-        g = create_rdf_graph(enhanced_topics, g)
-        safe_string_as_txt(g.serialize(format='turtle'), 'topics.ttl')
+        with metrics.stage('export_turtle', topics_in=len(enhanced_topics)) as stage:
+            if DELTA_SYNC:
+                # Also write the changes since the last export as topics.ttl.patch
+                delta = write_turtle_with_patch(enhanced_topics, 'topics.ttl', stream=STREAM_TURTLE)
+                stage['triples'] = delta['triples']
+                stage['triples_added'], stage['triples_removed'] = delta['added'], delta['removed']
+            elif STREAM_TURTLE:
+                # Write the triples topic by topic instead of building the whole graph in memory
+                stage['triples'] = write_turtle(enhanced_topics, 'topics.ttl')
+            else:
+                # Print the graph in Turtle format
+                g = Graph()
+                g = create_rdf_graph(enhanced_topics, g)
+                safe_string_as_txt(g.serialize(format='turtle'), 'topics.ttl')
+                stage['triples'] = len(g)
+
+    if LOAD_AS_NTRIPLES:
+        with metrics.stage('export_ntriples', topics_in=len(enhanced_topics)) as stage:
+            # The topics are split across processes, the sorted chunks are merged into the same file for any number of processes
+            stage['triples'] = write_sorted_ntriples(enhanced_topics, 'topics.nt', GRAPH_WORKERS)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,225 @@
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from tqdm import tqdm
+
+import extract_page_cache
+import extract_topic
+import http_client
+import transform_lookup_cache
+from checkpoint import enrich_topics_with_checkpoints
+from extract_relation import add_links_to_deck, add_links_to_topics, add_parent_ids
+from load_rdf import topic_link_triples, turtle_blocks, write_turtle
+from transform_filter import TopicIndex, report_unresolved_links, resolve_links_to_topics, resolve_topic_links
+from transform_public_enhancer import add_public_data_to_topics
+
+# Knowledge bases that are queried for every topic
+PUBLIC_SOURCES = ['wikipedia', 'dbpedia', 'wikidata']
+
+
+####################################################################################################
+# Multi-course runs
+####################################################################################################
+def add_namespace_to_ids(topics: list, namespace: str) -> list:
+    """
+    Prefixes the id and parent_id of the topics with the namespace of their course (e.g. "linux/01.2"),
+    so that the ids of different courses do not collide after merging.
+    """
+    if not namespace:
+        return topics
+    for topic in topics:
+        topic['id'] = f"{namespace}/{topic['id']}"
+        if topic.get('parent_id'):
+            topic['parent_id'] = f"{namespace}/{topic['parent_id']}"
+    return topics
+
+
+def _init_shard_process(processes: int = 1):
+    # Connections and sessions must not be shared with the parent process. Every process has its own
+    # token buckets, so each one gets its share of the rate limits, otherwise the hosts see processes times the rate
+    http_client._http_client = http_client.HttpClient(
+        rate_limits={host: http_client.share_rate_limit(limit, processes) for host, limit in http_client.HTTP_RATE_LIMITS.items()},
+        default_rate_limit=http_client.share_rate_limit(http_client.HTTP_DEFAULT_RATE_LIMIT, processes))
+    transform_lookup_cache._lookup_cache = None
+    extract_page_cache._page_cache = None
+
+
+def run_course_shard(course: dict, sources: list = PUBLIC_SOURCES, scrape_workers: int = 1, linked_urls: tuple = ()) -> list:
+    """
+    Extracts and enriches the topics of one course. This is the unit of work of run_courses.
+
+    Args:
+    - course (dict): The course with base_url, lecture_identifier, and a namespace for the ids (optional if it
+      is the only course without one).
+    - sources (list, optional): The knowledge bases to query. Defaults to PUBLIC_SOURCES.
+    - scrape_workers (int, optional): Number of decks of the course scraped at the same time. Defaults to 1.
+    - linked_urls (tuple, optional): Prefixes of absolute links to decks of other courses. Defaults to none.
+
+    Returns:
+    - list: The flattened and enriched topics of the course, their links are not resolved yet.
+    """
+    base_url = course['base_url']
+    lecture_identifier = course['lecture_identifier']
+    namespace = course.get('namespace', '')
+    # Every course gets its own page cache directory, so the processes never write the same cache index
+    extract_page_cache._page_cache = extract_page_cache.PageCache(
+        os.path.join(extract_page_cache.PAGE_CACHE_DIR, namespace or 'default'))
+
+    slides = extract_topic.get_links_from_main_page('', base_url=base_url, lecture_identifier=lecture_identifier)
+    decks = extract_topic.get_topics_for_all_slides(slides, max_workers=scrape_workers, base_url=base_url)
+    extract_page_cache._page_cache.flush()
+    decks = add_links_to_topics(add_parent_ids(decks), base_url, lecture_identifier, linked_urls)
+    topics = [d for d in extract_topic.flatten_topics(decks).values() if d.get('id') is not None]
+    topics = add_namespace_to_ids(topics, namespace)
+    if len(sources) > 0:
+        topics = add_public_data_to_topics(topics, sources)
+    return topics
+
+
+def run_courses(courses: list, sources: list = PUBLIC_SOURCES, max_workers: int = None, scrape_workers: int = 1) -> list:
+    """
+    Runs the extract and enrichment steps for several courses, each course as a shard in its own process.
+
+    The shards are merged in the order of the courses. Afterwards the links of all topics are resolved
+    against the merged topics, so absolute lecture links between courses are resolved as well.
+    The processes share the rate limits of the hosts, see _init_shard_process.
+
+    Args:
+    - courses (list): The courses, see run_course_shard.
+    - sources (list, optional): The knowledge bases to query. Defaults to PUBLIC_SOURCES.
+    - max_workers (int, optional): Number of processes. Defaults to the number of CPUs.
+    - scrape_workers (int, optional): Number of decks scraped at the same time within a course. Defaults to 1.
+
+    Returns:
+    - list: The topics of all courses with resolved links.
+    """
+    # The namespace separates the ids and the page cache directories of the courses
+    namespaces = [course.get('namespace', '') for course in courses]
+    duplicates = sorted({namespace for namespace in namespaces if namespaces.count(namespace) > 1})
+    if duplicates:
+        raise ValueError(f"Every course needs its own namespace, these are used more than once: {duplicates}")
+    # Absolute links into any of the courses count as lecture links
+    linked_urls = tuple(course['base_url'] + course['lecture_identifier'] for course in courses)
+    processes = max(1, min(max_workers or os.cpu_count() or 1, len(courses)))
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_shard_process, initargs=(processes,)) as executor:
+        shards = list(executor.map(
+            partial(run_course_shard, sources=sources, scrape_workers=scrape_workers, linked_urls=linked_urls), courses))
+    topics = [topic for shard in shards for topic in shard]
+    print(f"Merged {len(topics)} topics from {len(courses)} courses")
+    return resolve_links_to_topics(topics)
+
+
+####################################################################################################
+# Streaming runs
+####################################################################################################
+def stream_decks(a_tags: list, base_url: str, lecture_identifier: str, sources: list = PUBLIC_SOURCES, max_workers: int = 1,
+                 backend: str = 'api', checkpoints=None, linked_urls: tuple = (), index_path: str = None):
+    """
+    Runs the extract and transform steps deck by deck: every deck is scraped, gets its parent ids and
+    links, is flattened, enriched, and classified before the next deck is requested. Only the topics of
+    one deck are in memory at a time.
+
+    Args:
+    - a_tags (list): The links to the slide decks as returned by get_links_from_main_page.
+    - base_url (str): The base URL of the decks.
+    - lecture_identifier (str): The prefix of links to other decks of the lecture.
+    - sources (list, optional): The knowledge bases to query. Defaults to PUBLIC_SOURCES.
+    - max_workers (int, optional): Number of lookups that run at the same time. Defaults to 1.
+    - backend (str, optional): "api" or "offline", see add_public_data_to_topics. Defaults to "api".
+    - checkpoints (CheckpointStore, optional): Reuse the lookups of unchanged sections. Defaults to none.
+    - linked_urls (tuple, optional): Prefixes of absolute links to decks of other courses. Defaults to none.
+    - index_path (str, optional): The offline index, see add_public_data_to_topics.
+
+    Yields:
+    - list: The topics of a deck, their links are not resolved yet.
+    """
+    for a in tqdm(a_tags, desc="Streaming slide decks"):
+        deck_topics, sections = extract_topic.get_deck_of_slide(a.get("href"), base_url)
+        deck = add_parent_ids([{"title": a.get("text"), "topics": deck_topics, "sections": sections}])[0]
+        deck = add_links_to_deck(deck, base_url, lecture_identifier, linked_urls)
+        topics = [d for d in extract_topic.flatten_topics([deck]).values() if d.get('id') is not None]
+        if len(sources) > 0 and checkpoints is not None:
+            topics = enrich_topics_with_checkpoints(topics, sources, checkpoints, max_workers, backend, index_path)
+        elif len(sources) > 0:
+            topics = add_public_data_to_topics(topics, sources, max_workers, backend, index_path=index_path)
+        yield extract_topic.mark_meta_topics(topics)
+
+
+def write_turtle_streaming(decks, filename: str) -> dict:
+    """
+    Writes the topics of a stream of decks to a Turtle file in two passes, so memory is bounded by the
+    largest deck instead of all topics.
+
+    The first pass writes the triples of every topic as its deck arrives and keeps only the id and URL of
+    the topic in a TopicIndex. The links of the topics are spilled to a temporary file, because a link may point to a
+    deck that was not scraped yet. The second pass resolves the spilled links against the index and appends
+    their triples to the file.
+
+    Args:
+    - decks (iterable): The topics of every deck, e.g. stream_decks.
+    - filename (str): The Turtle file to write.
+
+    Returns:
+    - dict: The number of "decks", "topics", topics skipped as "duplicates" of an earlier id, "triples" (including
+      "link_triples"), and the size of the "largest_deck".
+    """
+    index = TopicIndex()
+    ids = set()
+    stats = {'decks': 0, 'topics': 0, 'duplicates': 0, 'largest_deck': 0, 'triples': 0, 'link_triples': 0}
+    with tempfile.TemporaryFile('w+', encoding='utf-8') as links:
+        def topics_without_links():
+            for topics in decks:
+                stats['decks'] += 1
+                stats['topics'] += len(topics)
+                stats['largest_deck'] = max(stats['largest_deck'], len(topics))
+                for topic in topics:
+                    # Like flatten_topics, an id is only written once and the first topic with the id wins
+                    if topic.get('id') in ids:
+                        stats['duplicates'] += 1
+                        continue
+                    ids.add(topic.get('id'))
+                    index.add(topic)
+                    links.write(json.dumps([topic.get('id'), list(topic.get('forwardlinks') or []),
+                                            list(topic.get('backwardlinks') or []), list(topic.get('lecturelinks') or [])]) + '\n')
+                    # The triples of the links are written by the second pass
+                    topic['forwardIds'], topic['backwardIds'], topic['lectureIds'] = [], [], []
+                    yield topic
+
+        stats['triples'] = write_turtle(topics_without_links(), filename)
+
+        links.seek(0)
+        index.unresolved = []
+        with open(filename, 'a', encoding='utf-8') as f:
+            for line in links:
+                topic_id, forwardlinks, backwardlinks, lecturelinks = json.loads(line)
+                topic = resolve_topic_links({'id': topic_id, 'forwardlinks': forwardlinks, 'backwardlinks': backwardlinks,
+                                             'lecturelinks': lecturelinks}, index)
+                # A dict drops duplicate links like a graph would
+                triples = list(dict.fromkeys(topic_link_triples(topic)))
+                f.write(turtle_blocks(triples))
+                stats['link_triples'] += len(triples)
+        report_unresolved_links(index)
+    stats['triples'] += stats['link_triples']
+    return stats
+
+
+def run_streaming(base_url: str, lecture_identifier: str, filename: str, sources: list = PUBLIC_SOURCES, max_workers: int = 1,
+                  backend: str = 'api', checkpoints=None, index_path: str = None) -> dict:
+    """
+    Extracts, enriches, and exports the topics of a course deck by deck, see stream_decks and write_turtle_streaming.
+
+    Unlike a run with materialized steps, no list of all topics is built, so there is no topic store and no
+    Neo4j load; the Turtle file is the result of the run.
+
+    Returns:
+    - dict: The statistics of write_turtle_streaming.
+    """
+    slides = extract_topic.get_links_from_main_page('', base_url=base_url, lecture_identifier=lecture_identifier)
+    decks = stream_decks(slides, base_url, lecture_identifier, sources, max_workers, backend, checkpoints, index_path=index_path)
+    stats = write_turtle_streaming(decks, filename)
+    print(f"Streamed {stats['topics']} topics of {stats['decks']} decks (at most {stats['largest_deck']} per deck, "
+          f"{stats['duplicates']} duplicate ids skipped) as {stats['triples']} triples to {filename}")
+    return stats
@@ -0,0 +1,230 @@
+import contextlib
+import cProfile
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import extract_page_cache
+import http_client
+import transform_lookup_cache
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, the peak RSS is not reported there
+    resource = None
+
+# Stages that are profiled with cProfile, comma separated (e.g. "enrich,resolve" or "all")
+METRICS_PROFILE = os.getenv('METRICS_PROFILE', '')
+# Stages whose allocations are traced with tracemalloc, comma separated (e.g. "extract" or "all")
+METRICS_TRACEMALLOC = os.getenv('METRICS_TRACEMALLOC', '')
+# Directory for the .prof files and tracemalloc reports
+METRICS_PROFILE_DIR = os.getenv('METRICS_PROFILE_DIR', './profiles')
+# Number of lines in a tracemalloc report
+METRICS_TRACEMALLOC_TOP = 25
+# Prefix of all Prometheus metrics
+METRICS_PREFIX = 'kg_pipeline'
+
+
+def get_peak_rss() -> int:
+    """
+    Returns the peak resident set size of the process in bytes, or None if it is not available.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def parse_stage_list(value: str) -> set:
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class RunMetrics:
+    """
+    Collects the metrics of the stages of a pipeline run.
+
+    Every stage records its wall time, the number of topics going in and out, the HTTP requests and
+    downloaded bytes per host, the hits and misses of the page, lookup, and checkpoint caches, the number
+    of emitted triples, and the peak RSS of the process at the end of the stage. The HTTP and cache counters
+    are read from the shared clients of this process, so the work of the shard processes of a multi-course
+    run is not included.
+
+    Usage:
+        metrics = RunMetrics()
+        with metrics.stage('enrich', topics_in=len(topics)) as stage:
+            topics = add_public_data_to_topics(topics, sources)
+            stage['topics_out'] = len(topics)
+        metrics.write_json('run_metrics.json')
+    """
+
+    def __init__(self, profile: str = METRICS_PROFILE, trace_memory: str = METRICS_TRACEMALLOC,
+                 profile_dir: str = METRICS_PROFILE_DIR):
+        self.started_at = time.time()
+        self.finished_at = None
+        self.success = None
+        self.stages = {}
+        self.profile = parse_stage_list(profile)
+        self.trace_memory = parse_stage_list(trace_memory)
+        self.profile_dir = profile_dir
+        self._caches = {}
+
+    def watch_cache(self, name: str, stats: dict):
+        """
+        Adds the stats dictionary of a cache (e.g. CheckpointStore.stats) to the cache counters.
+        """
+        self._caches[name] = stats
+
+    def _counters(self) -> dict:
+        caches = dict(self._caches)
+        if extract_page_cache._page_cache is not None:
+            caches['pages'] = extract_page_cache._page_cache.stats
+        if transform_lookup_cache._lookup_cache is not None:
+            caches['lookups'] = transform_lookup_cache._lookup_cache.stats
+        client = http_client._http_client
+        return {
+            'http': {host: dict(stats) for host, stats in client.stats.items()} if client is not None else {},
+            'caches': {name: dict(stats) for name, stats in caches.items()},
+        }
+
+    @contextlib.contextmanager
+    def stage(self, name: str, topics_in: int = None):
+        """
+        Measures a stage. Yields the record of the stage, in which the caller sets topics_out and triples.
+        """
+        record = {'topics_in': topics_in, 'topics_out': None, 'triples': None}
+        profiler = cProfile.Profile() if name in self.profile or 'all' in self.profile else None
+        trace = (name in self.trace_memory or 'all' in self.trace_memory) and not tracemalloc.is_tracing()
+        before = self._counters()
+        if trace:
+            tracemalloc.start()
+        if profiler is not None:
+            profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+                os.makedirs(self.profile_dir, exist_ok=True)
+                profiler.dump_stats(os.path.join(self.profile_dir, f'{name}.prof'))
+            if trace:
+                snapshot = tracemalloc.take_snapshot()
+                record['traced_peak_bytes'] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                self._write_tracemalloc_report(name, snapshot)
+            record.update(self._stage_counters(before, self._counters()))
+            record['peak_rss_bytes'] = get_peak_rss()
+            self.stages[name] = record
+
+    @staticmethod
+    def _stage_counters(before: dict, after: dict) -> dict:
+        http = {}
+        for host, stats in after['http'].items():
+            delta = {key: value - before['http'].get(host, {}).get(key, 0) for key, value in stats.items()}
+            if delta['requests'] > 0:
+                http[host] = delta
+        caches = {}
+        for name, stats in after['caches'].items():
+            delta = {key: value - before['caches'].get(name, {}).get(key, 0) for key, value in stats.items()}
+            total = sum(delta.values())
+            if total > 0:
+                # A page that was revalidated with a 304 counts as a hit, its body was not downloaded again
+                delta['hit_ratio'] = (delta.get('hits', 0) + delta.get('not_modified', 0)) / total
+                caches[name] = delta
+        return {
+            'http': http,
+            'http_requests': sum(stats['requests'] for stats in http.values()),
+            'http_bytes': sum(stats['bytes'] for stats in http.values()),
+            'caches': caches,
+        }
+
+    def _write_tracemalloc_report(self, name: str, snapshot):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        with open(os.path.join(self.profile_dir, f'{name}.tracemalloc.txt'), 'w', encoding='utf-8') as f:
+            for statistic in snapshot.statistics('lineno')[:METRICS_TRACEMALLOC_TOP]:
+                f.write(f'{statistic}\n')
+
+    def finish(self, success: bool = True):
+        self.finished_at = time.time()
+        self.success = success
+
+    def to_dict(self) -> dict:
+        finished_at = self.finished_at if self.finished_at is not None else time.time()
+        return {
+            'started_at': self.started_at,
+            'finished_at': finished_at,
+            'seconds': finished_at - self.started_at,
+            'success': self.success,
+            'peak_rss_bytes': get_peak_rss(),
+            'stages': self.stages,
+        }
+
+    ##########################
+    # Reports
+    ##########################
+
+    def write_json(self, filename: str):
+        """
+        Writes the run report as JSON.
+        """
+        write_atomic(filename, json.dumps(self.to_dict(), indent=2))
+
+    def write_prometheus(self, filename: str):
+        """
+        Writes the metrics in the Prometheus text format, e.g. for the textfile collector of the node exporter.
+        """
+        report = self.to_dict()
+        lines = []
+
+        def metric(name: str, help_text: str, samples: list):
+            samples = [(labels, value) for labels, value in samples if value is not None]
+            if not samples:
+                return
+            lines.append(f'# HELP {METRICS_PREFIX}_{name} {help_text}')
+            lines.append(f'# TYPE {METRICS_PREFIX}_{name} gauge')
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{prometheus_escape(str(label))}"' for key, label in labels.items())
+                lines.append(f'{METRICS_PREFIX}_{name}{{{label_text}}} {value}' if label_text else f'{METRICS_PREFIX}_{name} {value}')
+
+        stages = report['stages'].items()
+        metric('run_start_timestamp_seconds', 'Start of the last run.', [({}, report['started_at'])])
+        metric('run_duration_seconds', 'Wall time of the last run.', [({}, report['seconds'])])
+        metric('run_success', 'Whether the last run finished without an error.',
+               [({}, None if report['success'] is None else int(report['success']))])
+        metric('run_peak_rss_bytes', 'Peak resident set size of the last run.', [({}, report['peak_rss_bytes'])])
+        metric('stage_duration_seconds', 'Wall time of a stage.', [({'stage': name}, stage['seconds']) for name, stage in stages])
+        metric('stage_topics_in', 'Topics going into a stage.', [({'stage': name}, stage['topics_in']) for name, stage in stages])
+        metric('stage_topics_out', 'Topics coming out of a stage.', [({'stage': name}, stage['topics_out']) for name, stage in stages])
+        metric('stage_triples', 'Triples emitted by a stage.', [({'stage': name}, stage['triples']) for name, stage in stages])
+        metric('stage_peak_rss_bytes', 'Peak resident set size of the process at the end of a stage.',
+               [({'stage': name}, stage['peak_rss_bytes']) for name, stage in stages])
+        metric('stage_http_requests', 'HTTP requests of a stage per host, including retries.',
+               [({'stage': name, 'host': host}, stats['requests']) for name, stage in stages for host, stats in stage['http'].items()])
+        metric('stage_http_retries', 'Repeated HTTP requests of a stage per host.',
+               [({'stage': name, 'host': host}, stats['retries']) for name, stage in stages for host, stats in stage['http'].items()])
+        metric('stage_http_throttles', 'Throttled HTTP responses of a stage per host.',
+               [({'stage': name, 'host': host}, stats['throttles']) for name, stage in stages for host, stats in stage['http'].items()])
+        metric('stage_http_bytes', 'Downloaded bytes of a stage per host.',
+               [({'stage': name, 'host': host}, stats['bytes']) for name, stage in stages for host, stats in stage['http'].items()])
+        metric('stage_cache_hit_ratio', 'Share of cache lookups of a stage that were answered by the cache.',
+               [({'stage': name, 'cache': cache}, stats['hit_ratio']) for name, stage in stages for cache, stats in stage['caches'].items()])
+        write_atomic(filename, '\n'.join(lines) + '\n')
+
+
+def prometheus_escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def write_atomic(filename: str, content: str):
+    # Readers such as the node exporter never see a half written file
+    if os.path.dirname(filename):
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_filename, filename)
@@ -0,0 +1,59 @@
+import checkpoint
+import transform_lookup_planner
+from checkpoint import CheckpointStore, enrich_topics_with_checkpoints
+
+
+def fake_enrichment(calls: list):
+    def add_public_data_to_topics(topics, sources, max_workers=1, backend='api', failed=None, index_path=None):
+        calls.append([topic['section'] for topic in topics])
+        for topic in topics:
+            topic['wiki_ids'], topic['wiki_labels'], topic['wiki_descriptions'] = ['Q1'], ['label'], ['description']
+        return topics
+    return add_public_data_to_topics
+
+
+def test_results_of_another_search_strategy_are_not_reused(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(checkpoint, 'add_public_data_to_topics', fake_enrichment(calls))
+    store = CheckpointStore(str(tmp_path / 'checkpoints.sqlite'))
+
+    enrich_topics_with_checkpoints([{'section': '1. Processes'}], ['wikidata'], store)
+    enrich_topics_with_checkpoints([{'section': '1. Processes'}], ['wikidata'], store)
+    assert calls == [['1. Processes']]
+
+    monkeypatch.setattr(transform_lookup_planner, 'FALLBACK_BUDGET', 4)
+    topics = enrich_topics_with_checkpoints([{'section': '1. Processes'}], ['wikidata'], store)
+    assert calls == [['1. Processes'], ['1. Processes']]
+    assert topics[0]['wiki_ids'] == ['Q1']
+    store.close()
+
+
+def test_results_expire_like_the_lookup_cache(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(checkpoint, 'add_public_data_to_topics', fake_enrichment(calls))
+    store = CheckpointStore(str(tmp_path / 'checkpoints.sqlite'))
+
+    enrich_topics_with_checkpoints([{'section': '1. Processes'}], ['wikidata'], store)
+    monkeypatch.setattr(checkpoint, 'LOOKUP_CACHE_TTL', 0)
+    enrich_topics_with_checkpoints([{'section': '1. Processes'}], ['wikidata'], store)
+    assert calls == [['1. Processes'], ['1. Processes']]
+    store.close()
+
+
+def test_offline_results_are_recomputed_after_the_index_is_rebuilt(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(checkpoint, 'add_public_data_to_topics', fake_enrichment(calls))
+    store = CheckpointStore(str(tmp_path / 'checkpoints.sqlite'))
+    index_path = tmp_path / 'entities.sqlite'
+    index_path.write_bytes(b'first build')
+
+    for _ in range(2):
+        enrich_topics_with_checkpoints([{'section': '1. Processes'}], ['wikidata'], store, backend='offline',
+                                       index_path=str(index_path))
+    assert calls == [['1. Processes']]
+
+    index_path.write_bytes(b'second, larger build')
+    enrich_topics_with_checkpoints([{'section': '1. Processes'}], ['wikidata'], store, backend='offline',
+                                   index_path=str(index_path))
+    assert calls == [['1. Processes'], ['1. Processes']]
+    store.close()
@@ -0,0 +1,27 @@
+import pytest
+
+from cli import main
+from topic_graph import TopicGraph
+
+
+@pytest.fixture
+def graph_path(tmp_path):
+    path = str(tmp_path / 'topic_graph')
+    TopicGraph.from_topics([{'id': '01', 'parent_id': ''}, {'id': '01.1', 'parent_id': '01'}]).save(path)
+    return path
+
+
+@pytest.mark.parametrize('options, message', [
+    (['--topic', '02'], 'Unknown topic 02'),
+    (['--topic', '01', '--path-to', '02'], 'Unknown topic 02'),
+    (['--topic', '01', '--edge-types', 'parent,sibling'], 'Unknown edge types sibling'),
+])
+def test_traverse_exits_with_a_message(graph_path, options, message):
+    with pytest.raises(SystemExit) as exc_info:
+        main(['traverse', '--graph', graph_path] + options)
+    assert str(exc_info.value).startswith(message)
+
+
+def test_traverse(graph_path, capsys):
+    assert main(['traverse', '--graph', graph_path, '--topic', '01', '--subtree']) == 0
+    assert '01.1' in capsys.readouterr().out
@@ -0,0 +1,32 @@
+import os
+
+from load_delta import PATCH_SUFFIX, SNAPSHOT_SUFFIX, read_snapshot, topic_lines, write_turtle_with_patch
+
+
+def make_topic(topic_id: str, section: str, parent_id: str = '', wiki_ids: list = None) -> dict:
+    return {'id': topic_id, 'section': section, 'url': f'https://oer.gitlab.io/OS/deck.html#/slide-{topic_id}',
+            'parent_id': parent_id, 'meta_type': 'topic', 'beyondlinks': [], 'basiclinks': [],
+            'wiki_ids': wiki_ids, 'wiki_labels': ['operating system'] if wiki_ids else None,
+            'forwardIds': [], 'backwardIds': [], 'lectureIds': []}
+
+
+def test_streamed_and_serialized_exports_share_the_snapshot(tmp_path):
+    filename = str(tmp_path / 'topics.ttl')
+    topics = [make_topic('01', 'OS01 Introduction'), make_topic('01.1', '1. Operating systems', '01', ['Q9135'])]
+
+    first = write_turtle_with_patch(topics, filename, stream=True)
+    assert first == {'triples': len(topic_lines(topics)), 'added': None, 'removed': None}
+    previous_id, _ = read_snapshot(filename + SNAPSHOT_SUFFIX)
+
+    # Serializing the same topics does not change anything, so no patch is written
+    assert write_turtle_with_patch(topics, filename, stream=False)['added'] == 0
+    assert not os.path.exists(filename + PATCH_SUFFIX)
+
+    # A change exported without streaming still moves the snapshot on and writes the patch against it
+    topics[1]['wiki_ids'] = None
+    delta = write_turtle_with_patch(topics, filename, stream=False)
+    assert delta['added'] == 0 and delta['removed'] == 3
+    with open(filename + PATCH_SUFFIX, 'r', encoding='utf-8') as f:
+        patch = f.read()
+    assert f'H prev <urn:sha1:{previous_id}> .' in patch
+    assert f'H id <urn:sha1:{read_snapshot(filename + SNAPSHOT_SUFFIX)[0]}> .' in patch
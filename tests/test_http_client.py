@@ -0,0 +1,58 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import transform_public_enhancer
+from http_client import HttpClient
+
+
+class ThrottlingHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = b'{"error": {"code": "maxlag", "info": "Waiting for a database server"}}'
+        self.send_response(200)
+        self.send_header('MediaWiki-API-Error', 'maxlag')
+        self.send_header('Retry-After', '0')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def throttling_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ThrottlingHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_raises_when_the_retries_are_used_up(throttling_server):
+    client = HttpClient(rate_limits={}, max_retries=1)
+    try:
+        with pytest.raises(requests.HTTPError, match='maxlag after 2 attempts'):
+            client.get(throttling_server + '/w/api.php')
+        stats = next(iter(client.stats.values()))
+        assert stats['requests'] == 2 and stats['throttles'] == 1
+    finally:
+        client.close()
+
+
+def test_api_error_bodies_are_not_taken_as_no_result(monkeypatch):
+    class Response:
+        status_code = 200
+
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {'error': {'code': 'badvalue', 'info': 'Unrecognized value'}}
+
+    monkeypatch.setattr(transform_public_enhancer, 'http_get', lambda url: Response())
+    with pytest.raises(requests.HTTPError, match='badvalue'):
+        transform_public_enhancer.get_api_json('https://www.wikidata.org/w/api.php?action=wbsearchentities')
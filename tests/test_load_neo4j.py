@@ -0,0 +1,133 @@
+import pytest
+
+pytest.importorskip('neo4j')
+
+import load_neo4j
+from load_neo4j import sync_topics_to_neo4j
+from load_rdf import LECTURE, WIKIDATA
+
+
+class FakeGraph:
+    """
+    Stands in for the driver, its sessions, and transactions. The write functions of load_neo4j are
+    replaced by the functions below, which change the nodes and relationships like their Cypher does.
+    """
+
+    def __init__(self):
+        self.nodes = {}
+        self.relationships = set()
+
+    def session(self, database=None):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, **params):
+        return self
+
+    def consume(self):
+        pass
+
+    def execute_write(self, func, *args):
+        return func(self, *args)
+
+    def node(self, uri):
+        return self.nodes.setdefault(uri, {'labels': set(), 'props': {}})
+
+    def state(self):
+        nodes = {uri: (sorted(node['labels']), node['props']) for uri, node in self.nodes.items()}
+        return nodes, self.relationships
+
+
+def merge_nodes(tx, label, rows):
+    for row in rows:
+        node = tx.node(row['uri'])
+        if label is not None:
+            node['labels'].add(label)
+        node['props'].update(row['props'])
+
+
+def merge_relationships(tx, rel_type, rows):
+    for row in rows:
+        tx.node(row['s'])
+        tx.node(row['o'])
+        tx.relationships.add((row['s'], rel_type, row['o']))
+
+
+def delete_relationships(tx, rel_type, rows):
+    for row in rows:
+        tx.relationships.discard((row['s'], rel_type, row['o']))
+
+
+def remove_labels(tx, label, rows):
+    for row in rows:
+        if row['uri'] in tx.nodes:
+            tx.nodes[row['uri']]['labels'].discard(label)
+
+
+def replace_nodes(tx, label, rows):
+    for row in rows:
+        node = tx.node(row['uri'])
+        if label is not None:
+            node['labels'].add(label)
+        node['props'] = dict(row['props'])
+
+
+def delete_nodes(tx, rows):
+    for row in rows:
+        tx.nodes.pop(row['uri'], None)
+        tx.relationships = {rel for rel in tx.relationships if row['uri'] not in (rel[0], rel[2])}
+
+
+def make_topic(topic_id: str, section: str, parent_id: str = '', meta_type: str = 'topic', basiclinks: list = (),
+               wiki_ids: list = None, forward_ids: list = ()) -> dict:
+    return {'id': topic_id, 'section': section, 'url': f'https://oer.gitlab.io/OS/deck.html#/slide-{topic_id}',
+            'parent_id': parent_id, 'meta_type': meta_type, 'beyondlinks': [], 'basiclinks': list(basiclinks),
+            'wiki_ids': wiki_ids, 'wiki_labels': [f'label of {wiki_id}' for wiki_id in wiki_ids] if wiki_ids else None,
+            'forwardIds': list(forward_ids), 'backwardIds': [], 'lectureIds': []}
+
+
+@pytest.fixture
+def fake_neo4j(monkeypatch):
+    for func in (merge_nodes, merge_relationships, delete_relationships, remove_labels, replace_nodes, delete_nodes):
+        monkeypatch.setattr(load_neo4j, func.__name__, func)
+
+
+def test_delta_sync_gives_the_graph_of_a_full_load(tmp_path, fake_neo4j):
+    previous = [
+        make_topic('01', 'OS01 Introduction', meta_type='structure'),
+        make_topic('01.1', '1. Operating systems', '01', basiclinks=['#/slide-a', '#/slide-b'], wiki_ids=['Q9135'],
+                   forward_ids=['01.3']),
+        make_topic('01.2', '2. Processes', '01', basiclinks=['#/slide-c'], wiki_ids=['Q11173']),
+        make_topic('01.3', '3. Threads', '01.9'),
+    ]
+    current = [
+        # The structure becomes a concept, so its label changes and schema:name and schema:url are dropped
+        make_topic('01', 'OS01 Introduction'),
+        # One of the list properties and the only Wikidata match are removed, Q9135 is left without triples
+        make_topic('01.1', '1. Operating systems', '01', basiclinks=['#/slide-a']),
+        # The last list property is removed, the match is kept
+        make_topic('01.2', '2. Processes', '01', wiki_ids=['Q11173']),
+        # 01.3 is gone together with its parent 01.9, which only occurred as object, and a new topic shows up
+        make_topic('01.4', '4. Scheduling', '01', wiki_ids=['Q11173', 'Q2']),
+    ]
+    snapshot_path = str(tmp_path / 'neo4j.snapshot')
+
+    synced = FakeGraph()
+    assert sync_topics_to_neo4j(previous, synced, snapshot_path)['added'] is None
+    delta = sync_topics_to_neo4j(current, synced, snapshot_path)
+    assert delta['added'] > 0 and delta['removed'] > 0
+
+    loaded = FakeGraph()
+    sync_topics_to_neo4j(current, loaded, str(tmp_path / 'full.snapshot'), full=True)
+
+    assert synced.state() == loaded.state()
+    nodes, _ = synced.state()
+    assert nodes[str(LECTURE['01'])][0] == ['Concept']
+    assert str(WIKIDATA['Q9135']) not in nodes
+    assert str(LECTURE['01.9']) not in nodes
+    assert 'related' not in nodes[str(LECTURE['01.2'])][1]
@@ -0,0 +1,29 @@
+import pytest
+
+pytest.importorskip('pyoxigraph')
+
+from load_store import TripleStore
+
+TOPIC = '<https://oer.uni-muenster.de/OS/01.2>'
+LABEL = '<http://www.w3.org/2004/02/skos/core#prefLabel>'
+
+
+def write_graph(tmp_path, label: str) -> str:
+    filename = str(tmp_path / 'topics.nt')
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write(f'{TOPIC} {LABEL} "{label}" .\n')
+    return filename
+
+
+def test_read_only_store_sees_a_later_load(tmp_path):
+    path = str(tmp_path / 'kg_store')
+    writer = TripleStore(path)
+    writer.load_file(write_graph(tmp_path, 'Processes'))
+
+    reader = TripleStore(path, read_only=True)
+    assert reader.topic('01.2')['prefLabel'] == ['Processes']
+    assert reader.topic('01.2')['prefLabel'] == ['Processes']
+    assert reader.cache.stats['hits'] == 1
+
+    writer.load_file(write_graph(tmp_path, 'Threads'))
+    assert reader.topic('01.2')['prefLabel'] == ['Threads']
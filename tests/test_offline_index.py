@@ -0,0 +1,41 @@
+import os
+
+from transform_offline_index import OFFLINE_INDEX_PATH, OfflineIndex, build_index, get_offline_index, iter_wikidata_dump
+from transform_public_enhancer import add_public_data_to_topics
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+WIKIDATA_DUMP = os.path.join(FIXTURE_DIR, 'wikidata-sample.json.gz')
+
+
+def test_iter_wikidata_dump_accepts_empty_lists():
+    # Q1 has no label at all, Q2 writes its empty descriptions, aliases, and sitelinks as []
+    entities = list(iter_wikidata_dump(WIKIDATA_DUMP))
+    assert [entity[0] for entity in entities] == ['Q9135', 'Q2', 'Q3']
+    assert entities[1] == ('Q2', 'memory management', None, [], 0)
+
+
+def test_build_index_and_search(tmp_path):
+    path = str(tmp_path / 'entities.sqlite')
+    assert build_index(path, {'wikidata': WIKIDATA_DUMP}) == {'wikidata': 3}
+    index = OfflineIndex(path)
+    try:
+        # Exact labels are ranked by popularity, aliases are names as well
+        assert index.search('wikidata', 'Operating System')[0] == 'Q9135'
+        assert index.search('wikidata', 'OS')[0] == 'Q9135'
+        # Without an exact name, the full-text index matches the last word as prefix
+        assert index.search('wikidata', 'memory manag') == ('Q2', 'memory management', None)
+        assert index.search('wikidata', 'scheduling') is None
+        assert index.search('wikipedia', 'operating system') is None
+    finally:
+        index.close()
+
+
+def test_offline_enrichment_uses_the_given_index(tmp_path):
+    path = str(tmp_path / 'entities.sqlite')
+    build_index(path, {'wikidata': WIKIDATA_DUMP})
+    topics = [{'section': '1. Operating System'}]
+    add_public_data_to_topics(topics, ['wikidata'], backend='offline', index_path=path)
+    assert topics[0]['wiki_ids'] == ['Q9135']
+    # The index is not read from the default path
+    assert OFFLINE_INDEX_PATH != path
+    get_offline_index(path).close()
@@ -0,0 +1,31 @@
+import time
+
+import extract_page_cache
+from extract_page_cache import PageCache
+
+
+class Response:
+    status_code = 200
+    ok = True
+    headers = {}
+
+    def __init__(self, content: bytes):
+        self.content = content
+
+
+def test_hits_keep_the_lru_order_across_runs(tmp_path, monkeypatch):
+    monkeypatch.setattr(extract_page_cache, 'http_get', lambda url, headers: Response(b'x' * 100))
+    cache = PageCache(str(tmp_path), max_bytes=250)
+    cache.get('https://oer.gitlab.io/OS/a.html')
+    cache.get('https://oer.gitlab.io/OS/b.html')
+    time.sleep(0.01)
+    # a.html is served from the cache and becomes the most recently used page
+    cache.get('https://oer.gitlab.io/OS/a.html')
+    cache.flush()
+
+    # The next run evicts b.html, not a.html
+    cache = PageCache(str(tmp_path), max_bytes=250)
+    cache.get('https://oer.gitlab.io/OS/c.html')
+    assert sorted(entry['url'] for entry in cache._index.values()) == [
+        'https://oer.gitlab.io/OS/a.html', 'https://oer.gitlab.io/OS/c.html']
+    assert cache.stats['misses'] == 1
@@ -0,0 +1,67 @@
+import copy
+
+import pytest
+from rdflib import Graph, URIRef
+from rdflib.namespace import SKOS
+
+import extract_topic
+import http_client
+import pipeline
+from load_rdf import LECTURE, write_turtle
+from transform_filter import resolve_links_to_topics
+
+
+def test_shard_processes_share_the_rate_limits():
+    pipeline._init_shard_process(4)
+    client = http_client.get_http_client()
+    try:
+        assert client.rate_limits['www.wikidata.org'] == (2.5, 2.5)
+        assert client.default_rate_limit == (5.0, 5.0)
+    finally:
+        client.close()
+        http_client._http_client = None
+
+
+def test_run_courses_rejects_shared_namespaces():
+    courses = [{'base_url': 'https://oer.gitlab.io/OS/', 'lecture_identifier': 'Operating-Systems'},
+               {'base_url': 'https://oer.gitlab.io/oer-courses/cacs/', 'lecture_identifier': 'Distributed-Systems'}]
+    with pytest.raises(ValueError, match='namespace'):
+        pipeline.run_courses(courses, sources=[])
+
+
+def make_deck(title: str, deck_url: str, sections: list) -> dict:
+    # A deck as add_links_to_topics returns it: (text, id, parent_id, forwardlinks) per section
+    topics = []
+    for i, (text, topic_id, parent_id, forwardlinks) in enumerate(sections):
+        topics.append({'text': text, 'tag': 'h1' if parent_id == '' else 'h2', 'id': topic_id, 'parent_id': parent_id,
+                       'html_id': f'slide-{i}', 'url': f'{deck_url}#/slide-{i}', 'beyondlinks': [], 'basiclinks': [],
+                       'forwardlinks': forwardlinks, 'backwardlinks': [], 'lecturelinks': []})
+    return {'title': title, 'topics': topics}
+
+
+def test_streamed_turtle_matches_materialized_run_with_duplicate_ids(tmp_path):
+    base = 'https://oer.gitlab.io/OS/'
+    decks = [
+        make_deck('Introduction', base + 'Operating-Systems-Introduction.html',
+                  [('OS01 Introduction', '01', '', []),
+                   ('1. Operating systems', '01.1', '01', [base + 'Operating-Systems-Processes.html#slide-1'])]),
+        # Repeats the id 01.1 of the first deck, the first topic with the id wins in both runs
+        make_deck('Processes', base + 'Operating-Systems-Processes.html',
+                  [('OS01 Processes', '02', '', []),
+                   ('1. Processes', '01.1', '02', [base + 'Operating-Systems-Introduction.html#slide-1'])]),
+    ]
+
+    materialized = [topic for topic in extract_topic.flatten_topics(copy.deepcopy(decks)).values()]
+    materialized = resolve_links_to_topics(extract_topic.mark_meta_topics(materialized))
+    write_turtle(materialized, str(tmp_path / 'materialized.ttl'))
+
+    streamed = (extract_topic.mark_meta_topics(list(extract_topic.flatten_topics([deck]).values()))
+                for deck in copy.deepcopy(decks))
+    stats = pipeline.write_turtle_streaming(streamed, str(tmp_path / 'streamed.ttl'))
+
+    assert stats['duplicates'] == 1
+    expected = Graph().parse(str(tmp_path / 'materialized.ttl'))
+    actual = Graph().parse(str(tmp_path / 'streamed.ttl'))
+    assert set(actual) == set(expected)
+    assert (URIRef(LECTURE['01.1']), SKOS.broader, URIRef(LECTURE['01'])) in actual
+    assert (URIRef(LECTURE['01.1']), SKOS.narrower, URIRef(LECTURE['01.1'])) not in actual
@@ -0,0 +1,27 @@
+import requests
+
+import transform_lookup_cache
+from transform_lookup_cache import LookupCache, cached_lookup
+from transform_public_enhancer import add_results_to_topics
+
+
+def test_a_failed_lookup_is_a_miss_for_one_topic_only(tmp_path, monkeypatch):
+    cache = LookupCache(str(tmp_path / 'lookups.sqlite'))
+    monkeypatch.setattr(transform_lookup_cache, '_lookup_cache', cache)
+
+    @cached_lookup('test')
+    def search(term):
+        if term == 'Scheduling':
+            raise requests.HTTPError('www.wikidata.org answered maxlag after 6 attempts')
+        return [{'id': term.upper(), 'label': term, 'description': term}]
+
+    topics = [{'section': '1. Processes'}, {'section': '2. Scheduling'}, {'section': '3. Threads'}]
+    failed = []
+    add_results_to_topics(topics, search, 'wiki', 'Test lookups', max_workers=4, failed=failed)
+
+    assert [topic['wiki_ids'] for topic in topics] == [['PROCESSES'], None, ['THREADS']]
+    assert failed == [topics[1]]
+    # The failure is not cached, the next run asks again
+    assert cache.get('test', 'Scheduling') == (False, None)
+    assert cache.get('test', 'Threads')[0]
+    cache.close()
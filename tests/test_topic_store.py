@@ -0,0 +1,17 @@
+from topic_record import Topic
+from topic_store import export_topics_csv, import_topics_csv
+
+
+def test_export_writes_the_fields_of_all_topics(tmp_path):
+    filename = str(tmp_path / 'topics.csv')
+    # Only the second topic was enriched, only the third one has a field outside of TOPIC_FIELDS
+    topics = [Topic({'id': '01', 'section': 'OS01 Introduction'}),
+              Topic({'id': '01.1', 'section': '1. Operating systems', 'wiki_ids': ['Q9135']}),
+              {'score': '0.5', 'id': '01.2', 'section': '2. Processes'}]
+    export_topics_csv(topics, filename)
+
+    with open(filename, 'r', encoding='utf-8') as f:
+        assert f.readline().strip() == 'id;section;wiki_ids;score'
+    imported = import_topics_csv(filename)
+    assert imported[1]['wiki_ids'] == ('Q9135',)
+    assert imported[2]['score'] == '0.5'
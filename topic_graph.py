@@ -0,0 +1,207 @@
+import json
+import os
+
+import numpy as np
+
+# Edge types of the topic graph. "child" is the reverse of "parent", so subtrees can be walked downwards
+EDGE_TYPES = ('parent', 'child', 'forward', 'backward', 'lecture')
+# Fields of a topic that hold the targets of the edges of a type
+EDGE_FIELDS = {'forward': 'forwardIds', 'backward': 'backwardIds', 'lecture': 'lectureIds'}
+# Version of the files written by TopicGraph.save
+GRAPH_FORMAT_VERSION = 1
+
+
+class TopicGraph:
+    """
+    Relations between topics (parent_id, forwardIds, backwardIds, lectureIds) as compressed sparse rows.
+
+    Nodes are numbered in the sorted order of their ids, so an id is found with a binary search and no
+    dictionary has to be built after loading. The edges of node i are indices[indptr[i]:indptr[i + 1]],
+    sorted by type and target, and edge_types holds the index of each edge's type in EDGE_TYPES.
+
+    The arrays can be saved to a directory of .npy files and loaded memory-mapped, so a service answers
+    traversals straight from the page cache without a database round trip.
+    """
+
+    def __init__(self, ids: np.ndarray, indptr: np.ndarray, indices: np.ndarray, edge_types: np.ndarray):
+        # Plain views of memory-mapped arrays, numpy.memmap adds overhead to every operation on them
+        self.ids = np.asarray(ids)
+        self.indptr = np.asarray(indptr)
+        self.indices = np.asarray(indices)
+        self.edge_types = np.asarray(edge_types)
+        self._masks = {}
+
+    @classmethod
+    def from_topics(cls, topics: list) -> 'TopicGraph':
+        """
+        Compiles the relations of the topics. Ids that are only referenced (e.g. a parent that was not
+        extracted) become nodes as well, empty ids are skipped, and duplicate edges are dropped.
+        """
+        sources = []
+        targets = []
+        types = []
+        for topic in topics:
+            topic_id = topic.get('id')
+            if topic_id is None or topic_id == '':
+                continue
+            parent_id = topic.get('parent_id')
+            if parent_id is not None and parent_id != '':
+                sources += [topic_id, parent_id]
+                targets += [parent_id, topic_id]
+                types += [EDGE_TYPES.index('parent'), EDGE_TYPES.index('child')]
+            for edge_type, field in EDGE_FIELDS.items():
+                for target in topic.get(field) or []:
+                    if target != '':
+                        sources.append(topic_id)
+                        targets.append(target)
+                        types.append(EDGE_TYPES.index(edge_type))
+
+        topic_ids = [topic.get('id') for topic in topics if topic.get('id') not in (None, '')]
+        ids = np.unique(np.array(topic_ids + sources + targets, dtype=str))
+        n = len(ids)
+        src = np.searchsorted(ids, np.array(sources, dtype=str)).astype(np.int64)
+        dst = np.searchsorted(ids, np.array(targets, dtype=str)).astype(np.int64)
+        typ = np.array(types, dtype=np.int64)
+        # One key per edge orders the edges by source, type, and target and finds the duplicates
+        keys = np.unique((src * len(EDGE_TYPES) + typ) * max(n, 1) + dst)
+        dst = keys % max(n, 1)
+        typ = (keys // max(n, 1)) % len(EDGE_TYPES)
+        src = keys // max(n, 1) // len(EDGE_TYPES)
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+        return cls(ids, indptr, dst.astype(np.int32), typ.astype(np.int8))
+
+    ##########################################################################################
+    # Persistence
+    ##########################################################################################
+    def save(self, path: str):
+        """
+        Writes the arrays as .npy files into the directory path.
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in ('ids', 'indptr', 'indices', 'edge_types'):
+            np.save(os.path.join(path, f'{name}.npy'), getattr(self, name))
+        with open(os.path.join(path, 'graph.json'), 'w', encoding='utf-8') as f:
+            json.dump({'version': GRAPH_FORMAT_VERSION, 'edge_types': EDGE_TYPES,
+                       'nodes': len(self.ids), 'edges': len(self.indices)}, f)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> 'TopicGraph':
+        """
+        Loads a graph written by save. With mmap the arrays are mapped instead of read, so loading is
+        instant and several processes share the same memory.
+        """
+        with open(os.path.join(path, 'graph.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta['version'] != GRAPH_FORMAT_VERSION or tuple(meta['edge_types']) != EDGE_TYPES:
+            raise ValueError(f"{path} was written by another version of topic_graph, build it again")
+        mode = 'r' if mmap else None
+        return cls(*(np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mode)
+                     for name in ('ids', 'indptr', 'indices', 'edge_types')))
+
+    ##########################################################################################
+    # Traversal
+    ##########################################################################################
+    def node(self, topic_id: str) -> int:
+        """
+        Returns the index of a topic. Raises KeyError for unknown ids.
+        """
+        i = int(np.searchsorted(self.ids, topic_id))
+        if i == len(self.ids) or self.ids[i] != topic_id:
+            raise KeyError(topic_id)
+        return i
+
+    def type_mask(self, edge_types) -> np.ndarray:
+        """
+        Returns a boolean array that is True for the indices of the given edge types (all if None).
+        """
+        key = tuple(edge_types or EDGE_TYPES)
+        mask = self._masks.get(key)
+        if mask is None:
+            mask = np.zeros(len(EDGE_TYPES), dtype=bool)
+            mask[[EDGE_TYPES.index(edge_type) for edge_type in key]] = True
+            self._masks[key] = mask
+        return mask
+
+    def expand(self, frontier: np.ndarray, mask: np.ndarray) -> tuple:
+        """
+        Returns the edges of all frontier nodes whose type is in mask, as (sources, targets) arrays.
+        """
+        if len(frontier) == 1:
+            # A single node, e.g. the first hop, is a slice of the arrays
+            start, end = self.indptr[frontier[0]], self.indptr[frontier[0] + 1]
+            targets = self.indices[start:end][mask[self.edge_types[start:end]]].astype(np.int64)
+            return np.full(len(targets), frontier[0]), targets
+        starts = self.indptr[frontier]
+        lengths = self.indptr[frontier + 1] - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return frontier[:0], frontier[:0]
+        # Positions of all edges of the frontier without a Python loop over the nodes
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+        keep = mask[self.edge_types[offsets]]
+        return np.repeat(frontier, lengths)[keep], self.indices[offsets][keep].astype(np.int64)
+
+    def neighbors(self, topic_id: str, edge_types=None) -> list:
+        """
+        Returns the ids the topic has an edge to, e.g. neighbors('01.2', ['forward']).
+        """
+        _, targets = self.expand(np.array([self.node(topic_id)]), self.type_mask(edge_types))
+        return self.ids[targets].tolist()
+
+    def k_hop(self, topic_id: str, k: int, edge_types=None) -> dict:
+        """
+        Returns the topics that are at most k edges away, mapped to their distance (without the topic itself).
+        """
+        mask = self.type_mask(edge_types)
+        start = self.node(topic_id)
+        distance = {}
+        visited = np.zeros(len(self.ids), dtype=bool)
+        visited[start] = True
+        frontier = np.array([start])
+        for hop in range(1, k + 1):
+            _, targets = self.expand(frontier, mask)
+            frontier = np.unique(targets[~visited[targets]])
+            if len(frontier) == 0:
+                break
+            visited[frontier] = True
+            distance.update((topic, hop) for topic in self.ids[frontier].tolist())
+        return distance
+
+    def shortest_path(self, source_id: str, target_id: str, edge_types=None) -> list:
+        """
+        Returns the ids on a shortest path from source to target (both included), or None if there is none.
+        Among paths of the same length, the one through the smallest ids is taken, so the result is stable.
+        """
+        mask = self.type_mask(edge_types)
+        source, target = self.node(source_id), self.node(target_id)
+        predecessor = np.full(len(self.ids), -1, dtype=np.int64)
+        predecessor[source] = source
+        frontier = np.array([source])
+        while len(frontier) > 0 and predecessor[target] < 0:
+            sources, targets = self.expand(frontier, mask)
+            new = predecessor[targets] < 0
+            sources, targets = sources[new], targets[new]
+            # The first edge to a node wins, np.unique returns the first position of every target
+            targets, first = np.unique(targets, return_index=True)
+            predecessor[targets] = sources[first]
+            frontier = targets
+        if predecessor[target] < 0:
+            return None
+        path = [target]
+        while path[-1] != source:
+            path.append(int(predecessor[path[-1]]))
+        return self.ids[path[::-1]].tolist()
+
+    def prerequisite_path(self, topic_id: str, prerequisite_id: str) -> list:
+        """
+        Returns the shortest chain of backward links from a topic to one of its (indirect) prerequisites.
+        """
+        return self.shortest_path(topic_id, prerequisite_id, ['backward'])
+
+    def subtree(self, topic_id: str) -> list:
+        """
+        Returns the topics below a topic (its children, their children, and so on), level by level.
+        """
+        levels = self.k_hop(topic_id, len(self.ids), ['child'])
+        return sorted(levels, key=lambda topic: (levels[topic], topic))
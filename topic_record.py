@@ -0,0 +1,155 @@
+import sys
+from collections.abc import MutableMapping
+
+# Fields of a topic, in the order of the exported CSV
+TOPIC_FIELDS = ('id', 'title', 'section', 'html_id', 'tag', 'url', 'parent_id', 'meta_type', 'meta_rule',
+                'beyondlinks', 'forwardlinks', 'backwardlinks', 'basiclinks', 'lecturelinks',
+                'wiki_ids', 'wiki_labels', 'wiki_descriptions',
+                'wikipedia_ids', 'wikipedia_labels', 'wikipedia_descriptions',
+                'dbpedia_ids', 'dbpedia_labels', 'dbpedia_descriptions',
+                'forwardIds', 'backwardIds', 'lectureIds')
+# Fields that hold lists, they are stored as tuples
+TUPLE_FIELDS = frozenset(['beyondlinks', 'forwardlinks', 'backwardlinks', 'basiclinks', 'lecturelinks',
+                          'wiki_ids', 'wiki_labels', 'wiki_descriptions',
+                          'wikipedia_ids', 'wikipedia_labels', 'wikipedia_descriptions',
+                          'dbpedia_ids', 'dbpedia_labels', 'dbpedia_descriptions',
+                          'forwardIds', 'backwardIds', 'lectureIds'])
+# Fields whose strings repeat across many topics (links, urls, deck titles), they are interned
+INTERNED_FIELDS = frozenset(['title', 'tag', 'url',
+                             'beyondlinks', 'forwardlinks', 'backwardlinks', 'basiclinks', 'lecturelinks',
+                             'forwardIds', 'backwardIds', 'lectureIds'])
+
+_FIELD_SET = frozenset(TOPIC_FIELDS)
+
+
+def intern_value(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+class Topic(MutableMapping):
+    """
+    Compact record of a single topic.
+
+    A topic has a slot per known field instead of a dictionary, list fields are stored as tuples, and the
+    links and urls are interned, so topics that link to the same slides share the strings. Fields that are
+    not in TOPIC_FIELDS are kept in a small dictionary.
+
+    Topic implements the mapping protocol, so the stage functions read and write it like the dictionaries
+    they used before (topic['url'], topic.get('wiki_ids'), 'meta_type' in topic). A field that was never
+    set is missing, like a missing key.
+    """
+    __slots__ = TOPIC_FIELDS + ('_extra',)
+
+    def __init__(self, fields=None, **kwargs):
+        self._extra = None
+        if fields is not None:
+            # A mapping or an iterable of (key, value) pairs, like dict()
+            for key, value in (fields.items() if hasattr(fields, 'items') else fields):
+                self[key] = value
+        for key, value in kwargs.items():
+            self[key] = value
+
+    @classmethod
+    def from_dict(cls, d: dict) -> 'Topic':
+        """
+        Creates a topic from a dictionary in the shape of the CSV rows and topic stores.
+        """
+        return cls(d)
+
+    def to_dict(self) -> dict:
+        """
+        Returns the topic as a dictionary with lists, in the shape of the CSV rows and topic stores.
+        """
+        return {key: list(value) if type(value) is tuple else value for key, value in self.items()}
+
+    def __getitem__(self, key):
+        if key in _FIELD_SET:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in TUPLE_FIELDS and isinstance(value, (list, tuple)):
+            value = tuple(intern_value(v) for v in value) if key in INTERNED_FIELDS else tuple(value)
+        elif key in INTERNED_FIELDS:
+            value = intern_value(value)
+        if key in _FIELD_SET:
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in _FIELD_SET:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self._extra is not None and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        if key in _FIELD_SET:
+            return hasattr(self, key)
+        return self._extra is not None and key in self._extra
+
+    def get(self, key, default=None):
+        if key in _FIELD_SET:
+            return getattr(self, key, default)
+        return self._extra.get(key, default) if self._extra is not None else default
+
+    def __iter__(self):
+        for key in TOPIC_FIELDS:
+            if hasattr(self, key):
+                yield key
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"Topic({self.to_dict()!r})"
+
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        self._extra = None
+        for key, value in state.items():
+            self[key] = value
+
+
+####################################################################################################
+# Converters
+####################################################################################################
+def topics_from_dicts(topics: list) -> list:
+    """
+    Converts topics in the dict shape (e.g. rows of a CSV file) to Topic records.
+    """
+    return [topic if isinstance(topic, Topic) else Topic.from_dict(topic) for topic in topics]
+
+
+def topics_to_dicts(topics: list) -> list:
+    """
+    Converts Topic records to dictionaries with lists, e.g. for pandas or json.
+    """
+    return [topic.to_dict() if isinstance(topic, Topic) else dict(topic) for topic in topics]
+
+
+def topic_columns(topics: list) -> list:
+    """
+    Returns the names of all fields that are set in at least one topic, in the order of TOPIC_FIELDS
+    followed by the other fields in the order they first occur.
+    """
+    columns = {}
+    for topic in topics:
+        columns.update(dict.fromkeys(topic.keys()))
+    return [field for field in TOPIC_FIELDS if field in columns] + [column for column in columns if column not in _FIELD_SET]
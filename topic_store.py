@@ -0,0 +1,119 @@
+import ast
+import csv
+import json
+import os
+
+from topic_record import Topic, topic_columns
+
+# Columns that hold lists, they are stored as Python reprs in the CSV files
+LIST_COLUMNS = ['beyondlinks', 'forwardlinks', 'backwardlinks', 'lecturelinks', 'basiclinks',
+                'wiki_ids', 'wiki_labels', 'wiki_descriptions',
+                'dbpedia_ids', 'dbpedia_labels', 'dbpedia_descriptions',
+                'wikipedia_ids', 'wikipedia_labels', 'wikipedia_descriptions',
+                'forwardIds', 'backwardIds', 'lectureIds']
+# Version of the on-disk layout of the topic store
+TOPIC_STORE_VERSION = 1
+
+
+####################################################################################################
+# Columnar topic store
+####################################################################################################
+def save_topics(topics: list, path: str):
+    """
+    Saves the topics as a columnar store: a directory with one JSON array per column and a meta.json.
+
+    Lists, numbers, and None keep their type, so nothing has to be re-parsed when the topics are loaded.
+
+    Args:
+    - topics (list): The topics as Topic records or dictionaries.
+    - path (str): The directory to write the store to.
+    """
+    columns = []
+    for topic in topics:
+        for column in topic.keys():
+            if column not in columns:
+                columns.append(column)
+    os.makedirs(path, exist_ok=True)
+    for column in columns:
+        write_json(os.path.join(path, f"{column}.json"), [topic.get(column) for topic in topics])
+    write_json(os.path.join(path, 'meta.json'), {'version': TOPIC_STORE_VERSION, 'columns': columns, 'count': len(topics)})
+
+
+def load_topics(path: str, columns: list = None) -> list:
+    """
+    Loads topics from a columnar store written by save_topics.
+
+    Args:
+    - path (str): The directory of the store.
+    - columns (list, optional): Only load these columns. Defaults to all columns.
+
+    Returns:
+    - list: The topics as Topic records.
+    """
+    with open(os.path.join(path, 'meta.json'), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    columns = meta['columns'] if columns is None else [c for c in columns if c in meta['columns']]
+    values = []
+    for column in columns:
+        with open(os.path.join(path, f"{column}.json"), 'r', encoding='utf-8') as f:
+            values.append(json.load(f))
+    return [Topic(zip(columns, row)) for row in zip(*values)] if len(columns) > 0 else [Topic() for _ in range(meta['count'])]
+
+
+def write_json(filename: str, data):
+    # Write to a temporary file first so that an interrupted save never leaves a broken store behind
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_filename, filename)
+
+
+####################################################################################################
+# CSV import and export
+####################################################################################################
+def import_topics_csv(filename: str, columns: list = None) -> list:
+    """
+    Loads topics from a CSV file that was written by export_topics_csv (or safe_list_as_csv).
+
+    Args:
+    - filename (str): The CSV file, separated by semicolons.
+    - columns (list, optional): Only keep these columns. Defaults to all columns.
+
+    Returns:
+    - list: The topics as Topic records with parsed list columns.
+    """
+    topics = []
+    with open(filename, 'r', encoding='utf-8-sig') as csvfile:
+        reader = csv.DictReader(csvfile, delimiter=';')
+        for row in reader:
+            if columns is not None:
+                row = {column: row.get(column) for column in columns if column in row}
+            for column in LIST_COLUMNS:
+                if row.get(column):
+                    row[column] = ast.literal_eval(row.get(column))
+            topics.append(Topic(row))
+    return topics
+
+
+def export_topics_csv(topics: list, filename: str):
+    """
+    Saves the topics as a CSV file separated by semicolons. Lists are written as Python reprs. The columns
+    are the fields of all topics (see topic_columns), a topic without one of them gets an empty cell.
+    """
+    try:
+        with open(filename, 'w', encoding='utf-8') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=topic_columns(topics), delimiter=';')
+            writer.writeheader()
+            for topic in topics:
+                writer.writerow(topic.to_dict() if isinstance(topic, Topic) else topic)
+    except IOError:
+        print("I/O error in export_topics_csv()")
+
+
+def read_topics(path: str, columns: list = None) -> list:
+    """
+    Loads topics from a CSV file or from a columnar store, depending on the file extension.
+    """
+    if path.endswith('.csv'):
+        return import_topics_csv(path, columns)
+    return load_topics(path, columns)
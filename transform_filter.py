@@ -1,40 +1,99 @@
+from urllib.parse import urldefrag
+
+from transform_rules import RuleSet
+
+
 def filter_topics(flattened_topics, FILTER_STRINGS):
-    filtered_list = []
-    for d in flattened_topics.values():
-        if d is not None:
-            if not any(filter_string.lower() in d.get('section').lower() for filter_string in FILTER_STRINGS):
-                filtered_list.append(d)
-    return filtered_list
-
-def resolve_links_to_topics(topics):
+    # FILTER_STRINGS is a list of keywords or a RuleSet, topics whose section matches a rule are removed
+    rules = FILTER_STRINGS if isinstance(FILTER_STRINGS, RuleSet) else RuleSet.from_keywords(FILTER_STRINGS)
+    topics = [d for d in flattened_topics.values() if d is not None]
+    matches = rules.match_all([d.get('section') for d in topics])
+    return [d for d, rule in zip(topics, matches) if rule is None]
+
+class TopicIndex:
+    """
+    Maps reveal.js URLs of topics to their ids so that links can be resolved in constant time.
+
+    URLs are normalized before they are compared, so "deck.html#slide-x", "deck.html#/slide-x" and the
+    anchor variant "deck.html#x" of a topic with the html_id "x" all resolve to the same topic.
+    Links that could not be resolved by resolve_links_to_topics are collected in unresolved as
+    (topic id, link type, link) tuples.
+    """
+
+    def __init__(self, topics: list = None):
+        self._exact = {}
+        self._variants = {}
+        self.unresolved = []
+        for topic in topics or []:
+            self.add(topic)
+
+    @staticmethod
+    def normalize_url(url: str) -> str:
+        # reveal.js writes its fragments as "#/slide-x", the links in the slides as "#slide-x"
+        base, fragment = urldefrag(url.strip())
+        fragment = fragment.lstrip('/')
+        return base + '#' + fragment if fragment else base
+
+    def add(self, topic: dict):
+        if topic.get('url') is None or topic.get('id') is None:
+            return
+        # The first topic with a URL wins, like the list scan did before
+        self._exact.setdefault(self.normalize_url(topic.get('url')), topic.get('id'))
+        if topic.get('html_id'):
+            base = urldefrag(topic.get('url'))[0]
+            self._variants.setdefault(base + '#slide-' + topic.get('html_id'), topic.get('id'))
+            self._variants.setdefault(base + '#' + topic.get('html_id'), topic.get('id'))
+
+    def resolve(self, link: str):
+        """
+        Returns the id of the topic the link points to or None if there is no such topic.
+        """
+        key = self.normalize_url(link)
+        topic_id = self._exact.get(key)
+        return topic_id if topic_id is not None else self._variants.get(key)
+
+    def __len__(self):
+        return len(self._exact)
+
+def resolve_links_to_topics(topics, index=None):
+    """
+    Resolves the forward, backward, and lecture links of all topics to topic ids.
+
+    Args:
+    - topics (list): The topics with forwardlinks, backwardlinks, and lecturelinks.
+    - index (TopicIndex, optional): Index of all topics the links may point to. Defaults to an index of topics.
+
+    Returns:
+    - list: The topics with forwardIds, backwardIds, and lectureIds.
+    """
+    if index is None:
+        index = TopicIndex(topics)
+    index.unresolved = []
     for topic in topics:
-        topic['backwardIds'] = []
-        topic['forwardIds'] = []
-        topic['lectureIds'] = []
-        if topic.get('forwardlinks') is not None and len(topic.get('forwardlinks')) > 0:
-            forwardIds = []
-            for link in topic.get('forwardlinks'):
-                # add a / infront of the html id
-                revealjs_link = link.replace('#', '#/')
-                row_of_linked_topic = [x for x in topics if x.get('url') == revealjs_link]
-                forwardIds.append(row_of_linked_topic[0].get('id'))
-            topic['forwardIds'] = forwardIds
-        if topic.get('backwardlinks') is not None and len(topic.get('backwardlinks')) > 0:
-            backwardIds = []
-            for link in topic.get('backwardlinks'):
-                # add a / infront of the html id
-                revealjs_link = link.replace('#', '#/')
-                row_of_linked_topic = [x for x in topics if x.get('url') == revealjs_link]
-                backwardIds.append(row_of_linked_topic[0].get('id'))
-            topic['backwardIds'] = backwardIds
-        if topic.get('lecturelinks') is not None and len(topic.get('lecturelinks')) > 0:
-            lectureIds = []
-            for link in topic.get('lecturelinks'):
-                # add a / infront of the html id
-                revealjs_link = link.replace('#', '#/')
-                row_of_linked_topic = [x for x in topics if x.get('url') == revealjs_link]
-                # CAUTION! if the link is not found, then the actual url is diffenrent than the on in the link
-                if len(row_of_linked_topic) > 0:
-                    lectureIds.append(row_of_linked_topic[0].get('id'))
-            topic['lectureIds'] = lectureIds
-    return topics
\ No newline at end of file
+        resolve_topic_links(topic, index)
+    report_unresolved_links(index)
+    return topics
+
+def resolve_topic_links(topic, index):
+    """
+    Resolves the forward, backward, and lecture links of a single topic to topic ids. Links that could
+    not be resolved are added to index.unresolved.
+    """
+    for link_type, id_type in (('forwardlinks', 'forwardIds'), ('backwardlinks', 'backwardIds'), ('lecturelinks', 'lectureIds')):
+        ids = []
+        for link in topic.get(link_type) or []:
+            linked_id = index.resolve(link)
+            # CAUTION! if the link is not found, then the actual url is diffenrent than the on in the link
+            if linked_id is not None:
+                ids.append(linked_id)
+            else:
+                index.unresolved.append((topic.get('id'), link_type, link))
+        topic[id_type] = ids
+    return topic
+
+def report_unresolved_links(index):
+    if len(index.unresolved) > 0:
+        counts = {}
+        for _, link_type, _ in index.unresolved:
+            counts[link_type] = counts.get(link_type, 0) + 1
+        print(f"Could not resolve {len(index.unresolved)} links to topics: {counts}")
@@ -0,0 +1,133 @@
+import functools
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# SQLite file in which the results of the Wikidata, Wikipedia, and DBpedia lookups are stored
+LOOKUP_CACHE_PATH = './.cache/lookups.sqlite'
+# Number of seconds after which a cached lookup is requested again
+LOOKUP_CACHE_TTL = 30 * 24 * 60 * 60
+# Maximum number of cached lookups, the least recently used ones are removed first
+LOOKUP_CACHE_MAX_ENTRIES = 500000
+
+
+def normalize_term(term: str) -> str:
+    """
+    Normalizes a search term so that "Memory_Management" and " memory management" share one cache entry.
+    """
+    return re.sub(r"[\s_]+", " ", term).strip().lower()
+
+
+class LookupCache:
+    """
+    Persistent cache for the lookups against the public knowledge bases.
+
+    Entries are keyed by the source (e.g. "wikidata") and the normalized search term. Misses are stored
+    as well, so a term without a result is not requested again until its entry is older than ttl seconds.
+    If more than max_entries lookups are stored, the least recently used ones are removed.
+    """
+
+    def __init__(self, path: str = LOOKUP_CACHE_PATH, ttl: float = LOOKUP_CACHE_TTL, max_entries: int = LOOKUP_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = {'hits': 0, 'misses': 0}
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # The timeout lets the processes of a multi-course run wait for each other's writes
+        self._connection = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS lookups ('
+            'source TEXT NOT NULL, term TEXT NOT NULL, result TEXT, '
+            'created_at REAL NOT NULL, accessed_at REAL NOT NULL, '
+            'PRIMARY KEY (source, term))')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS lookups_accessed_at ON lookups (accessed_at)')
+        self._connection.commit()
+
+    def get(self, source: str, term: str) -> tuple:
+        """
+        Looks up a cached result.
+
+        Args:
+        - source (str): The knowledge base the result belongs to.
+        - term (str): The search term.
+
+        Returns:
+        - tuple: (found, result). found is False if there is no valid entry; result may be None for a cached miss.
+        """
+        key = normalize_term(term)
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT result, created_at FROM lookups WHERE source = ? AND term = ?', (source, key)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                self.stats['misses'] += 1
+                return False, None
+            self._connection.execute(
+                'UPDATE lookups SET accessed_at = ? WHERE source = ? AND term = ?', (now, source, key))
+            self._connection.commit()
+            self.stats['hits'] += 1
+        return True, json.loads(row[0]) if row[0] is not None else None
+
+    def set(self, source: str, term: str, result):
+        """
+        Stores the result (or None for a miss) of a lookup.
+        """
+        key = normalize_term(term)
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO lookups (source, term, result, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)',
+                (source, key, json.dumps(result) if result is not None else None, now, now))
+            # Remove the least recently used entries if the cache grew too large
+            count = self._connection.execute('SELECT COUNT(*) FROM lookups').fetchone()[0]
+            if count > self.max_entries:
+                self._connection.execute(
+                    'DELETE FROM lookups WHERE rowid IN (SELECT rowid FROM lookups ORDER BY accessed_at LIMIT ?)',
+                    (count - self.max_entries,))
+            self._connection.commit()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+_lookup_cache = None
+_lookup_cache_lock = threading.Lock()
+
+
+def get_lookup_cache() -> LookupCache:
+    """
+    Returns the lookup cache that is shared by all enrichment functions.
+    """
+    global _lookup_cache
+    with _lookup_cache_lock:
+        if _lookup_cache is None:
+            _lookup_cache = LookupCache()
+        return _lookup_cache
+
+
+def cached_lookup(source: str):
+    """
+    Decorator for functions that look up a single term in a knowledge base.
+
+    The decorated function is only called if the lookup cache has no valid entry for the source and term.
+    Its result, including None for "no result", is stored in the cache. Exceptions are not cached.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(term):
+            cache = get_lookup_cache()
+            found, result = cache.get(source, term)
+            if found:
+                return result
+            result = func(term)
+            cache.set(source, term, result)
+            return result
+        return wrapper
+    return decorator
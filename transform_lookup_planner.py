@@ -0,0 +1,240 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from transform_lookup_cache import normalize_term
+
+# Maximum number of lookups of a single search term with bounded_search_plan, including the whole term
+FALLBACK_BUDGET = 8
+# Longest n-gram that bounded_search_plan looks up when the whole term has no result
+FALLBACK_MAX_NGRAM = 3
+# Words that are not looked up on their own and do not start or end an n-gram
+STOPWORDS = frozenset(['a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'how', 'in', 'into', 'is', 'it',
+                       'its', 'of', 'on', 'or', 'our', 'that', 'the', 'their', 'this', 'to', 'versus', 'via', 'vs',
+                       'what', 'when', 'which', 'why', 'with', 'you', 'your'])
+
+
+####################################################################################################
+# Search plans
+####################################################################################################
+def search_plan(search_term: str, get_ngrams):
+    """
+    Generator that describes the lookups for a search term with the unbounded fallback over every word and bigram.
+
+    The plan yields the list of terms it needs next and receives a dict that maps those terms to their
+    results. It first asks for the whole term. If there is no result and the term has more than two words,
+    it asks for its words and bigrams (each again as a plan) and returns their concatenated results.
+
+    Args:
+    - search_term (str): The search term, e.g. a section title without special characters and numbers.
+    - get_ngrams (callable): Returns the bigrams of a term whose words are separated by "_".
+
+    Returns:
+    - list: The results of the term, an empty list if only the fallback terms were searched, or None.
+    """
+    # Clean the search term by removing certain characters
+    clean_term = search_term.strip().replace(" ", "_")
+    if clean_term == "" or len(clean_term) <= 3:
+        return None
+
+    answers = yield [clean_term]
+    result = answers[clean_term]
+    if result is not None:
+        return result
+    elif len(clean_term.split("_")) > 2:
+        terms = clean_term.split("_") + get_ngrams(clean_term)
+        sub_results = yield from gather([search_plan(term, get_ngrams) for term in terms])
+        results = []
+        for sub_result in sub_results:
+            if sub_result:
+                results += sub_result
+        return results
+    else:
+        return None
+
+
+def bounded_search_plan(search_term: str, budget: int = FALLBACK_BUDGET, max_n: int = FALLBACK_MAX_NGRAM,
+                        stopwords: frozenset = STOPWORDS):
+    """
+    Generator that describes the lookups for a search term with a bounded fallback, see search_plan for the protocol.
+
+    It first asks for the whole term. If there is no result and the term has more than two words, it asks
+    for the n-grams of the term, longest first (from max_n words down to single words). An n-gram is only
+    asked for if none of its words is part of an n-gram that already had a result, and if it does not start
+    or end with a stopword. N-grams of the same length are asked for at once; if several of them overlap,
+    the leftmost result wins. The plan stops once every word is covered or after budget lookups.
+
+    Args:
+    - search_term (str): The search term, e.g. a section title without special characters and numbers.
+    - budget (int, optional): Maximum number of lookups, including the whole term. Defaults to FALLBACK_BUDGET.
+    - max_n (int, optional): Longest n-gram of the fallback. Defaults to FALLBACK_MAX_NGRAM.
+    - stopwords (frozenset, optional): Lowercase words that are skipped. Defaults to STOPWORDS.
+
+    Returns:
+    - list: The results of the term, the results of the n-grams from left to right, or None.
+    """
+    clean_term = search_term.strip().replace(" ", "_")
+    if clean_term == "" or len(clean_term) <= 3:
+        return None
+
+    answers = yield [clean_term]
+    result = answers[clean_term]
+    if result is not None or len(clean_term.split("_")) <= 2:
+        return result
+
+    words = [word for word in clean_term.split("_") if word != ""]
+    is_stopword = [word.lower() in stopwords for word in words]
+    matched = [False] * len(words)
+    budget -= 1
+    found = []
+    for n in range(min(max_n, len(words) - 1), 0, -1):
+        spans = []
+        for i in range(len(words) - n + 1):
+            term = "_".join(words[i:i + n])
+            if is_stopword[i] or is_stopword[i + n - 1] or any(matched[i:i + n]) or len(term) <= 3:
+                continue
+            spans.append((i, term))
+        spans = spans[:budget]
+        if not spans:
+            continue
+        budget -= len(spans)
+        answers = yield [term for _, term in spans]
+        for i, term in spans:
+            if answers[term] is not None and not any(matched[i:i + n]):
+                matched[i:i + n] = [True] * n
+                found.append((i, answers[term]))
+        if budget <= 0 or all(m or stop for m, stop in zip(matched, is_stopword)):
+            break
+
+    results = []
+    for _, sub_result in sorted(found, key=lambda match: match[0]):
+        results += sub_result
+    return results
+
+
+def gather(plans: list):
+    """
+    Runs several plans in lockstep: yields the terms of all plans at once and returns the list of their results.
+    """
+    results = [None] * len(plans)
+    pending = {}
+    for i, plan in enumerate(plans):
+        try:
+            pending[i] = (plan, next(plan))
+        except StopIteration as stop:
+            results[i] = stop.value
+    while pending:
+        answers = yield [term for _, terms in pending.values() for term in terms]
+        next_pending = {}
+        for i, (plan, _) in pending.items():
+            try:
+                next_pending[i] = (plan, plan.send(answers))
+            except StopIteration as stop:
+                results[i] = stop.value
+        pending = next_pending
+    return results
+
+
+####################################################################################################
+# Execution
+####################################################################################################
+def execute_plan(plan, search, max_workers: int = 1, stats: dict = None):
+    """
+    Executes a plan round by round. Every distinct term is looked up once, even if many plans (or later
+    rounds of the same plan) need it. Terms are distinct if their normalized form differs, like in the lookup cache.
+
+    Args:
+    - plan (generator): The plan, e.g. gather over the search plans of a whole corpus.
+    - search (callable): Looks up a single term, e.g. search_wikidata_term.
+    - max_workers (int, optional): Number of lookups of a round that run at the same time. Defaults to 1.
+    - stats (dict, optional): Counts the "planned" lookups (one per term a plan asked for) and the "executed" lookups,
+      and collects the normalized terms whose lookup raised a requests exception in "failed_terms".
+
+    Returns:
+    - The return value of the plan. A failed lookup is answered with None, like a term without result, so one
+      throttled term does not stop the other lookups. The lookup cache does not store it.
+    """
+    stats = {} if stats is None else stats
+    stats.setdefault('planned', 0)
+    stats.setdefault('executed', 0)
+    failed_terms = stats.setdefault('failed_terms', set())
+
+    def lookup(term):
+        try:
+            return search(term)
+        except requests.RequestException:
+            failed_terms.add(normalize_term(term))
+            return None
+
+    known = {}
+    executor = ThreadPoolExecutor(max_workers=max_workers) if max_workers > 1 else None
+    try:
+        terms = next(plan)
+        while True:
+            stats['planned'] += len(terms)
+            missing = {}
+            for term in terms:
+                key = normalize_term(term)
+                if key not in known and key not in missing:
+                    missing[key] = term
+            stats['executed'] += len(missing)
+            found = executor.map(lookup, missing.values()) if executor is not None else map(lookup, missing.values())
+            known.update(zip(missing.keys(), found))
+            terms = plan.send({term: known[normalize_term(term)] for term in terms})
+    except StopIteration as stop:
+        return stop.value
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def count_lookups(plan, counts: list, i: int, failed_terms: set = frozenset(), failed: list = None):
+    """
+    Passes a plan through and adds the number of terms it asks for to counts[i]. If one of its terms is in
+    failed_terms after it was looked up, failed[i] is set to True.
+    """
+    try:
+        terms = next(plan)
+        while True:
+            counts[i] += len(terms)
+            answers = yield terms
+            if failed is not None and any(normalize_term(term) in failed_terms for term in terms):
+                failed[i] = True
+            terms = plan.send(answers)
+    except StopIteration as stop:
+        return stop.value
+
+
+def plan_corpus_lookups(search_terms: list, search, make_plan, max_workers: int = 1) -> tuple:
+    """
+    Looks up the search terms of a whole corpus with one plan, so identical terms and fallback n-grams
+    of different topics are requested once and their results are fanned out to every topic.
+
+    Args:
+    - search_terms (list): The search term of every topic.
+    - search (callable): Looks up a single term, e.g. search_wikidata_term.
+    - make_plan (callable): Returns the plan of a search term, e.g. bounded_search_plan.
+    - max_workers (int, optional): Number of lookups that run at the same time. Defaults to 1.
+
+    Returns:
+    - tuple: (results, stats). results has one entry per search term. stats counts the lookups a search
+      per topic makes ("per_topic"), the most lookups of a single topic ("max_per_topic"), the lookups
+      that were executed after planning ("executed"), the lookups that "failed", and for every search term
+      whether one of its lookups failed ("failed_topics"), so its result may be incomplete.
+    """
+    multiplicity = {}
+    for term in search_terms:
+        multiplicity[term] = multiplicity.get(term, 0) + 1
+    unique_terms = list(multiplicity)
+    counts = [0] * len(unique_terms)
+    failed = [False] * len(unique_terms)
+    stats = {'failed_terms': set()}
+    plans = [count_lookups(make_plan(term), counts, i, stats['failed_terms'], failed) for i, term in enumerate(unique_terms)]
+    unique_results = execute_plan(gather(plans), search, max_workers, stats)
+    stats['per_topic'] = sum(count * multiplicity[term] for term, count in zip(unique_terms, counts))
+    stats['max_per_topic'] = max(counts, default=0)
+    stats['failed'] = len(stats['failed_terms'])
+    results_by_term = dict(zip(unique_terms, unique_results))
+    failed_by_term = dict(zip(unique_terms, failed))
+    stats['failed_topics'] = [failed_by_term[term] for term in search_terms]
+    return [results_by_term[term] for term in search_terms], stats
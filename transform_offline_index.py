@@ -0,0 +1,254 @@
+import bz2
+import gzip
+import json
+import os
+import re
+import sqlite3
+import threading
+
+from tqdm import tqdm
+
+from transform_lookup_cache import normalize_term
+
+# SQLite file with the labels of the Wikidata and Wikipedia dumps
+OFFLINE_INDEX_PATH = './.cache/entities.sqlite'
+# Number of entities that are written to the index per transaction
+OFFLINE_INDEX_BATCH_SIZE = 10000
+# Number of characters of a Wikipedia opening text that are kept as description
+WIKIPEDIA_DESCRIPTION_LENGTH = 300
+
+
+####################################################################################################
+# Dump readers
+####################################################################################################
+def open_dump(filename: str):
+    """
+    Opens a dump for reading text, decompressing .bz2 and .gz files on the fly.
+    """
+    if filename.endswith('.bz2'):
+        return bz2.open(filename, 'rt', encoding='utf-8')
+    if filename.endswith('.gz'):
+        return gzip.open(filename, 'rt', encoding='utf-8')
+    return open(filename, 'r', encoding='utf-8')
+
+
+def iter_wikidata_dump(filename: str, language: str = 'en'):
+    """
+    Streams the entities of a Wikidata JSON dump (e.g. latest-all.json.bz2), one entity per line.
+
+    Yields:
+    - tuple: (id, label, description, aliases, popularity). The popularity is the number of sitelinks.
+    """
+    with open_dump(filename) as f:
+        for line in f:
+            line = line.strip().rstrip(',')
+            # The dump is one JSON array with one entity per line
+            if line in ('[', ']', ''):
+                continue
+            entity = json.loads(line)
+            # Wikibase writes empty maps as [] instead of {}
+            labels, descriptions, aliases, sitelinks = (
+                value if isinstance(value, dict) else {}
+                for value in (entity.get(field) for field in ('labels', 'descriptions', 'aliases', 'sitelinks')))
+            label = labels.get(language, {}).get('value')
+            if label is None:
+                continue
+            description = descriptions.get(language, {}).get('value')
+            yield entity['id'], label, description, [alias['value'] for alias in aliases.get(language, [])], len(sitelinks)
+
+
+def iter_wikipedia_cirrus_dump(filename: str):
+    """
+    Streams the articles of a Wikipedia CirrusSearch dump (e.g. enwiki-*-cirrussearch-content.json.gz).
+
+    The dump is in the Elasticsearch bulk format: an {"index": {"_id": <page id>}} line before every article.
+
+    Yields:
+    - tuple: (page id, title, opening text, redirect titles, popularity). The popularity is the number of incoming links.
+    """
+    page_id = None
+    with open_dump(filename) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            document = json.loads(line)
+            if 'index' in document:
+                page_id = document['index'].get('_id')
+                continue
+            if document.get('namespace', 0) != 0 or 'title' not in document:
+                continue
+            page_id = document.get('page_id', page_id)
+            opening_text = document.get('opening_text') or ''
+            redirects = [redirect['title'] for redirect in document.get('redirect', []) if redirect.get('namespace', 0) == 0]
+            yield (int(page_id), document['title'], opening_text[:WIKIPEDIA_DESCRIPTION_LENGTH], redirects,
+                   document.get('incoming_links', 0))
+
+
+####################################################################################################
+# Index
+####################################################################################################
+def build_index(path: str, dumps: dict, batch_size: int = OFFLINE_INDEX_BATCH_SIZE) -> dict:
+    """
+    Builds the offline index from dumps. The index is written to a temporary file and moved to path at the
+    end, so a running enrichment keeps reading the old index until the new one is complete.
+
+    Args:
+    - path (str): The SQLite file of the index.
+    - dumps (dict): Maps "wikidata" and/or "wikipedia" to the filename of a dump.
+    - batch_size (int, optional): Number of entities per transaction. Defaults to OFFLINE_INDEX_BATCH_SIZE.
+
+    Returns:
+    - dict: The number of indexed entities per source.
+    """
+    readers = {'wikidata': iter_wikidata_dump, 'wikipedia': iter_wikipedia_cirrus_dump}
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    connection = sqlite3.connect(tmp_path)
+    # Nothing has to survive a crash of the build, the temporary file is simply built again
+    connection.execute('PRAGMA journal_mode=OFF')
+    connection.execute('PRAGMA synchronous=OFF')
+    connection.execute('CREATE TABLE entities (source TEXT NOT NULL, id TEXT NOT NULL, label TEXT NOT NULL, '
+                       'description TEXT, popularity INTEGER NOT NULL DEFAULT 0)')
+    connection.execute('CREATE TABLE names (name TEXT NOT NULL, source TEXT NOT NULL, entity INTEGER NOT NULL)')
+    connection.execute('CREATE VIRTUAL TABLE names_fts USING fts5(name, source UNINDEXED, entity UNINDEXED)')
+
+    counts = {}
+    for source, filename in dumps.items():
+        counts[source] = 0
+        batch = []
+        for record in tqdm(readers[source](filename), desc=f"Indexing {source} dump", unit=" entities"):
+            batch.append(record)
+            if len(batch) >= batch_size:
+                counts[source] += insert_entities(connection, source, batch)
+                batch = []
+        counts[source] += insert_entities(connection, source, batch)
+
+    # The exact lookups use the b-tree index, the word lookups the full-text index
+    connection.execute('CREATE INDEX names_lookup ON names (name, source)')
+    connection.execute("INSERT INTO names_fts (names_fts) VALUES ('optimize')")
+    connection.commit()
+    connection.close()
+    os.replace(tmp_path, path)
+    return counts
+
+
+def insert_entities(connection, source: str, records: list) -> int:
+    with connection:
+        for entity_id, label, description, aliases, popularity in records:
+            cursor = connection.execute('INSERT INTO entities (source, id, label, description, popularity) VALUES (?, ?, ?, ?, ?)',
+                                        (source, str(entity_id), label, description, popularity))
+            # Every label and alias (or redirect) is a name of the entity
+            names = {normalize_term(name) for name in [label] + aliases}
+            connection.executemany('INSERT INTO names (name, source, entity) VALUES (?, ?, ?)',
+                                   [(name, source, cursor.lastrowid) for name in names if name])
+            connection.executemany('INSERT INTO names_fts (name, source, entity) VALUES (?, ?, ?)',
+                                   [(name, source, cursor.lastrowid) for name in names if name])
+    return len(records)
+
+
+class OfflineIndex:
+    """
+    Resolves search terms against an index built by build_index instead of the public APIs.
+
+    A term is looked up as an exact label, alias, or redirect first. If there is none, the entity whose
+    name starts with the words of the term is taken, like the prefix search of the Wikidata API. Ties are
+    broken by the relevance of the full-text match and then by the popularity of the entity.
+    """
+
+    def __init__(self, path: str = OFFLINE_INDEX_PATH):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No offline index at {path}, build it with `python cli.py build-index`")
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True, check_same_thread=False)
+
+    def search(self, source: str, term: str):
+        """
+        Returns the best entity for the term as a (id, label, description) tuple, or None.
+        """
+        name = normalize_term(term)
+        words = re.findall(r'\w+', name)
+        if not words:
+            return None
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT e.id, e.label, e.description FROM names n JOIN entities e ON e.rowid = n.entity '
+                'WHERE n.name = ? AND n.source = ? ORDER BY e.popularity DESC LIMIT 1', (name, source)).fetchone()
+            if row is None:
+                # A phrase query whose last word may be a prefix, e.g. "memory manag" finds "memory management"
+                query = '"' + ' '.join(words) + '" *'
+                row = self._connection.execute(
+                    'SELECT e.id, e.label, e.description FROM names_fts f JOIN entities e ON e.rowid = f.entity '
+                    'WHERE names_fts MATCH ? AND f.source = ? ORDER BY bm25(names_fts), e.popularity DESC LIMIT 1',
+                    (query, source)).fetchone()
+        return row
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+def index_generation(path: str = OFFLINE_INDEX_PATH):
+    """
+    Returns the modification time and size of the index at path, which change whenever build_index replaces it,
+    or None if there is no index yet.
+    """
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+_offline_indexes = {}
+_offline_index_lock = threading.Lock()
+
+
+def get_offline_index(path: str = OFFLINE_INDEX_PATH) -> OfflineIndex:
+    """
+    Returns the offline index at path. It is opened once and shared by the offline search functions.
+    """
+    with _offline_index_lock:
+        if path not in _offline_indexes:
+            _offline_indexes[path] = OfflineIndex(path)
+        return _offline_indexes[path]
+
+
+####################################################################################################
+# Search functions with the result shape of the API lookups
+####################################################################################################
+def search_wikidata_offline(clean_term, index_path: str = OFFLINE_INDEX_PATH):
+    """
+    Looks up a single term in the Wikidata part of the offline index, like search_wikidata_term.
+    """
+    row = get_offline_index(index_path).search('wikidata', clean_term)
+    if row is None:
+        return None
+    entity_id, label, description = row
+    # Take description from the result if it exists, otherwise use the label
+    return [{"id": entity_id, "label": label, "description": description if description else label}]
+
+
+def search_wikipedia_offline(clean_term, index_path: str = OFFLINE_INDEX_PATH):
+    """
+    Looks up a single term in the Wikipedia part of the offline index, like search_wikipedia_term.
+    """
+    row = get_offline_index(index_path).search('wikipedia', clean_term)
+    if row is None:
+        return None
+    page_id, title, opening_text = row
+    return [{"id": int(page_id), "label": title, "description": opening_text if opening_text else title}]
+
+
+def search_dbpedia_offline(clean_term, index_path: str = OFFLINE_INDEX_PATH):
+    """
+    Looks up a single term like search_dbpedia_term. DBpedia resources are named after Wikipedia articles,
+    so they are resolved against the Wikipedia part of the offline index.
+    """
+    row = get_offline_index(index_path).search('wikipedia', clean_term)
+    if row is None:
+        return None
+    _, title, opening_text = row
+    return [{"id": title, "label": title, "description": opening_text or ""}]
@@ -1,7 +1,24 @@
-import requests
 import re
+from functools import partial
+
+import requests
 from tqdm import tqdm
 
+from http_client import http_get
+from transform_lookup_cache import cached_lookup
+import transform_lookup_planner
+from transform_lookup_planner import bounded_search_plan, execute_plan, plan_corpus_lookups, search_plan
+
+# Endpoints of the public knowledge bases
+WIKIDATA_API_URL = "https://www.wikidata.org/w/api.php"
+WIKIPEDIA_API_URL = "https://en.wikipedia.org/w/api.php"
+DBPEDIA_LOOKUP_URL = "http://lookup.dbpedia.org/api/search"
+# Fallback when a whole section title has no result: "bounded" looks up the longest n-grams first within a
+# budget (see bounded_search_plan), "ngrams" looks up every word and bigram (see search_plan)
+FALLBACK = "bounded"
+# Bump when the lookups of a search term change in a way that search_strategy does not show
+SEARCH_STRATEGY_VERSION = 1
+
 ####################################################################################################
 # Helper functions
 ####################################################################################################
@@ -11,6 +28,19 @@ def remove_special_chars_numbers(string):
     """
     return re.sub(r"[^A-Za-z\s]", "", string)
 
+def get_api_json(api_url: str) -> dict:
+    """
+    Requests an API URL and returns its JSON. Raises requests.HTTPError for error responses, including
+    MediaWiki errors that are sent with status 200, so that they are not taken (and cached) as "no result".
+    """
+    response = http_get(api_url)
+    response.raise_for_status()
+    data = response.json()
+    if isinstance(data, dict) and "error" in data:
+        error = data["error"]
+        raise requests.HTTPError(f"API error {error.get('code')}: {error.get('info')} ({api_url})", response=response)
+    return data
+
 def get_ngrams(text):
     words = text.split("_")
     ngrams = []
@@ -18,6 +48,26 @@ def get_ngrams(text):
         ngrams.append(words[i] + " " + words[i + 1])
     return ngrams
 
+def make_search_plan(search_term):
+    """
+    Returns the plan of a search term for the FALLBACK strategy.
+    """
+    if FALLBACK == "ngrams":
+        return search_plan(search_term, get_ngrams)
+    return bounded_search_plan(search_term)
+
+def search_strategy() -> dict:
+    """
+    Returns the settings that decide which terms are looked up for a section, e.g. to key stored results
+    by them, so results of another strategy are not reused.
+    """
+    strategy = {"version": SEARCH_STRATEGY_VERSION, "fallback": FALLBACK}
+    if FALLBACK != "ngrams":
+        strategy["budget"] = transform_lookup_planner.FALLBACK_BUDGET
+        strategy["max_ngram"] = transform_lookup_planner.FALLBACK_MAX_NGRAM
+        strategy["stopwords"] = sorted(transform_lookup_planner.STOPWORDS)
+    return strategy
+
 def split_results(results):
     wiki_ids = []
     wiki_labels = []
@@ -30,19 +80,69 @@ def split_results(results):
         
     return wiki_ids, wiki_labels, wiki_description
 
+def add_results_to_topics(topics: list, search, prefix: str, desc: str, max_workers: int = 1, failed: list = None) -> list:
+    """
+    Looks up the sections of all topics with one corpus-wide plan (see plan_corpus_lookups) and writes the
+    ids, labels, and descriptions of the results to the <prefix>_ids, _labels, and _descriptions fields.
+
+    A lookup that fails (e.g. the API still throttles after the last retry) counts as no result for this run,
+    it is not cached, so the next run asks again.
+
+    Args:
+    - topics (list): The topics.
+    - search (callable): Looks up a single term, e.g. search_wikidata_term.
+    - prefix (str): The prefix of the fields.
+    - desc (str): The description of the progress bar.
+    - max_workers (int, optional): Number of lookups that run at the same time. Defaults to 1.
+    - failed (list, optional): If given, the topics with a failed lookup are appended to it.
+
+    Returns:
+    - list: The topics. Topics without a section are left unchanged.
+    """
+    topics_with_section = [topic for topic in topics if topic.get("section") is not None]
+    queries = [remove_special_chars_numbers(topic.get("section")) for topic in topics_with_section]
+    with tqdm(desc=desc, unit=" lookups", leave=True) as progress:
+        def search_with_progress(term):
+            try:
+                return search(term)
+            finally:
+                progress.update()
+        results, stats = plan_corpus_lookups(queries, search_with_progress, make_search_plan, max_workers)
+
+    no_result_counter = 0
+    failed_counter = 0
+    for topic, wiki_results, lookup_failed in zip(topics_with_section, results, stats['failed_topics']):
+        if lookup_failed:
+            failed_counter += 1
+            if failed is not None:
+                failed.append(topic)
+        if wiki_results is not None and len(wiki_results) > 0:
+            ids, labels, descriptions = split_results(wiki_results)
+            topic[f"{prefix}_ids"] = ids
+            topic[f"{prefix}_labels"] = labels
+            topic[f"{prefix}_descriptions"] = descriptions
+        else:
+            topic[f"{prefix}_ids"] = None
+            topic[f"{prefix}_labels"] = None
+            topic[f"{prefix}_descriptions"] = None
+            no_result_counter += 1
+    print(f"No {prefix} result for {no_result_counter} topics")
+    if stats['failed'] > 0:
+        print(f"{prefix}: {stats['failed']} lookups failed, the results of {failed_counter} topics may be incomplete")
+    print(f"{prefix}: {stats['per_topic']} lookups when searching per topic (at most {stats['max_per_topic']} for one topic), "
+          f"{stats['executed']} after planning")
+    return topics
+
 ####################################################################################################
 # DBpedia part - not in use right now
 ####################################################################################################
-def get_dbpedia_info(search_term):
-    # Clean the search term by removing certain characters
-    clean_term = search_term.strip().replace(" ", "_")
-    
-    if clean_term == "" or len(clean_term) <= 3:
-        return None
-
-    # Search for the term in Wikidata
-    api_url = f"http://lookup.dbpedia.org/api/search?query={clean_term}&maxResults=1&format=json"
-    response = requests.get(api_url).json()
+@cached_lookup("dbpedia")
+def search_dbpedia_term(clean_term):
+    """
+    Looks up a single term in DBpedia and returns the best result or None. Results are cached.
+    """
+    api_url = f"{DBPEDIA_LOOKUP_URL}?query={clean_term}&maxResults=1&format=json"
+    response = get_api_json(api_url)
     docs = response.get("docs", [])
     # Check if there is a result for the term
     if len(docs) > 0:
@@ -51,21 +151,16 @@ def get_dbpedia_info(search_term):
         label = remove_b_tags(result.get("label")[0])
         # Take description from the result if it exists, otherwise use the label
         description = remove_b_tags(result.get("comment")[0] if "comment" in result and result.get("comment")[0] else "")
-        
-        # Otherwise, return the result for the search term
         return [{"id": entity_id, "label": label, "description": description}]
-    elif len(clean_term.split("_")) > 2:
-        terms = clean_term.split("_") + get_ngrams(clean_term)
-        results = []
-        for term in tqdm(terms, desc=f"Get DBpedia of {search_term}", leave=False, colour="green"):
-            result = get_dbpedia_info(term)
-            if result:
-                results += result
-        return results
-    else:
-        return None
-    
-    
+    return None
+
+def get_dbpedia_info(search_term):
+    """
+    Looks up a search term in DBpedia. If there is no result and the term has more than two words,
+    its n-grams are looked up instead, see make_search_plan.
+    """
+    return execute_plan(make_search_plan(search_term), search_dbpedia_term)
+
 def add_dbpedia_result_to_topics(topics: list) -> list:
     enhanced_topics = []
     for topic in tqdm(topics, desc="Getting DBpedia articles", leave=True):
@@ -85,9 +180,9 @@ def get_dbpedia_result(query):
     return filtered_results[0] if len(filtered_results) > 0 else None
 
 def search_dbpedia(query, max_results=5):
-    url = f"http://lookup.dbpedia.org/api/search?query={query}&maxResults={max_results}&format=json"
+    url = f"{DBPEDIA_LOOKUP_URL}?query={query}&maxResults={max_results}&format=json"
     headers = {"Accept": "application/json"}
-    response = requests.get(url, headers=headers)
+    response = http_get(url, headers=headers)
 
     results = []
     if response.ok:
@@ -122,40 +217,20 @@ def remove_b_tags(s):
     return s
 
     
-def add_dbpedia_to_topics(topics: list, prefix='dbpedia') -> list:
-    enhanced_topics = []
-    no_result_counter = 0
-    for topic in tqdm(topics, desc="Getting dbpedia topics", leave=True):
-        query = remove_special_chars_numbers(topic.get("section"))
-        wiki_results = get_dbpedia_info(query)
-        if wiki_results is not None and len(wiki_results) > 0:
-            ids, labels, descriptions = split_results(wiki_results)
-            topic[f"{prefix}_ids"] = ids
-            topic[f"{prefix}_labels"] = labels
-            topic[f"{prefix}_descriptions"] = descriptions
-        else:
-            topic[f"{prefix}_ids"] = None
-            topic[f"{prefix}_labels"] = None
-            topic[f"{prefix}_descriptions"] = None
-            no_result_counter += 1
-        enhanced_topics.append(topic)
-    print(f"No {prefix} result for {no_result_counter} topics")
-    return topics
+def add_dbpedia_to_topics(topics: list, prefix='dbpedia', max_workers: int = 1, failed: list = None) -> list:
+    return add_results_to_topics(topics, search_dbpedia_term, prefix, "Getting dbpedia topics", max_workers, failed)
 
 
 ####################################################################################################
 # Wikidata part
 ####################################################################################################
-def get_wikidata_info(search_term):
-    # Clean the search term by removing certain characters
-    clean_term = search_term.strip().replace(" ", "_")
-    
-    if clean_term == "" or len(clean_term) <= 3:
-        return None
-
-    # Search for the term in Wikidata
-    api_url = f"https://www.wikidata.org/w/api.php?action=wbsearchentities&search={clean_term}&format=json&language=en"
-    response = requests.get(api_url).json()
+@cached_lookup("wikidata")
+def search_wikidata_term(clean_term):
+    """
+    Looks up a single term in Wikidata and returns the best result or None. Results are cached.
+    """
+    api_url = f"{WIKIDATA_API_URL}?action=wbsearchentities&search={clean_term}&format=json&language=en&maxlag=5"
+    response = get_api_json(api_url)
 
     # Check if there is a result for the term
     if len(response["search"]) > 0:
@@ -164,55 +239,29 @@ def get_wikidata_info(search_term):
         label = result["label"]
         # Take description from the result if it exists, otherwise use the label
         description = result["description"] if "description" in result else label
-        
-        # Otherwise, return the result for the search term
         return [{"id": entity_id, "label": label, "description": description}]
-    elif len(clean_term.split("_")) > 2:
-        terms = clean_term.split("_") + get_ngrams(clean_term)
-        results = []
-        for term in tqdm(terms, desc=f"Get Wikidata of {search_term}", leave=False, colour="green"):
-            result = get_wikidata_info(term)
-            if result:
-                results += result
-        return results
-    else:
-        return None
+    return None
+
+def get_wikidata_info(search_term):
+    """
+    Looks up a search term in Wikidata. If there is no result and the term has more than two words,
+    its n-grams are looked up instead, see make_search_plan.
+    """
+    return execute_plan(make_search_plan(search_term), search_wikidata_term)
     
-def add_wikidata_to_topics(topics: list, prefix='wiki') -> list:
-    enhanced_topics = []
-    no_result_counter = 0
-    for topic in tqdm(topics, desc="Getting Wikidata ids", leave=True):
-        if topic.get("section") is None:
-            continue
-        query = remove_special_chars_numbers(topic.get("section"))
-        wiki_results = get_wikidata_info(query)
-        if wiki_results is not None and len(wiki_results) > 0:
-            ids, labels, descriptions = split_results(wiki_results)
-            topic[f"{prefix}_ids"] = ids
-            topic[f"{prefix}_labels"] = labels
-            topic[f"{prefix}_descriptions"] = descriptions
-        else:
-            topic[f"{prefix}_ids"] = None
-            topic[f"{prefix}_labels"] = None
-            topic[f"{prefix}_descriptions"] = None
-            no_result_counter += 1
-        enhanced_topics.append(topic)
-    print(f"No {prefix} result for {no_result_counter} topics")
-    return topics
+def add_wikidata_to_topics(topics: list, prefix='wiki', max_workers: int = 1, failed: list = None) -> list:
+    return add_results_to_topics(topics, search_wikidata_term, prefix, "Getting Wikidata ids", max_workers, failed)
 
 ####################################################################################################
 # Wikipedia part
 ####################################################################################################
-def get_wikipedia_info(search_term):
-    # Clean the search term by removing certain characters
-    clean_term = search_term.strip().replace(" ", "_")
-    
-    if clean_term == "" or len(clean_term) <= 3:
-        return None
-
-    # Search for the term in Wikipedia
-    api_url = f"https://en.wikipedia.org/w/api.php?action=query&format=json&list=search&srsearch={clean_term}&srlimit=3"
-    response = requests.get(api_url).json()
+@cached_lookup("wikipedia")
+def search_wikipedia_term(clean_term):
+    """
+    Looks up a single term in Wikipedia and returns the best result or None. Results are cached.
+    """
+    api_url = f"{WIKIPEDIA_API_URL}?action=query&format=json&list=search&srsearch={clean_term}&srlimit=3&maxlag=5"
+    response = get_api_json(api_url)
 
     # Check if there is a result for the term
     if len(response["query"]["search"]) > 0:
@@ -221,48 +270,58 @@ def get_wikipedia_info(search_term):
         label = result["title"]
         # Take description from the result if it exists, otherwise use the label
         description = result["snippet"] if "snippet" in result else label
-        
-        # Otherwise, return the result for the search term
         return [{"id": entity_id, "label": label, "description": description}]
-    elif len(clean_term.split("_")) > 2:
-        terms = clean_term.split("_") + get_ngrams(clean_term)
-        results = []
-        for term in tqdm(terms, desc=f"Get Wikipedia data of {search_term}", leave=False, colour="green"):
-            result = get_wikipedia_info(term)
-            if result:
-                results += result
-        return results
-    else:
-        return None
-
-def add_wikipedia_to_topics(topics: list, prefix='wikipedia') -> list:
-    enhanced_topics = []
-    no_result_counter = 0
-    for topic in tqdm(topics, desc="Getting Wikidata ids", leave=True):
-        query = remove_special_chars_numbers(topic.get("section"))
-        wiki_results = get_wikipedia_info(query)
-        if wiki_results is not None and len(wiki_results) > 0:
-            ids, labels, descriptions = split_results(wiki_results)
-            topic[f"{prefix}_ids"] = ids
-            topic[f"{prefix}_labels"] = labels
-            topic[f"{prefix}_descriptions"] = descriptions
-        else:
-            topic[f"{prefix}_ids"] = None
-            topic[f"{prefix}_labels"] = None
-            topic[f"{prefix}_descriptions"] = None
-            no_result_counter += 1
-        enhanced_topics.append(topic)
-    print(f"No {prefix} result for {no_result_counter} topics")
-    return topics
+    return None
+
+def get_wikipedia_info(search_term):
+    """
+    Looks up a search term in Wikipedia. If there is no result and the term has more than two words,
+    its n-grams are looked up instead, see make_search_plan.
+    """
+    return execute_plan(make_search_plan(search_term), search_wikipedia_term)
+    
+def add_wikipedia_to_topics(topics: list, prefix='wikipedia', max_workers: int = 1, failed: list = None) -> list:
+    return add_results_to_topics(topics, search_wikipedia_term, prefix, "Getting Wikipedia articles", max_workers, failed)
 
 ####################################################################################################
 # Main function
 ####################################################################################################
-def add_public_data_to_topics(topics: list, sources: list) -> list:
+def add_public_data_to_topics(topics: list, sources: list, max_workers: int = 1, backend: str = 'api', failed: list = None,
+                              index_path: str = None) -> list:
+    """
+    Adds the results of the public knowledge bases to the topics.
+
+    Args:
+    - topics (list): The flattened topics.
+    - sources (list): The knowledge bases to query ("wikidata", "wikipedia", "dbpedia").
+    - max_workers (int, optional): Number of lookups that run at the same time. Defaults to 1.
+    - backend (str, optional): "api" queries the public APIs, "offline" the local index of
+      transform_offline_index. Defaults to "api".
+    - failed (list, optional): If given, the topics with a failed lookup are appended to it, see add_results_to_topics.
+    - index_path (str, optional): The offline index. Defaults to OFFLINE_INDEX_PATH of transform_offline_index.
+
+    Returns:
+    - list: The enriched topics.
+    """
+    if backend == 'offline':
+        from transform_offline_index import OFFLINE_INDEX_PATH, search_dbpedia_offline, search_wikidata_offline, search_wikipedia_offline
+        index_path = index_path or OFFLINE_INDEX_PATH
+        if 'wikidata' in sources:
+            topics = add_results_to_topics(topics, partial(search_wikidata_offline, index_path=index_path), 'wiki',
+                                           "Resolving Wikidata ids offline", max_workers, failed)
+        if 'wikipedia' in sources:
+            topics = add_results_to_topics(topics, partial(search_wikipedia_offline, index_path=index_path), 'wikipedia',
+                                           "Resolving Wikipedia articles offline", max_workers, failed)
+        if 'dbpedia' in sources:
+            topics = add_results_to_topics(topics, partial(search_dbpedia_offline, index_path=index_path), 'dbpedia',
+                                           "Resolving dbpedia topics offline", max_workers, failed)
+        return topics
+    if backend != 'api':
+        raise ValueError(f"Unknown enrichment backend: {backend}")
     if 'wikidata' in sources:
-        topics = add_wikidata_to_topics(topics)
+        topics = add_wikidata_to_topics(topics, max_workers=max_workers, failed=failed)
     if 'wikipedia' in sources:
-        topics = add_wikipedia_to_topics(topics)
+        topics = add_wikipedia_to_topics(topics, max_workers=max_workers, failed=failed)
     if 'dbpedia' in sources:
-        topics = add_dbpedia_to_topics(topics)
-    return topics
\ No newline at end of file
+        topics = add_dbpedia_to_topics(topics, max_workers=max_workers, failed=failed)
+    return topics
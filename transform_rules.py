@@ -0,0 +1,132 @@
+import json
+import os
+import re
+
+# Rules that classify topics into structural and content topics
+META_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config', 'meta_rules.json')
+
+
+####################################################################################################
+# Helper functions
+####################################################################################################
+def trie_pattern(keywords: list) -> str:
+    """
+    Returns a regular expression that matches any of the keywords, with common prefixes factored out
+    (e.g. "quiz|question" becomes "qu(?:iz|estion)"). The regex engine then walks the keywords like a
+    trie instead of trying every keyword at every position of the text.
+    """
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def pattern(node: dict) -> str:
+        end = '' in node
+        # The branches start with different characters, so their order does not matter
+        branches = [re.escape(char) + pattern(child) for char, child in sorted(node.items()) if char != '']
+        if not branches:
+            return ''
+        if len(branches) > 1:
+            alternation = '(?:' + '|'.join(branches) + ')'
+            return alternation + '?' if end else alternation
+        # A greedy "?" prefers the longer keyword, e.g. "recall: big picture" over "recall"
+        return f'(?:{branches[0]})?' if end else branches[0]
+
+    return pattern(trie)
+
+
+####################################################################################################
+# Rule sets
+####################################################################################################
+class RuleSet:
+    """
+    Keyword and regex rules that are compiled into a single regular expression.
+
+    A rule has a name, a label, and either keywords (matched case-insensitively anywhere in the text)
+    or a regex pattern. All keywords of all rules become one trie-shaped alternative, every regex rule
+    becomes a named group, so a text is scanned once no matter how many rules there are. The first match
+    in the text decides which rule fired. Patterns must not define named groups of their own.
+    """
+
+    def __init__(self, rules: list, default: str = None):
+        self.rules = rules
+        self.default = default
+        self._keywords = {}
+        alternatives = []
+        for rule in rules:
+            for keyword in rule.get('keywords', []):
+                # The first rule that lists a keyword wins
+                self._keywords.setdefault(keyword.lower(), rule)
+        if self._keywords:
+            alternatives.append('(?P<keyword>' + trie_pattern(list(self._keywords)) + ')')
+        self._patterns = {}
+        for i, rule in enumerate(rules):
+            if rule.get('pattern'):
+                group = f'rule{i}'
+                self._patterns[group] = rule
+                alternatives.append(f"(?P<{group}>{rule['pattern']})")
+        self._regex = re.compile('|'.join(alternatives), re.IGNORECASE) if alternatives else None
+
+    @classmethod
+    def from_keywords(cls, keywords: list, label: str = None) -> 'RuleSet':
+        """
+        Creates a rule set with one rule per keyword, named after the keyword.
+        """
+        return cls([{'name': keyword, 'label': label, 'keywords': [keyword]} for keyword in keywords])
+
+    @classmethod
+    def from_file(cls, filename: str) -> 'RuleSet':
+        """
+        Loads a rule set from a JSON file: {"default": "...", "rules": [{"name", "label", "keywords" or "pattern"}]}.
+        """
+        with open(filename, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        return cls(config['rules'], config.get('default'))
+
+    def match(self, text: str):
+        """
+        Returns the rule that fired for the text, or None.
+        """
+        if self._regex is None or text is None:
+            return None
+        m = self._regex.search(text)
+        if m is None:
+            return None
+        if m.lastgroup == 'keyword':
+            return self._keywords[m.group().lower()]
+        return self._patterns[m.lastgroup]
+
+    def match_all(self, texts: list) -> list:
+        """
+        Returns the rule that fired for each text. Every distinct text is only scanned once, which pays off
+        for section titles such as "Summary" or "Learning Objectives" that repeat in every deck.
+        """
+        matches = {}
+        results = []
+        for text in texts:
+            if text not in matches:
+                matches[text] = self.match(text)
+            results.append(matches[text])
+        return results
+
+    def classify_all(self, texts: list) -> list:
+        """
+        Returns a (label, rule name) tuple for each text. Texts without a match get (default, None).
+        """
+        return [(rule.get('label'), rule.get('name')) if rule is not None else (self.default, None)
+                for rule in self.match_all(texts)]
+
+
+_meta_rules = None
+
+
+def get_meta_rules() -> RuleSet:
+    """
+    Returns the rule set of META_RULES_PATH that is used by mark_meta_topics.
+    """
+    global _meta_rules
+    if _meta_rules is None:
+        _meta_rules = RuleSet.from_file(META_RULES_PATH)
+    return _meta_rules